@@ -1,17 +1,122 @@
-import yaml
+import os
+import json
 import uuid
 
+from typing import Dict, List
+
+import httpx
 import streamlit as st
 
 from langchain_core.runnables import RunnableConfig
-from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.messages import HumanMessage
 from langchain_community.callbacks.streamlit import (
     StreamlitCallbackHandler,
 )
 
-from graph.main import app as main_graph
+from settings import load_secret
 from langchain_tools import get_remote_ip
+from profiling import PROFILE_TURNS, profile_turn
+
+# serving API 주소가 설정되어 있으면 server.py 의 thin client 로 동작합니다.
+api_url = os.getenv("CHAT_API_URL", load_secret().get("serving", {}).get("api_url"))
+chat_page_config = load_secret().get("chat_page", {})
+# 한 번에 그리는 메시지 수. 긴 대화도 rerun 마다 이 개수만 그립니다.
+HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", chat_page_config.get("history_page_size", 20)))
+HISTORY_CACHE_ENTRIES = chat_page_config.get("history_cache_entries", 256)
+
+
+def stream_from_api(thread_id: str, prompt: str):
+    """server.py 의 SSE 응답에서 chat 토큰을 읽어 yield 합니다."""
+    with httpx.stream(
+        "POST",
+        f"{api_url}/threads/{thread_id}/stream",
+        json={"message": prompt},
+        timeout=httpx.Timeout(10, read=None),
+    ) as response:
+        if response.status_code != 200:
+            response.read()
+            yield f"[ERROR] {response.status_code}: {response.text}"
+            return
+        event = None
+        for line in response.iter_lines():
+            if line.startswith("event:"):
+                event = line[len("event:") :].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[len("data:") :])
+                if event == "token":
+                    yield data["content"]
+                elif event == "error":
+                    yield f"\n\n[ERROR] {data['detail']}"
+
+
+@st.cache_resource
+def load_main_graph():
+    """그래프(모델, checkpointer) 는 session 마다 저장하지 않고 프로세스에서 한 번만 로드합니다."""
+    from graph.main import app as main_graph
+
+    return main_graph
+
+
+@st.cache_data(max_entries=HISTORY_CACHE_ENTRIES, show_spinner=False)
+def cached_history(thread_id: str, checkpoint_id: str, limit: int, _snapshot=None) -> Dict:
+    """
+    checkpoint 가 바뀌지 않았으면 대화 내역을 다시 읽지 않습니다.
+    checkpoint_id 는 cache key 로만 사용하고, _snapshot 이 있으면 state 를 다시 읽지 않고 그대로 사용합니다.
+    """
+    from graph.memory import load_thread_history
+
+    return load_thread_history(load_main_graph(), thread_id, limit, state=_snapshot)
+
 
+def fetch_history(thread_id: str, limit: int) -> Dict:
+    """
+    checkpointer 에 저장된 대화 내역 중 마지막 limit 개의 메시지를 가져옵니다.
+
+    session 의 thread 는 그 session 의 turn 만 바꾸므로, 마지막으로 읽은 checkpoint_id 를 session_state 에 두고
+    run_turn 이 지울 때까지 checkpointer 를 다시 읽지 않습니다. 읽어야 할 때도 get_state 는 한 번만 호출합니다.
+    """
+    if api_url:
+        response = httpx.get(f"{api_url}/threads/{thread_id}/messages", params={"limit": limit}, timeout=10)
+        response.raise_for_status()
+        return response.json()
+    checkpoint_id, snapshot = st.session_state.get("history_checkpoint_id"), None
+    if checkpoint_id is None:
+        snapshot = load_main_graph().get_state(RunnableConfig({"configurable": {"thread_id": thread_id}}))
+        checkpoint_id = (snapshot.config or {}).get("configurable", {}).get("checkpoint_id")
+        if checkpoint_id is None:
+            return {"checkpoint_id": None, "summary": "", "total": 0, "messages": []}
+        st.session_state.history_checkpoint_id = checkpoint_id
+    return cached_history(thread_id, checkpoint_id, limit, snapshot)
+
+
+def render_history(thread_id: str):
+    """최근 HISTORY_PAGE_SIZE 개의 메시지부터 보여주고, 버튼으로 이전 메시지를 한 페이지씩 더 불러옵니다."""
+    limit = st.session_state.history_pages * HISTORY_PAGE_SIZE
+    history = fetch_history(thread_id, limit)
+    if history["total"] > len(history["messages"]):
+        if st.button(f"이전 대화 더 보기 ({history['total'] - len(history['messages'])}개)"):
+            st.session_state.history_pages += 1
+            st.rerun()
+    elif history["summary"]:
+        # 기억 저장소를 사용하지 않으면 요약된 이전 대화는 요약만 남아 있습니다.
+        with st.expander("이전 대화 요약"):
+            st.markdown(history["summary"])
+    for message in history["messages"]:
+        st.chat_message(message["role"]).markdown(message["content"])
+
+
+def run_turn(prompt: str, callbacks: List):
+    try:
+        return load_main_graph().invoke(
+            input={"messages": [HumanMessage(prompt)]},
+            config=RunnableConfig({"callbacks": callbacks, "configurable": st.session_state.config}),
+        )
+    finally:
+        # turn 이 checkpoint 를 바꿨으므로 다음 rerun 에서 checkpoint_id 를 다시 읽습니다.
+        st.session_state.history_checkpoint_id = None
+
+
+# session 에는 thread_id 와 페이지 수만 저장합니다. 메시지는 checkpointer 가 가지고 있습니다.
 if "session_id" not in st.session_state:
     st.session_state.session_id = str(uuid.uuid4())
 
@@ -20,28 +125,26 @@ if "config" not in st.session_state:
         "thread_id": st.session_state.session_id,
     }
 
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+if "history_pages" not in st.session_state:
+    st.session_state.history_pages = 1
 
-if "graph" not in st.session_state:
-    st.session_state.graph = main_graph
+# 켜면 다음 turn 의 stack sample(.folded) 과 노드 별 실행 시간(.json) 을 PROFILE_DIR 에 저장합니다.
+profiling = not api_url and st.sidebar.checkbox("turn 프로파일링", value=PROFILE_TURNS)
 
-for msg in st.session_state.messages:
-    if isinstance(msg, AIMessage):
-        st.chat_message("assistant").write(msg.content)
-    else:
-        st.chat_message("user").write(msg.content)
+render_history(st.session_state.config["thread_id"])
 
 if prompt := st.chat_input():
     with st.chat_message("user"):
-        st.write(prompt)
-        st.session_state.messages.append(HumanMessage(prompt))
+        st.markdown(prompt)
     with st.chat_message("assistant"):
-        st_callback = StreamlitCallbackHandler(st.container())
-        response = st.session_state.graph.invoke(
-            input={"messages": [HumanMessage(prompt)]},
-            config=RunnableConfig({"callbacks": [st_callback], "configurable": st.session_state.config}),
-        )
-        response = response["messages"][-1].content
-        st.markdown(response)
-        st.session_state.messages.append(AIMessage(response))
+        if api_url:
+            st.write_stream(stream_from_api(st.session_state.config["thread_id"], prompt))
+        else:
+            st_callback = StreamlitCallbackHandler(st.container())
+            if profiling:
+                with profile_turn(st.session_state.config["thread_id"]) as profile:
+                    response = run_turn(prompt, [st_callback, profile.tracer])
+                st.sidebar.json(profile.summary(), expanded=False)
+            else:
+                response = run_turn(prompt, [st_callback])
+            st.markdown(response["messages"][-1].content)
@@ -0,0 +1,252 @@
+"""
+JSONL 파일의 질문을 graph/main.py 의 app 으로 한꺼번에 답변하는 batch CLI 입니다.
+
+질문마다 새로운 thread_id 로 그래프를 실행하고, 최대 --concurrency 개의 질문을 동시에 처리합니다.
+질문끼리 대화가 이어지지 않으므로 checkpointer 없이 컴파일한 그래프를 사용해서, 질문 수만큼 state 가 쌓이지 않게 합니다.
+답변은 끝나는 순서대로 출력 파일에 한 줄씩 추가됩니다. 출력 파일이 곧 진행 상황 checkpoint 이므로,
+중간에 멈춘 뒤 같은 명령으로 다시 실행하면 이미 답변한 질문은 건너뜁니다.
+--retry-errors 로 다시 실행하면 출력 파일에서 실패한 줄을 먼저 지우므로 같은 id 가 두 번 남지 않습니다.
+
+입력 (한 줄에 하나, id 가 없으면 줄 번호를 사용합니다):
+    {"id": "q-001", "question": "근로소득 비과세 한도는?"}
+JSON 이 아니거나 question 이 없는 줄은 batch 를 멈추지 않고 error 가 있는 줄로 기록합니다.
+
+출력:
+    {"id": "q-001", "question": "...", "answer": "...", "route": "vectorstore", "latency": 1.84,
+     "node_latency": {"vectorstore": 1.21, "chat": 0.63}, "thread_id": "...", "error": null}
+
+Usage:
+    cd app
+    python batch.py ../data/questions.jsonl ../data/answers.jsonl --concurrency 8
+    USE_STUB_MODELS=true python batch.py questions.jsonl answers.jsonl --concurrency 32
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Set
+
+import numpy as np
+
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
+
+
+def read_questions(path: str) -> Iterator[Dict[str, Any]]:
+    """질문을 한 줄씩 읽습니다. 읽을 수 없는 줄은 input_error 를 담아서 answer_question 이 error 로 기록하게 합니다."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                item = {"input_error": f"JSONDecodeError: {e}"}
+            if not isinstance(item, dict):
+                item = {"input_error": f"expected a JSON object, got {type(item).__name__}"}
+            item.setdefault("id", str(line_no))
+            yield item
+
+
+def completed_ids(path: str, retry_errors: bool) -> Set[str]:
+    """출력 파일에 이미 기록된 질문 id 를 반환합니다. retry_errors 이면 실패한 질문은 다시 실행합니다."""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # 실행 도중 중단되어 잘린 마지막 줄은 무시합니다.
+                continue
+            if retry_errors and result.get("error"):
+                done.discard(str(result["id"]))
+            else:
+                done.add(str(result["id"]))
+    return done
+
+
+def drop_error_rows(path: str):
+    """--retry-errors 로 다시 실행할 질문의 이전 실패 줄(과 중단되어 잘린 줄) 을 출력 파일에서 지웁니다."""
+    if not os.path.exists(path):
+        return
+    temp_path = f"{path}.tmp"
+    with open(path, "r", encoding="utf-8") as f, open(temp_path, "w", encoding="utf-8") as output:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not result.get("error"):
+                output.write(line if line.endswith("\n") else line + "\n")
+    os.replace(temp_path, path)
+
+
+def answer_question(graph, item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    질문 하나를 새 thread 에서 실행합니다.
+
+    stream_mode="updates" 로 노드가 끝날 때마다 update 를 받아서, 처음 실행된 노드를 route 로 기록하고
+    이전 update 와의 시간 차이를 노드 별 latency 로 기록합니다. routing(START 의 조건부 edge) 시간은 첫 노드에 포함됩니다.
+    """
+    thread_id = str(uuid.uuid4())
+    config = RunnableConfig({"configurable": {"thread_id": thread_id}})
+    result = {"id": str(item["id"]), "question": item.get("question"), "thread_id": thread_id}
+    route, answer, node_latency = None, None, {}
+    start = last = time.perf_counter()
+    try:
+        # 잘못된 줄 하나가 batch 전체를 멈추지 않도록 검증도 try 안에서 하고 error 로 기록합니다.
+        if "input_error" in item:
+            raise ValueError(item["input_error"])
+        question = item.get("question")
+        if not isinstance(question, str) or not question.strip():
+            raise ValueError("'question' must be a non-empty string")
+        for update in graph.stream({"messages": [HumanMessage(question)]}, config, stream_mode="updates"):
+            now = time.perf_counter()
+            for node, values in update.items():
+                route = route or node
+                node_latency[node] = round(node_latency.get(node, 0.0) + now - last, 4)
+                if node == "chat":
+                    messages = values["messages"]
+                    answer = (messages[-1] if isinstance(messages, list) else messages).content
+            last = now
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    result.update(
+        {
+            "answer": answer,
+            "route": route,
+            "latency": round(time.perf_counter() - start, 4),
+            "node_latency": node_latency,
+            "error": error,
+        }
+    )
+    return result
+
+
+class BatchReport:
+    """처리량과 route 별 latency 를 집계합니다."""
+
+    def __init__(self, skipped: int = 0):
+        self.start = time.perf_counter()
+        self.skipped = skipped
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def add(self, result: Dict[str, Any]):
+        route = result["route"] or "none"
+        self.latencies[route].append(result["latency"])
+        if result["error"]:
+            self.errors[route] += 1
+
+    @property
+    def completed(self) -> int:
+        return sum(len(values) for values in self.latencies.values())
+
+    def progress(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.start
+        return {
+            "completed": self.completed,
+            "skipped": self.skipped,
+            "errors": sum(self.errors.values()),
+            "elapsed_seconds": round(elapsed, 2),
+            "questions_per_second": round(self.completed / elapsed, 3) if elapsed else 0.0,
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            **self.progress(),
+            "routes": {
+                route: {
+                    "count": len(values),
+                    "errors": self.errors.get(route, 0),
+                    "latency_p50": round(float(np.percentile(values, 50)), 3),
+                    "latency_p95": round(float(np.percentile(values, 95)), 3),
+                    "latency_max": round(max(values), 3),
+                }
+                for route, values in sorted(self.latencies.items())
+            },
+        }
+
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    concurrency: int = 8,
+    retry_errors: bool = False,
+    limit: int = None,
+    progress_every: int = 100,
+) -> Dict[str, Any]:
+    """
+    input_path 의 질문 중 output_path 에 없는 질문을 답변해서 output_path 에 추가합니다.
+
+    동시에 실행 중이거나 대기 중인 질문은 concurrency * 2 개로 제한해서, 입력 파일이 커도 메모리를 일정하게 사용합니다.
+
+    Returns:
+        Dict: 처리량과 route 별 latency 요약.
+    """
+    from graph.main import workflow
+
+    # 질문마다 새 thread 를 사용하므로 checkpoint 를 남길 필요가 없습니다.
+    main_graph = workflow.compile()
+    if retry_errors:
+        drop_error_rows(output_path)
+    done = completed_ids(output_path, retry_errors)
+    # 출력 파일에만 있고 입력에 없는 id 는 건너뛴 질문으로 세지 않습니다.
+    skipped = sum(1 for item in read_questions(input_path) if str(item["id"]) in done) if done else 0
+    pending = islice((item for item in read_questions(input_path) if str(item["id"]) not in done), limit)
+    report = BatchReport(skipped=skipped)
+    max_running = concurrency * 2
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as executor:
+        with open(output_path, "a", encoding="utf-8") as output:
+            running = {executor.submit(answer_question, main_graph, item) for item in islice(pending, max_running)}
+            while running:
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    report.add(result)
+                    if progress_every and report.completed % progress_every == 0:
+                        print(f"[batch] {json.dumps(report.progress())}", file=sys.stderr)
+                # 줄 단위로 flush 해서 중단되어도 끝난 답변은 남깁니다.
+                output.flush()
+                for item in islice(pending, max_running - len(running)):
+                    running.add(executor.submit(answer_question, main_graph, item))
+    return report.summary()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer JSONL questions with the main graph.")
+    parser.add_argument("input", help="JSONL file with one {'id', 'question'} per line")
+    parser.add_argument("output", help="JSONL file to append answers to; rerun resumes from it")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--retry-errors", action="store_true", help="remove failed rows from the output and rerun those questions"
+    )
+    parser.add_argument("--limit", type=int, default=None, help="answer at most N new questions")
+    parser.add_argument("--progress-every", type=int, default=100)
+    parser.add_argument("--report", default=None, help="write the summary JSON to this path")
+    args = parser.parse_args()
+
+    summary = run_batch(
+        args.input,
+        args.output,
+        concurrency=args.concurrency,
+        retry_errors=args.retry_errors,
+        limit=args.limit,
+        progress_every=args.progress_every,
+    )
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
@@ -0,0 +1,244 @@
+"""
+grade_chain / is_relevant_chain 앞단의 cascade 입니다.
+
+질문과 문서의 embedding 유사도(또는 LLM grading 로그로 학습한 logistic regression) 로 점수를 계산하고,
+확실한 경우(score >= high 또는 score <= low) 는 LLM 없이 판정합니다. 나머지만 LLM grader 로 보냅니다.
+LLM 이 판정한 결과는 log_path 에 기록되어 scripts/grader_cascade_report.py 의 학습 / 일치율 리포트에 사용됩니다.
+shadow_rate 비율의 호출은 확실한 경우도 LLM 으로 판정해서, 편향되지 않은 label 을 모읍니다.
+한 번에 받은 문서를 cascade 가 모두 거절하면 threshold 가 맞지 않을 수 있으므로 LLM grader 로 다시 판정합니다.
+
+grader 마다 label 분포가 다르므로 classifier 는 classifier_dir/{grader 이름}.json 으로 따로 학습하고 불러옵니다.
+low / high 는 cosine similarity 기준이고, classifier 를 사용할 때는 classifier 파일의 threshold 를 사용합니다.
+classifier_low / classifier_high 를 설정하면 파일의 threshold 보다 설정이 우선합니다.
+AdaptiveRetriever 가 방금 계산한 질문 / chunk embedding 은 다시 embedding 하지 않고 재사용합니다.
+
+Example (secret.yaml):
+    grading_cascade:
+      enabled: true
+      low: 0.2
+      high: 0.55
+      classifier_dir: ./data/grader_cascade
+      # classifier_low: 0.1
+      # classifier_high: 0.9
+      log_path: ./data/grader_decisions.jsonl
+      shadow_rate: 0.05
+"""
+
+import json
+import math
+import os
+import random
+import re
+import threading
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rag.adaptive import recent_embeddings
+from settings import data_dir, load_secret
+from utils import load_embedding_model
+
+TOKEN_PATTERN = re.compile(r"[0-9A-Za-z가-힣]+")
+
+
+def lexical_overlap(question: str, document: str) -> float:
+    """질문 토큰 중 문서에 등장하는 토큰의 비율."""
+    question_tokens = set(TOKEN_PATTERN.findall(question.lower()))
+    if not question_tokens:
+        return 0.0
+    document_tokens = set(TOKEN_PATTERN.findall(document.lower()))
+    return len(question_tokens & document_tokens) / len(question_tokens)
+
+
+def cascade_features(similarity: float, overlap: float, document_length: int) -> np.ndarray:
+    return np.array([similarity, overlap, math.log1p(document_length) / 10], dtype=np.float32)
+
+
+class LogisticScorer:
+    """grader 로그로 학습한 logistic regression. weights 의 마지막 값은 bias 입니다."""
+
+    def __init__(self, weights: List[float]):
+        self.weights = np.asarray(weights, dtype=np.float32)
+
+    def __call__(self, features: np.ndarray) -> np.ndarray:
+        logits = features @ self.weights[:-1] + self.weights[-1]
+        return 1 / (1 + np.exp(-logits))
+
+
+class GradingCascade:
+    """
+    질문 하나와 문서 여러 개의 관련성을 판정합니다.
+
+    Args:
+        name: 로그와 통계에 사용할 grader 이름 (retrieval.grade_chain 등).
+        llm_grader: (질문, 문서 목록) 을 받아 관련 여부 목록을 돌려주는 LLM grader.
+        low / high: 이 범위 밖의 cosine similarity 는 LLM 없이 no / yes 로 판정합니다.
+        classifier_path: 이 grader 로 학습된 LogisticScorer 파일. 없으면 embedding cosine similarity 를 점수로 사용합니다.
+        classifier_low / classifier_high: classifier 확률의 threshold. None 이면 classifier 파일의 값을 사용합니다.
+        log_path: LLM 판정 결과를 기록할 jsonl 파일.
+        shadow_rate: cascade 판정과 상관없이 LLM 으로 판정하고 기록할 호출의 비율.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        llm_grader: Callable[[str, List[str]], List[bool]],
+        low: float = 0.2,
+        high: float = 0.55,
+        classifier_path: Optional[str] = None,
+        classifier_low: Optional[float] = None,
+        classifier_high: Optional[float] = None,
+        log_path: Optional[str] = None,
+        shadow_rate: float = 0.0,
+    ):
+        self.name = name
+        self.llm_grader = llm_grader
+        self.low = low
+        self.high = high
+        self.log_path = log_path
+        self.shadow_rate = shadow_rate
+        self.embeddings = load_embedding_model()
+        self.scorer = None
+        if classifier_path and os.path.exists(classifier_path):
+            with open(classifier_path, "r", encoding="utf-8") as f:
+                classifier = json.load(f)
+            if classifier.get("grader", name) != name:
+                raise ValueError(f"{classifier_path} was trained for {classifier['grader']}, not {name}")
+            self.scorer = LogisticScorer(classifier["weights"])
+            # similarity 기준의 low / high 는 확률에 맞지 않으므로, 설정이 없으면 학습 스크립트가 고른 threshold 를 사용합니다.
+            self.low = classifier_low if classifier_low is not None else classifier["low"]
+            self.high = classifier_high if classifier_high is not None else classifier["high"]
+            source = "config" if classifier_low is not None or classifier_high is not None else "classifier file"
+            print(f"[grading_cascade] {name}: {classifier_path} (low={self.low}, high={self.high} from {source})")
+        self._lock = threading.Lock()
+        self._stats = {
+            "cascade_yes": 0,
+            "cascade_no": 0,
+            "llm": 0,
+            "shadow_llm": 0,
+            "all_rejected": 0,
+            "reused_embeddings": 0,
+        }
+
+    def _embed(self, question: str, documents: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """retriever 가 보관한 embedding 을 재사용하고, 없는 텍스트만 embedding 합니다."""
+        query_embedding = recent_embeddings.get(question)
+        if query_embedding is None:
+            query_embedding = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        cached = [recent_embeddings.get(document) for document in documents]
+        # 다른 모델로 만든 embedding 이 섞이지 않도록 차원이 같은 것만 재사용합니다.
+        cached = [e if e is not None and e.shape == query_embedding.shape else None for e in cached]
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+        if missing:
+            embedded = self.embeddings.embed_documents([documents[i] for i in missing])
+            for i, embedding in zip(missing, embedded):
+                cached[i] = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._stats["reused_embeddings"] += len(documents) - len(missing)
+        return query_embedding, np.stack(cached)
+
+    def score(self, question: str, documents: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        query_embedding, document_embeddings = self._embed(question, documents)
+        similarity = document_embeddings @ query_embedding
+        similarity /= np.linalg.norm(document_embeddings, axis=1) * np.linalg.norm(query_embedding) + 1e-8
+        features = np.stack(
+            [cascade_features(s, lexical_overlap(question, d), len(d)) for s, d in zip(similarity, documents)]
+        )
+        scores = self.scorer(features) if self.scorer is not None else similarity
+        return scores, features
+
+    def grade(self, question: str, documents: List[str]) -> List[bool]:
+        if not documents:
+            return []
+        scores, features = self.score(question, documents)
+        cascade_grades: List[Optional[bool]] = [None] * len(documents)
+        for i, score in enumerate(scores):
+            if score >= self.high:
+                cascade_grades[i] = True
+            elif score <= self.low:
+                cascade_grades[i] = False
+
+        shadow = random.random() < self.shadow_rate
+        grades = list(cascade_grades)
+        all_rejected = all(grade is False for grade in grades)
+        if all_rejected:
+            # 모두 거절하면 검색이 query 를 바꿔 다시 시도하므로, threshold 만으로 결정하지 않고 LLM 에 맡깁니다.
+            grades = [None] * len(documents)
+        ambiguous = [i for i, grade in enumerate(grades) if grade is None or shadow]
+        with self._lock:
+            if all_rejected:
+                self._stats["all_rejected"] += 1
+            self._stats["llm"] += grades.count(None)
+            # shadow 호출은 확실한 경우도 LLM 을 호출하므로 절감한 호출로 세지 않습니다.
+            if shadow:
+                self._stats["shadow_llm"] += len(ambiguous) - grades.count(None)
+            else:
+                self._stats["cascade_yes"] += grades.count(True)
+                self._stats["cascade_no"] += grades.count(False)
+
+        if ambiguous:
+            llm_grades = self.llm_grader(question, [documents[i] for i in ambiguous])
+            for i, grade in zip(ambiguous, llm_grades):
+                grades[i] = grade
+            self._log(question, [(documents[i], features[i], grades[i], cascade_grades[i]) for i in ambiguous])
+        return grades
+
+    def _log(self, question: str, decisions):
+        if not self.log_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+        with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+            for document, features, grade, cascade_grade in decisions:
+                record = {
+                    "grader": self.name,
+                    "question": question,
+                    "document": document,
+                    "similarity": float(features[0]),
+                    "overlap": float(features[1]),
+                    "document_length": len(document),
+                    "label": bool(grade),
+                    "cascade_decision": cascade_grade,
+                }
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            llm_calls_saved = self._stats["cascade_yes"] + self._stats["cascade_no"]
+            total = llm_calls_saved + self._stats["llm"] + self._stats["shadow_llm"]
+            return {
+                **self._stats,
+                "low": self.low,
+                "high": self.high,
+                "scorer": "classifier" if self.scorer is not None else "similarity",
+                "llm_calls_saved_ratio": round(llm_calls_saved / total, 4) if total else 0.0,
+            }
+
+
+_cascades: Dict[str, GradingCascade] = {}
+
+
+def load_grading_cascade(name: str, llm_grader: Callable[[str, List[str]], List[bool]]) -> Optional[GradingCascade]:
+    """secret.yaml 의 grading_cascade 설정이 켜져 있으면 name 용 cascade 를 생성합니다."""
+    config = load_secret().get("grading_cascade", {})
+    if not config.get("enabled", False):
+        return None
+    classifier_dir = config.get("classifier_dir", os.path.join(data_dir, "grader_cascade"))
+    cascade = GradingCascade(
+        name,
+        llm_grader,
+        low=config.get("low", 0.2),
+        high=config.get("high", 0.55),
+        classifier_path=os.path.join(classifier_dir, f"{name}.json"),
+        classifier_low=config.get("classifier_low"),
+        classifier_high=config.get("classifier_high"),
+        log_path=config.get("log_path", os.path.join(data_dir, "grader_decisions.jsonl")),
+        shadow_rate=config.get("shadow_rate", 0.0),
+    )
+    _cascades[name] = cascade
+    return cascade
+
+
+def cascade_stats() -> Dict[str, Dict[str, float]]:
+    """grader 별 cascade 판정 수, LLM 호출 수, LLM 호출 절감 비율을 반환합니다."""
+    return {name: cascade.stats() for name, cascade in _cascades.items()}
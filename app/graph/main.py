@@ -3,16 +3,19 @@ from pydantic import BaseModel, Field
 
 from langgraph.graph import START, StateGraph, END
 from langgraph.graph.message import add_messages
-from langgraph.checkpoint.memory import MemorySaver
 
 from langchain import hub
 from langchain_core.messages import AIMessage, HumanMessage, BaseMessage, RemoveMessage, ToolMessage
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableConfig
 
-from graph.web_search import app as web_search_graph
-from graph.retrieval import app as retrieval_graph
+from graph.web_search import app as web_search_graph, search as web_search_prefetch
+from graph.retrieval import app as retrieval_graph, retrieval as vectorstore_retriever
 from graph.additional_tool import app as tools_graph
+from graph.checkpointer import load_checkpointer
+from graph.speculative import speculative_router
+from graph.memory import load_conversation_memory
 from utils import load_chat_model, graph_to_png
 
 
@@ -55,7 +58,10 @@ class Router(BaseModel):
 
 
 model = load_chat_model(model="gpt-4o-mini", stream=True)
-routing_model = model.with_structured_output(Router)
+summary_model = load_chat_model(model="gpt-4o-mini", stream=False, lane="background")
+routing_model = load_chat_model(
+    model="gpt-4o-mini", temperature=0, stream=False, chain_name="routing_chain", lane="routing"
+).with_structured_output(Router)
 
 chat_prompt = """
 You are a helpful and friendly assistant designed for engaging conversations with users. 
@@ -87,10 +93,10 @@ You are an expert at routing a user question to ["", "web_search", "vectorstore"
 """
 routing_prompt_template = ChatPromptTemplate([("system", routing_prompt), ("human", "{question}")])
 routing_chain = routing_prompt_template | routing_model
+conversation_memory = load_conversation_memory()
 
 
-def summarize_history(state: MainState):
-    summary = state.get("summary", "")
+def summary_instruction(summary: str) -> HumanMessage:
     if summary:
         summary_message = (
             f"This is summary of the conversation to date: {summary}\n\n"
@@ -98,50 +104,70 @@ def summarize_history(state: MainState):
         )
     else:
         summary_message = "Create a summary of the conversation above in Korean:"
+    return HumanMessage(content=summary_message)
+
 
-    messages = state["messages"] + [HumanMessage(content=summary_message)]
-    response = model.invoke(messages)
+def summarize_history(state: MainState, config: RunnableConfig):
+    summary = state.get("summary", "")
     delete_messages = [RemoveMessage(id=m.id) for m in state["messages"][:-2]]
+    thread_id = config.get("configurable", {}).get("thread_id")
+    if conversation_memory is None or thread_id is None:
+        messages = state["messages"] + [summary_instruction(summary)]
+        response = summary_model.invoke(messages)
+        return {"summary": response.content, "messages": delete_messages}
+
+    # 지울 메시지는 기억 저장소에 보관하고, 요약은 summary_every 개의 turn 이 쌓였을 때만 갱신합니다.
+    pending_turns = conversation_memory.archive(thread_id, state["messages"][:-2])
+    if pending_turns is None:
+        return {"messages": delete_messages}
+    response = summary_model.invoke([HumanMessage(content="\n\n".join(pending_turns)), summary_instruction(summary)])
     return {"summary": response.content, "messages": delete_messages}
 
 
-def chat(state: MainState):
+def chat(state: MainState, config: RunnableConfig):
     summary = state.get("summary", "")
     context = state.get("documents", "")
     tools_information = state.get("tools_information", [])
+    chat_history = summary
+    thread_id = config.get("configurable", {}).get("thread_id")
+    if conversation_memory is not None and thread_id is not None:
+        # 요약에서 빠진 세부 내용은 현재 질문과 관련된 과거 turn 으로 보충합니다.
+        recalled = conversation_memory.recall(thread_id, state["messages"][-1].content)
+        if recalled:
+            chat_history = f"{summary}\n\nRelevant earlier turns:\n" + "\n\n".join(recalled)
     response = chat_chain.invoke(
         {
             "question": state["messages"],
-            "chat_history": summary,
+            "chat_history": chat_history,
             "context": context,
             "tools_information": tools_information,
         }
     )
-    return {"messages": AIMessage(response)}
+    # 검색 결과와 tool 결과는 이번 turn 에만 사용합니다. checkpointer 에 남아 다음 turn 의 context 로 쓰이지 않도록 비웁니다.
+    return {"messages": AIMessage(response), "documents": [], "tools_information": []}
 
 
-def web_search(state: MainState):
+def web_search(state: MainState, config: RunnableConfig):
     messages = state["messages"]
     summary = state.get("summary")
-    response = web_search_graph.invoke(
-        {
-            "messages": messages,
-            "summary": summary,
-        }
-    )
-    return {"context": response}
+    inputs = {"messages": messages, "summary": summary}
+    prefetched = speculative_router.claim(config.get("configurable", {}).get("thread_id"), "web_search")
+    if prefetched is not None:
+        inputs.update({"search_query": [messages[-1].content], **prefetched})
+    response = web_search_graph.invoke(inputs)
+    # 페이지 본문 수집이 켜져 있으면 URL metadata 가 있는 문단 Document 를 사용합니다.
+    return {"documents": response.get("documents") or response["content"], "tools_information": []}
 
 
-def retrieval(state: MainState):
+def retrieval(state: MainState, config: RunnableConfig):
     messages = state["messages"]
     summary = state.get("summary")
-    response = retrieval_graph.invoke(
-        {
-            "messages": messages,
-            "summary": summary,
-        }
-    )
-    return {"context": response}
+    inputs = {"messages": messages, "summary": summary}
+    prefetched = speculative_router.claim(config.get("configurable", {}).get("thread_id"), "vectorstore")
+    if prefetched is not None:
+        inputs.update({"search_query": [messages[-1].content], "contents": prefetched})
+    response = retrieval_graph.invoke(inputs)
+    return {"documents": response["contents"], "tools_information": []}
 
 
 def tools(state: MainState):
@@ -154,20 +180,43 @@ def tools(state: MainState):
             tools_information.append({"type": "tool_call", "name": tool_call["name"], "args": tool_call["args"]})
         if isinstance(message, ToolMessage):
             tools_information.append({"type": "tool_result", "name": message.name, "content": message.content})
-    return {"tools_information": tools_information}
+    return {"tools_information": tools_information, "documents": []}
+
+
+def speculate_route(thread_id: str, question: str):
+    # 라우터 결과를 기다리지 않고, 예측한 경로의 첫 단계(검색) 를 미리 시작합니다.
+    route = speculative_router.predict(thread_id, question)
+    if route == "vectorstore":
+        speculative_router.start(thread_id, route, vectorstore_retriever.invoke, question)
+    elif route == "web_search":
+        speculative_router.start(thread_id, route, web_search_prefetch, question)
 
 
-def routing_question(state: MainState):
+def routing_question(state: MainState, config: RunnableConfig):
     question = state["messages"][-1].content
-    source = routing_chain.invoke({"question": question})
-    if source.datasource == "":
-        return "chat"
-    elif source.datasource == "web_search":
-        return "web_search"
-    elif source.datasource == "vectorstore":
-        return "vectorstore"
-    elif source.datasource == "tools":
-        return "tools"
+    thread_id = config.get("configurable", {}).get("thread_id")
+    if speculative_router.enabled and thread_id:
+        speculate_route(thread_id, question)
+
+    route = None
+    try:
+        source = routing_chain.invoke({"question": question})
+        if source.datasource == "":
+            route = "chat"
+        elif source.datasource == "web_search":
+            route = "web_search"
+        elif source.datasource == "vectorstore":
+            route = "vectorstore"
+        elif source.datasource == "tools":
+            route = "tools"
+    finally:
+        # 라우터 호출이 실패해도 미리 시작한 작업이 남지 않도록 정리합니다.
+        if speculative_router.enabled and thread_id:
+            if route is None:
+                speculative_router.abandon(thread_id)
+            else:
+                speculative_router.resolve(thread_id, route)
+    return route
 
 
 def need_summarize_history(state: MainState):
@@ -194,6 +243,6 @@ workflow.add_edge("tools", "chat")
 workflow.add_conditional_edges("chat", need_summarize_history, {"summarize_history": "summarize_history", END: END})
 workflow.add_edge("summarize_history", END)
 
-memory = MemorySaver()
+memory = load_checkpointer()
 app = workflow.compile(memory)
 # graph_to_png(app, "main_graph.png")
@@ -0,0 +1,332 @@
+"""
+thread_id 별 장기 대화 기억 저장소입니다.
+
+메시지가 많아지면 summarize_history 가 매번 LLM 으로 요약을 다시 만드는 대신,
+오래된 대화 turn(질문 + 답변) 을 한 번만 embedding 해서 thread 별 로컬 벡터 index 에 보관하고 state 에서 지웁니다.
+chat 노드는 현재 질문과 관련된 과거 turn 만 꺼내서 요약과 함께 사용합니다.
+요약은 summary_every 개의 turn 이 보관될 때마다 한 번만 갱신합니다.
+
+persist_dir 를 지정하면 thread 별 turn 텍스트와 embedding 을 파일(.jsonl) 에 한 줄씩 덧붙여 저장하고,
+메모리에는 최근에 사용한 max_threads 개의 thread 만 올려 둡니다.
+파일은 덧붙이기만 하므로 보관할 때 기존 turn 을 다시 쓰지 않고, 읽을 때도 마지막으로 읽은 위치 이후만 읽습니다.
+server.py 를 여러 worker 로 실행할 때는 모든 worker 가 같은 persist_dir 를 사용해야 합니다.
+보관할 때는 thread 별 파일 lock 을 잡고 다른 worker 가 덧붙인 줄을 읽은 뒤 추가하므로,
+요약 주기를 worker 끼리 맞추고 다른 worker 가 보관한 turn 도 보여줍니다. embedding 은 lock 을 잡기 전에 계산합니다.
+persist_dir 가 없으면 worker 프로세스마다 따로 기억합니다.
+
+Example (secret.yaml):
+    conversation_memory:
+      enabled: true
+      top_k: 3
+      min_score: 0.3
+      summary_every: 20
+      max_threads: 1000
+      persist_dir: ./data/memory
+"""
+
+import base64
+import json
+import os
+import re
+import threading
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+
+from settings import load_secret
+
+try:
+    import fcntl
+except ImportError:  # Windows 에서는 프로세스 간 lock 없이 동작합니다.
+    fcntl = None
+from utils import get_role_from_messages, load_embedding_model
+
+
+def messages_to_turns(messages: List[BaseMessage]) -> List[str]:
+    """질문과 바로 뒤의 답변을 하나의 turn 텍스트로 묶습니다."""
+    turns: List[str] = []
+    question: Optional[str] = None
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            if question is not None:
+                turns.append(f"사용자: {question}")
+            question = message.content
+        elif isinstance(message, AIMessage) and message.content:
+            answer = f"어시스턴트: {message.content}"
+            turns.append(f"사용자: {question}\n{answer}" if question is not None else answer)
+            question = None
+    if question is not None:
+        turns.append(f"사용자: {question}")
+    return turns
+
+
+def split_turn(turn: str) -> List[Dict[str, str]]:
+    """messages_to_turns 로 묶은 turn 텍스트를 {"role", "content"} 메시지 목록으로 되돌립니다."""
+    if turn.startswith("어시스턴트: "):
+        return [{"role": "assistant", "content": turn[len("어시스턴트: ") :]}]
+    question, separator, answer = turn[len("사용자: ") :].partition("\n어시스턴트: ")
+    messages = [{"role": "user", "content": question}]
+    if separator:
+        messages.append({"role": "assistant", "content": answer})
+    return messages
+
+
+class ThreadMemory:
+    """thread 하나의 turn 텍스트와 정규화된 embedding 행렬."""
+
+    def __init__(self):
+        self.texts: List[str] = []
+        self.embeddings: Optional[np.ndarray] = None
+        self.turns_since_summary = 0
+        # 파일에서 읽은 bytes 수. 다음에는 이 위치 이후에 덧붙은 줄만 읽습니다.
+        self.offset = 0
+        # 같은 thread 의 보관 / 검색만 서로 기다리도록 thread 별로 lock 을 둡니다.
+        self.lock = threading.Lock()
+
+    def add(self, texts: List[str], embeddings: np.ndarray):
+        if not texts:
+            return
+        embeddings = (embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8)).astype(np.float32)
+        self.texts.extend(texts)
+        self.embeddings = embeddings if self.embeddings is None else np.vstack([self.embeddings, embeddings])
+        self.turns_since_summary += len(texts)
+
+    def search(self, query_embedding: np.ndarray, k: int, min_score: float) -> List[Tuple[float, int, str]]:
+        if self.embeddings is None:
+            return []
+        scores = self.embeddings @ (query_embedding / (np.linalg.norm(query_embedding) + 1e-8))
+        top = np.argsort(-scores)[:k]
+        return [(float(scores[i]), int(i), self.texts[i]) for i in top if scores[i] >= min_score]
+
+    @property
+    def nbytes(self) -> int:
+        embedding_bytes = self.embeddings.nbytes if self.embeddings is not None else 0
+        return embedding_bytes + sum(len(text.encode()) for text in self.texts)
+
+
+class ConversationMemory:
+    def __init__(
+        self,
+        top_k: int = 3,
+        min_score: float = 0.3,
+        summary_every: int = 20,
+        max_threads: int = 1000,
+        persist_dir: Optional[str] = None,
+    ):
+        self.top_k = top_k
+        self.min_score = min_score
+        self.summary_every = summary_every
+        self.max_threads = max_threads
+        self.persist_dir = persist_dir
+        self.embeddings = load_embedding_model()
+        self._threads: "OrderedDict[str, ThreadMemory]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "archived_turns": 0,
+            "summaries_generated": 0,
+            "summarizations_avoided": 0,
+            "recalls": 0,
+            "recalled_turns": 0,
+        }
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    def _path(self, thread_id: str) -> str:
+        return os.path.join(self.persist_dir, re.sub(r"[^\w-]", "_", str(thread_id)))
+
+    @contextmanager
+    def _file_lock(self, thread_id: str):
+        """persist_dir 를 공유하는 다른 프로세스와 같은 thread 파일을 동시에 고치지 않도록 lock 을 잡습니다."""
+        if not self.persist_dir or fcntl is None:
+            yield
+            return
+        with open(self._path(thread_id) + ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _get(self, thread_id: str) -> ThreadMemory:
+        """thread 의 기억을 가져옵니다. max_threads 를 넘으면 오래된 thread 를 내립니다. self._lock 안에서 호출합니다."""
+        memory = self._threads.get(thread_id)
+        if memory is None:
+            memory = ThreadMemory()
+            self._threads[thread_id] = memory
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+        else:
+            self._threads.move_to_end(thread_id)
+        return memory
+
+    def _refresh(self, thread_id: str, memory: ThreadMemory):
+        """파일에 새로 덧붙은 줄을 읽어 memory 에 반영합니다. memory.lock 안에서 호출합니다."""
+        if not self.persist_dir:
+            return
+        path = self._path(thread_id) + ".jsonl"
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        if size < memory.offset:
+            # 파일이 지워졌다가 다시 만들어졌으면 처음부터 읽습니다.
+            memory.texts, memory.embeddings, memory.turns_since_summary, memory.offset = [], None, 0, 0
+        if size == memory.offset:
+            return
+        with open(path, "rb") as f:
+            f.seek(memory.offset)
+            data = f.read(size - memory.offset)
+        # 다른 worker 가 쓰고 있는 마지막 줄은 다 쓰인 뒤에 읽습니다.
+        data = data[: data.rfind(b"\n") + 1]
+        texts: List[str] = []
+        embeddings: List[np.ndarray] = []
+        for line in data.splitlines():
+            record = json.loads(line)
+            if record.get("summarized"):
+                memory.add(texts, np.array(embeddings))
+                texts, embeddings = [], []
+                memory.turns_since_summary = 0
+                continue
+            texts.append(record["text"])
+            embeddings.append(np.frombuffer(base64.b64decode(record["embedding"]), dtype=np.float32))
+        memory.add(texts, np.array(embeddings))
+        memory.offset += len(data)
+
+    def _append(self, thread_id: str, memory: ThreadMemory, records: List[Dict[str, Any]]):
+        """보관한 turn 을 파일 끝에 덧붙입니다. memory.lock 과 파일 lock 안에서 _refresh 뒤에 호출합니다."""
+        if not self.persist_dir:
+            return
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+        with open(self._path(thread_id) + ".jsonl", "ab") as f:
+            f.write(data)
+        memory.offset += len(data)
+
+    def archive(self, thread_id: str, messages: List[BaseMessage]) -> Optional[List[str]]:
+        """
+        state 에서 지울 메시지를 turn 단위로 embedding 해서 보관합니다.
+
+        Returns:
+            List[str] | None: 요약을 갱신할 때가 되었으면 마지막 요약 이후에 보관된 turn 목록, 아니면 None.
+        """
+        texts = messages_to_turns(messages)
+        if not texts:
+            return None
+        embeddings = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-8
+        records = [
+            {"text": text, "embedding": base64.b64encode(embedding.tobytes()).decode("ascii")}
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            memory = self._get(thread_id)
+        # lock 은 다른 worker 가 덧붙인 줄을 읽고, 추가하고, 덧붙이는 동안만 잡습니다.
+        with memory.lock, self._file_lock(thread_id):
+            self._refresh(thread_id, memory)
+            memory.add(texts, embeddings)
+            pending = None
+            if memory.turns_since_summary >= self.summary_every:
+                pending = memory.texts[-memory.turns_since_summary :]
+                memory.turns_since_summary = 0
+                records.append({"summarized": True})
+            self._append(thread_id, memory, records)
+        with self._lock:
+            self._stats["archived_turns"] += len(texts)
+            self._stats["summaries_generated" if pending is not None else "summarizations_avoided"] += 1
+        return pending
+
+    def recall(self, thread_id: str, question: str) -> List[str]:
+        """현재 질문과 관련된 과거 turn 을 대화 순서대로 반환합니다."""
+        with self._lock:
+            memory = self._get(thread_id)
+        with memory.lock:
+            self._refresh(thread_id, memory)
+            if not memory.texts:
+                return []
+        query_embedding = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        with memory.lock:
+            results = memory.search(query_embedding, self.top_k, self.min_score)
+        with self._lock:
+            self._stats["recalls"] += 1
+            self._stats["recalled_turns"] += len(results)
+        return [text for _, _, text in sorted(results, key=lambda result: result[1])]
+
+    def turns(self, thread_id: str) -> List[str]:
+        """보관된 turn 텍스트 전체를 대화 순서대로 반환합니다."""
+        with self._lock:
+            memory = self._get(thread_id)
+        with memory.lock:
+            self._refresh(thread_id, memory)
+            return list(memory.texts)
+
+    def stats(self) -> Dict[str, Any]:
+        """요약 호출 절감 수와 thread 별 메모리 사용량(embedding + 텍스트 bytes) 을 반환합니다."""
+        with self._lock:
+            footprint = {thread_id: (len(m.texts), m.nbytes) for thread_id, m in self._threads.items()}
+            stats: Dict[str, Any] = dict(self._stats)
+        total_bytes = sum(nbytes for _, nbytes in footprint.values())
+        largest = sorted(footprint.items(), key=lambda item: item[1][1], reverse=True)[:10]
+        stats.update(
+            {
+                "threads_in_memory": len(footprint),
+                "total_bytes": total_bytes,
+                "avg_bytes_per_thread": total_bytes // len(footprint) if footprint else 0,
+                "largest_threads": {thread_id: {"turns": n, "bytes": b} for thread_id, (n, b) in largest},
+            }
+        )
+        return stats
+
+
+_memory: Optional[ConversationMemory] = None
+
+
+def load_conversation_memory() -> Optional[ConversationMemory]:
+    """secret.yaml 의 conversation_memory 설정이 켜져 있으면 ConversationMemory 를 생성합니다."""
+    global _memory
+    config = dict(load_secret().get("conversation_memory", {}))
+    if not config.pop("enabled", False):
+        return None
+    _memory = ConversationMemory(**config)
+    return _memory
+
+
+def load_thread_history(graph, thread_id: str, limit: Optional[int] = None, state=None) -> Dict[str, Any]:
+    """
+    checkpointer 의 state 와 기억 저장소에 보관된 turn 을 합쳐서 화면에 보여줄 대화 내역을 만듭니다.
+
+    Args:
+        graph: checkpointer 로 compile 된 main 그래프.
+        limit: 마지막 limit 개의 메시지만 반환합니다. None 이면 전체를 반환합니다.
+        state: 호출한 쪽에서 이미 읽은 graph.get_state 결과. None 이면 새로 읽습니다.
+
+    Returns:
+        Dict: checkpoint_id(대화가 바뀌면 달라지는 값), summary, total(전체 메시지 수), messages.
+    """
+    if state is None:
+        state = graph.get_state(RunnableConfig({"configurable": {"thread_id": thread_id}}))
+    messages = [
+        {"role": get_role_from_messages(msg), "content": msg.content}
+        for msg in state.values.get("messages", [])
+        if isinstance(msg, (HumanMessage, AIMessage)) and msg.content
+    ]
+    if _memory is not None:
+        archived = [message for turn in _memory.turns(thread_id) for message in split_turn(turn)]
+        messages = archived + messages
+    total = len(messages)
+    if limit is not None:
+        messages = messages[-limit:] if limit > 0 else []
+    return {
+        "checkpoint_id": (state.config or {}).get("configurable", {}).get("checkpoint_id"),
+        "summary": state.values.get("summary", ""),
+        "total": total,
+        "messages": messages,
+    }
+
+
+def memory_stats() -> Dict[str, Any]:
+    return _memory.stats() if _memory is not None else {}
@@ -0,0 +1,382 @@
+"""
+web_search 결과 페이지의 본문을 동시에 가져와서 질문과 관련된 문단만 골라내는 단계입니다.
+
+DuckDuckGo 검색 결과는 짧은 snippet 만 있어서 relevant_check 가 자주 실패하고 transform_query 를 다시 호출합니다.
+상위 결과 URL 을 하나의 async HTTP client(connection pool) 로 동시에 가져오고, host 별 동시 연결 수, timeout,
+응답 크기를 제한합니다. HTML 에서 본문을 추출해 chunk 로 나눈 뒤 BM25 로 질문과 관련된 문단만 LLM 없이 고릅니다.
+
+URL 은 외부 검색 결과에서 오므로 서버가 내부망으로 요청하지 않도록 http/https 만 허용하고,
+host 가 loopback / private / link-local 등 공인 주소가 아닌 IP 로 resolve 되면 요청하지 않습니다.
+redirect 는 직접 따라가면서 매번 같은 검사를 합니다. 검사 뒤 연결할 때 DNS 응답이 바뀌는 경우(DNS rebinding) 까지
+막으려면 egress proxy 나 방화벽을 함께 사용해야 합니다.
+
+Example (secret.yaml):
+    web_page_fetch:
+      enabled: true
+      max_pages: 5
+      max_connections: 10
+      max_connections_per_host: 2
+      timeout: 5
+      total_timeout: 8
+      max_bytes: 2000000
+      chunk_size: 800
+      chunk_overlap: 100
+      passages_per_page: 2
+      max_passages: 6
+      max_redirects: 5
+"""
+
+import asyncio
+import ipaddress
+import math
+import re
+import socket
+import threading
+import time
+
+from collections import Counter
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from settings import load_secret
+
+TOKEN_PATTERN = re.compile(r"[0-9A-Za-z가-힣]+")
+HANGUL_PATTERN = re.compile(r"[가-힣]")
+CHARSET_PATTERN = re.compile(rb"charset=[\"']?([\w-]+)", re.IGNORECASE)
+USER_AGENT = "Mozilla/5.0 (compatible; okestro-chatbot/1.0)"
+
+
+class BlockedURLError(ValueError):
+    """http/https 가 아니거나 공인 주소가 아닌 host 로 향하는 URL."""
+
+
+class MainTextExtractor(HTMLParser):
+    """script, nav, footer 등을 제외하고 block 단위 텍스트를 모읍니다. 링크 비율이 높은 block 은 메뉴로 보고 버립니다."""
+
+    SKIP_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg", "iframe", "template"}
+    BLOCK_TAGS = {
+        "p", "div", "li", "ul", "ol", "section", "article", "main", "br", "tr", "td", "th", "table",
+        "pre", "blockquote", "dd", "dt", "h1", "h2", "h3", "h4", "h5", "h6",
+    }  # fmt: skip
+
+    def __init__(self, min_block_chars: int = 30, max_link_density: float = 0.5):
+        super().__init__(convert_charrefs=True)
+        self.min_block_chars = min_block_chars
+        self.max_link_density = max_link_density
+        self.title = ""
+        self.blocks: List[str] = []
+        self._skip_depth = 0
+        self._in_title = False
+        self._link_depth = 0
+        self._current: List[str] = []
+        self._link_chars = 0
+        self._heading = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "a":
+            self._link_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self._flush()
+            self._heading = tag in ("h1", "h2", "h3", "h4", "h5", "h6")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag == "title":
+            self._in_title = False
+        elif tag == "a":
+            self._link_depth = max(self._link_depth - 1, 0)
+        elif tag in self.BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._in_title:
+            self.title += data
+            return
+        self._current.append(data)
+        if self._link_depth:
+            self._link_chars += len(data.strip())
+
+    def _flush(self):
+        text = " ".join("".join(self._current).split())
+        link_chars, heading = self._link_chars, self._heading
+        self._current, self._link_chars, self._heading = [], 0, False
+        if not text:
+            return
+        if link_chars / len(text) > self.max_link_density:
+            return
+        if heading or len(text) >= self.min_block_chars:
+            self.blocks.append(text)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def extract_main_text(html: str) -> Dict[str, str]:
+    """HTML 에서 title 과 본문 텍스트를 추출합니다."""
+    extractor = MainTextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return {"title": " ".join(extractor.title.split()), "text": "\n".join(extractor.blocks)}
+
+
+def tokenize(text: str) -> List[str]:
+    """단어 토큰에 한글 단어의 2-gram 을 더합니다. 조사가 붙은 한국어 단어도 질문과 매칭되도록 하기 위함입니다."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if HANGUL_PATTERN.search(token) and len(token) > 2:
+            tokens.extend(token[i : i + 2] for i in range(len(token) - 1))
+    return tokens
+
+
+def bm25_scores(query: str, passages: List[str], k1: float = 1.5, b: float = 0.75) -> List[float]:
+    query_tokens = set(tokenize(query))
+    passage_tokens = [Counter(tokenize(passage)) for passage in passages]
+    if not query_tokens or not passages:
+        return [0.0] * len(passages)
+    lengths = [sum(tokens.values()) for tokens in passage_tokens]
+    average_length = sum(lengths) / len(lengths) or 1.0
+    document_frequency = Counter(token for tokens in passage_tokens for token in query_tokens if token in tokens)
+    scores = []
+    for tokens, length in zip(passage_tokens, lengths):
+        score = 0.0
+        for token in query_tokens:
+            frequency = tokens.get(token, 0)
+            if not frequency:
+                continue
+            idf = math.log(1 + (len(passages) - document_frequency[token] + 0.5) / (document_frequency[token] + 0.5))
+            score += idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * length / average_length))
+        scores.append(score)
+    return scores
+
+
+@dataclass
+class FetchedPage:
+    url: str
+    title: str
+    text: str
+    truncated: bool = False
+
+
+class PageFetcher:
+    """
+    검색 결과 URL 을 동시에 가져오고 질문과 관련된 문단을 Document 로 반환합니다.
+
+    graph node 는 동기 함수이므로, 전용 event loop 스레드에서 AsyncClient 하나를 계속 사용해 connection 을 재사용합니다.
+    """
+
+    def __init__(
+        self,
+        max_pages: int = 5,
+        max_connections: int = 10,
+        max_connections_per_host: int = 2,
+        timeout: float = 5.0,
+        total_timeout: float = 8.0,
+        max_bytes: int = 2_000_000,
+        chunk_size: int = 800,
+        chunk_overlap: int = 100,
+        passages_per_page: int = 2,
+        max_passages: int = 6,
+        max_redirects: int = 5,
+        allow_private_hosts: bool = False,
+    ):
+        self.max_pages = max_pages
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.total_timeout = total_timeout
+        self.max_bytes = max_bytes
+        self.passages_per_page = passages_per_page
+        self.max_passages = max_passages
+        self.max_redirects = max_redirects
+        # 로컬 fixture 서버로 검증할 때만 True 로 설정합니다.
+        self.allow_private_hosts = allow_private_hosts
+        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="page-fetch", daemon=True).start()
+        self._lock = threading.Lock()
+        self._stats = {
+            "fetch_calls": 0,
+            "pages_requested": 0,
+            "pages_fetched": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "blocked": 0,
+            "skipped_non_html": 0,
+            "truncated": 0,
+            "bytes": 0,
+            "passages": 0,
+            "fetch_seconds": 0.0,
+        }
+
+    def _count(self, key: str, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections),
+                timeout=httpx.Timeout(self.timeout),
+                # redirect 대상도 검사해야 하므로 직접 따라갑니다.
+                follow_redirects=False,
+                headers={"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml"},
+            )
+        return self._client
+
+    async def _check_url(self, url: str):
+        """scheme 과 host 가 resolve 되는 모든 주소를 검사합니다. 허용되지 않으면 BlockedURLError 를 발생시킵니다."""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise BlockedURLError(url)
+        if self.allow_private_hosts:
+            return
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise httpx.ConnectError(str(e)) from e
+        for info in infos:
+            address = ipaddress.ip_address(info[4][0].split("%")[0])
+            if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+                address = address.ipv4_mapped
+            if not address.is_global or address.is_multicast:
+                raise BlockedURLError(url)
+
+    async def _fetch_one(self, url: str) -> Optional[FetchedPage]:
+        for _ in range(self.max_redirects + 1):
+            await self._check_url(url)
+            host = urlsplit(url).netloc
+            semaphore = self._host_semaphores.setdefault(host, asyncio.Semaphore(self.max_connections_per_host))
+            async with semaphore:
+                async with self._get_client().stream("GET", url) as response:
+                    if response.has_redirect_location:
+                        url = urljoin(url, response.headers["location"])
+                        continue
+                    response.raise_for_status()
+                    content_type = response.headers.get("content-type", "")
+                    if content_type and "html" not in content_type:
+                        self._count("skipped_non_html")
+                        return None
+                    body, truncated = bytearray(), False
+                    async for chunk in response.aiter_bytes():
+                        body.extend(chunk)
+                        if len(body) >= self.max_bytes:
+                            # 크기 제한을 넘으면 나머지는 읽지 않고 연결을 닫습니다.
+                            del body[self.max_bytes :]
+                            truncated = True
+                            break
+                    encoding = response.charset_encoding
+            break
+        else:
+            raise httpx.TooManyRedirects(f"Exceeded {self.max_redirects} redirects: {url}")
+        self._count("bytes", len(body))
+        self._count("truncated", int(truncated))
+        if encoding is None:
+            match = CHARSET_PATTERN.search(bytes(body[:4096]))
+            encoding = match.group(1).decode() if match else "utf-8"
+        try:
+            html = body.decode(encoding, errors="replace")
+        except LookupError:
+            html = body.decode("utf-8", errors="replace")
+        # HTML 파싱은 CPU 작업이므로 event loop 를 막지 않도록 별도 스레드에서 실행합니다.
+        return FetchedPage(url=url, truncated=truncated, **await asyncio.to_thread(extract_main_text, html))
+
+    async def _safe_fetch(self, url: str) -> Optional[FetchedPage]:
+        try:
+            return await self._fetch_one(url)
+        except httpx.TimeoutException:
+            self._count("timeouts")
+        except BlockedURLError:
+            self._count("blocked")
+        except (httpx.HTTPError, ValueError):
+            self._count("errors")
+        return None
+
+    async def afetch(self, urls: List[str]) -> List[FetchedPage]:
+        """urls 를 동시에 가져옵니다. total_timeout 안에 끝나지 않은 요청은 취소합니다."""
+        if not urls:
+            return []
+        tasks = [asyncio.ensure_future(self._safe_fetch(url)) for url in urls]
+        done, pending = await asyncio.wait(tasks, timeout=self.total_timeout)
+        for task in pending:
+            task.cancel()
+        self._count("timeouts", len(pending))
+        return [page for task in tasks if task in done and (page := task.result()) is not None]
+
+    def fetch(self, urls: List[str]) -> List[FetchedPage]:
+        urls = list(dict.fromkeys(urls))[: self.max_pages]
+        start = time.perf_counter()
+        pages = asyncio.run_coroutine_threadsafe(self.afetch(urls), self._loop).result()
+        self._count("fetch_calls")
+        self._count("pages_requested", len(urls))
+        self._count("pages_fetched", len(pages))
+        self._count("fetch_seconds", time.perf_counter() - start)
+        return pages
+
+    def select_passages(self, query: str, pages: List[FetchedPage]) -> List[Document]:
+        """페이지 별로 BM25 점수가 높은 passages_per_page 개를 고르고, 전체에서 max_passages 개를 반환합니다."""
+        candidates = []
+        for page in pages:
+            chunks = self.text_splitter.split_text(page.text)
+            scores = bm25_scores(query, chunks)
+            ranked = sorted(zip(scores, chunks), key=lambda pair: pair[0], reverse=True)
+            for score, chunk in ranked[: self.passages_per_page]:
+                if score > 0:
+                    metadata = {"source": page.url, "title": page.title, "score": round(score, 4)}
+                    candidates.append(Document(page_content=chunk, metadata=metadata))
+        candidates.sort(key=lambda document: document.metadata["score"], reverse=True)
+        documents = candidates[: self.max_passages]
+        self._count("passages", len(documents))
+        return documents
+
+    def fetch_documents(self, query: str, search_results: List[Dict[str, str]]) -> List[Document]:
+        """DuckDuckGoSearchAPIWrapper.results 의 결과(link, title, snippet) 로 관련 문단 Document 목록을 만듭니다."""
+        pages = self.fetch([result["link"] for result in search_results if result.get("link")])
+        return self.select_passages(query, pages)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["fetch_seconds"] = round(stats["fetch_seconds"], 3)
+        calls = stats["fetch_calls"]
+        stats["avg_fetch_seconds"] = round(stats["fetch_seconds"] / calls, 3) if calls else 0.0
+        stats["fetch_success_ratio"] = (
+            round(stats["pages_fetched"] / stats["pages_requested"], 4) if stats["pages_requested"] else 0.0
+        )
+        return stats
+
+
+_page_fetcher: Optional[PageFetcher] = None
+
+
+def load_page_fetcher() -> Optional[PageFetcher]:
+    """secret.yaml 의 web_page_fetch 설정이 켜져 있으면 PageFetcher 를 생성합니다."""
+    global _page_fetcher
+    config = dict(load_secret().get("web_page_fetch", {}))
+    if not config.pop("enabled", False):
+        return None
+    _page_fetcher = PageFetcher(**config)
+    return _page_fetcher
+
+
+def page_fetch_stats() -> Dict[str, float]:
+    """페이지 수집 횟수, 실패/timeout 수, 평균 수집 시간, 선택된 문단 수를 반환합니다."""
+    return _page_fetcher.stats() if _page_fetcher is not None else {}
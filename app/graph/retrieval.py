@@ -7,11 +7,19 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
 from utils import load_chat_model, graph_to_png
-from rag.pgvector.vectorstore import PostgresVectorstore
+from settings import use_stub_models
+from graph.cascade import load_grading_cascade
 
-vectorstore = PostgresVectorstore().create_chain()
-chain = vectorstore.chain
-retrieval = vectorstore.retriever
+if use_stub_models:
+    from stub_models import StubRetriever
+
+    retrieval = StubRetriever()
+else:
+    from rag.pgvector.vectorstore import PostgresVectorstore
+
+    vectorstore = PostgresVectorstore().create_chain()
+    chain = vectorstore.chain
+    retrieval = vectorstore.retriever
 
 
 class RetrievalState(TypedDict):
@@ -19,6 +27,7 @@ class RetrievalState(TypedDict):
     search_query: Annotated[List[str], "Web search query list"]
     summary: Annotated[str, "Message histories summary"]
     contents: Annotated[List[str], "Finded content"]
+    rounds: Annotated[int, "Number of graded retrieval rounds"]
 
 
 class GradeDocuments(BaseModel):
@@ -27,8 +36,9 @@ class GradeDocuments(BaseModel):
     binary_score: str = Field(description="Documents are relevant to the question, 'yes' or 'no'")
 
 
-model = load_chat_model(temperature=0)
-structed_model_grader = model.with_structured_output(GradeDocuments)
+model = load_chat_model(temperature=0, stream=False, chain_name="retrieval.transform_query_chain", lane="grading")
+grader_model = load_chat_model(temperature=0, stream=False, chain_name="retrieval.grade_chain", lane="grading")
+structed_model_grader = grader_model.with_structured_output(GradeDocuments)
 
 
 transform_query_prompt = """
@@ -82,6 +92,16 @@ grade_prompt = ChatPromptTemplate.from_messages(
 grade_chain = grade_prompt | structed_model_grader
 
 
+def llm_grade(question: str, documents: List[str]) -> List[bool]:
+    scores = grade_chain.batch([{"question": question, "document": document} for document in documents])
+    return [score.binary_score == "yes" for score in scores]
+
+
+grade_cascade = load_grading_cascade("retrieval.grade_chain", llm_grade)
+# query 를 바꿔 다시 검색하는 최대 횟수. 넘으면 grading 결과와 상관없이 마지막 검색 결과를 사용합니다.
+max_rounds = 3
+
+
 def transform_query(state: RetrievalState):
     messages = state["messages"]
     summary = state.get("summary", "")
@@ -106,15 +126,25 @@ def grade_documents(state: RetrievalState):
     last_search_query = state["search_query"][-1]
     contents = state["contents"]
 
-    filtered_docs = []
-    for d in contents:
-        score = grade_chain.invoke({"question": last_search_query, "document": contents})
-        grade = score.binary_score
+    documents = [d.page_content for d in contents]
+    if grade_cascade is not None:
+        grades = grade_cascade.grade(last_search_query, documents)
+    else:
+        grades = llm_grade(last_search_query, documents)
+
+    filtered_docs = [d for d, grade in zip(contents, grades) if grade]
+    rounds = state.get("rounds", 0) + 1
+    if not filtered_docs and rounds >= max_rounds:
+        print(f"---GRADE: NO RELEVANT DOCUMENTS AFTER {rounds} ROUNDS, USE TOP-K")
+        filtered_docs = contents
+    return {"contents": filtered_docs, "rounds": rounds}
 
-        if grade == "yes":
-            filtered_docs.append(d)
 
-    return {"contents": filtered_docs}
+def has_prefetched_contents(state: RetrievalState):
+    # speculative routing 으로 미리 검색한 결과가 있으면 바로 grading 합니다.
+    if state.get("contents"):
+        return "grade_documents"
+    return "transform_query"
 
 
 def is_filtered_documents_ok(state: RetrievalState):
@@ -130,7 +160,9 @@ workflow.add_node("retrieve", retrieve)
 workflow.add_node("transform_query", transform_query)
 workflow.add_node("grade_documents", grade_documents)
 
-workflow.add_edge(START, "transform_query")
+workflow.add_conditional_edges(
+    START, has_prefetched_contents, {"grade_documents": "grade_documents", "transform_query": "transform_query"}
+)
 workflow.add_edge("transform_query", "retrieve")
 workflow.add_edge("retrieve", "grade_documents")
 workflow.add_conditional_edges(
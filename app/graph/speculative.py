@@ -0,0 +1,163 @@
+"""
+routing_question 의 LLM 호출과 가장 가능성이 높은 경로의 첫 단계를 동시에 실행하는 speculative routing 입니다.
+
+라우터가 결정을 내리기 전에 이전 대화의 경로와 질문의 키워드로 경로를 예측해서
+vectorstore 검색(query embedding + 유사도 검색) 또는 DuckDuckGo 검색을 미리 시작합니다.
+라우터가 같은 경로를 고르면 해당 노드가 결과를 가져가고, 다른 경로를 고르거나 라우터 호출이 실패하면 결과를 버립니다.
+이전 경로는 최근 max_threads 개의 thread 만 기억합니다.
+
+미리 검색은 라우터 결정 전에 시작해야 하므로 transform_query 로 바꾼 질문이 아니라 사용자 질문 원문으로 검색합니다.
+따라서 예측이 맞으면 첫 번째 검색의 query 가 달라집니다. (grading / relevant check 에서 탈락하면 이후에는
+원래대로 transform_query 를 거쳐 다시 검색합니다.) web_search 의 페이지 본문 수집(fetch_pages) 은 미리 검색한 결과에도
+그대로 적용됩니다.
+
+Example (secret.yaml):
+    speculative_routing:
+      enabled: true
+      max_workers: 4
+      max_threads: 10000
+"""
+
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from settings import load_secret
+
+VECTORSTORE_KEYWORDS = ("세법", "소득세", "법인세", "부가가치세", "상속세", "증여세", "세율", "공제", "과세", "국세", "조세", "세금")
+WEB_SEARCH_KEYWORDS = ("뉴스", "최신", "오늘", "요즘", "현재", "검색", "날씨", "가격", "news", "latest", "today")
+
+
+class Speculation:
+    def __init__(self, route: str, future: Optional[Future]):
+        self.route = route
+        self.future = future
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+        self.resolved_at: Optional[float] = None
+
+    def elapsed(self, until: Optional[float] = None) -> float:
+        end = self.finished_at or until or time.perf_counter()
+        if until is not None:
+            end = min(end, until)
+        return max(end - self.started_at, 0.0)
+
+
+class SpeculativeRouter:
+    """thread_id 별로 하나의 speculative 작업을 관리하고, 낭비된 작업과 절약된 시간을 집계합니다."""
+
+    def __init__(self, enabled: bool = False, max_workers: int = 4, max_threads: int = 10000):
+        self.enabled = enabled
+        self.max_threads = max_threads
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative")
+        self._pending: Dict[str, Speculation] = {}
+        # thread_id 별 마지막 경로. 오래 사용하지 않은 thread 부터 버립니다.
+        self._last_route: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {
+            "launched": 0,
+            "used": 0,
+            "wasted": 0,
+            "wasted_seconds": 0.0,
+            "saved_seconds": 0.0,
+        }
+
+    def predict(self, thread_id: str, question: str) -> Optional[str]:
+        """라우터 호출 전에 사용할 수 있는 정보(질문 키워드, 이전 경로) 로 경로를 예측합니다."""
+        if any(keyword in question for keyword in VECTORSTORE_KEYWORDS):
+            return "vectorstore"
+        if any(keyword in question.lower() for keyword in WEB_SEARCH_KEYWORDS):
+            return "web_search"
+        with self._lock:
+            last_route = self._last_route.get(thread_id)
+        if last_route in ("vectorstore", "web_search"):
+            return last_route
+        return None
+
+    def start(self, thread_id: str, route: str, fn: Callable, *args: Any):
+        def run():
+            try:
+                return fn(*args)
+            finally:
+                speculation.finished_at = time.perf_counter()
+
+        speculation = Speculation(route, None)
+        speculation.future = self._executor.submit(run)
+        with self._lock:
+            previous = self._pending.pop(thread_id, None)
+            self._pending[thread_id] = speculation
+            self._metrics["launched"] += 1
+        if previous is not None:
+            self._discard(previous)
+
+    def resolve(self, thread_id: str, route: str):
+        """라우터가 고른 경로를 기록하고, 예측이 틀렸으면 speculative 작업을 버립니다."""
+        with self._lock:
+            self._last_route[thread_id] = route
+            self._last_route.move_to_end(thread_id)
+            while len(self._last_route) > self.max_threads:
+                self._last_route.popitem(last=False)
+            speculation = self._pending.get(thread_id)
+            if speculation is None:
+                return
+            speculation.resolved_at = time.perf_counter()
+            if speculation.route == route:
+                return
+            del self._pending[thread_id]
+        self._discard(speculation)
+
+    def abandon(self, thread_id: str):
+        """라우터가 경로를 정하지 못했을 때(routing_chain 실패 등) speculative 작업을 버립니다."""
+        with self._lock:
+            speculation = self._pending.pop(thread_id, None)
+        if speculation is not None:
+            self._discard(speculation)
+
+    def claim(self, thread_id: str, route: str) -> Optional[Any]:
+        """route 에 대한 speculative 결과를 가져옵니다. 없거나 실패했으면 None 을 반환합니다."""
+        with self._lock:
+            speculation = self._pending.get(thread_id)
+            if speculation is None or speculation.route != route:
+                return None
+            del self._pending[thread_id]
+        try:
+            result = speculation.future.result()
+        except Exception:
+            self._record_waste(speculation)
+            return None
+        with self._lock:
+            self._metrics["used"] += 1
+            # 라우터가 결정을 내리기 전까지 진행된 작업 시간만큼 turn latency 가 줄어듭니다.
+            self._metrics["saved_seconds"] += speculation.elapsed(until=speculation.resolved_at)
+        return result
+
+    def _discard(self, speculation: Speculation):
+        # 아직 시작하지 않은 작업은 취소되고, 이미 실행 중인 작업은 끝난 뒤 결과만 버립니다.
+        if speculation.future.cancel():
+            self._record_waste(speculation, elapsed=0.0)
+        else:
+            speculation.future.add_done_callback(lambda _: self._record_waste(speculation))
+
+    def _record_waste(self, speculation: Speculation, elapsed: Optional[float] = None):
+        with self._lock:
+            self._metrics["wasted"] += 1
+            self._metrics["wasted_seconds"] += speculation.elapsed() if elapsed is None else elapsed
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics["wasted_seconds"] = round(metrics["wasted_seconds"], 3)
+        metrics["saved_seconds"] = round(metrics["saved_seconds"], 3)
+        metrics["hit_ratio"] = round(metrics["used"] / metrics["launched"], 4) if metrics["launched"] else 0.0
+        return metrics
+
+
+_config = load_secret().get("speculative_routing", {})
+speculative_router = SpeculativeRouter(
+    enabled=_config.get("enabled", False),
+    max_workers=_config.get("max_workers", 4),
+    max_threads=_config.get("max_threads", 10000),
+)
@@ -1,13 +1,16 @@
-from typing import List, Annotated, TypedDict
+from typing import Any, Dict, List, Annotated, TypedDict
 from pydantic import BaseModel, Field
 
+from langchain_core.documents import Document
 from langchain_core.messages import BaseMessage
 from langgraph.graph import START, StateGraph, END
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
-from langchain_tools import ddg_search
+from langchain_tools import ddg_search, search_wrapper
 from utils import load_chat_model
+from graph.cascade import load_grading_cascade
+from graph.page_fetch import load_page_fetcher
 
 
 class WebSearchState(TypedDict):
@@ -15,6 +18,8 @@ class WebSearchState(TypedDict):
     search_query: Annotated[List[str], "Web search query list"]
     summary: Annotated[str, "Message histories summary"]
     content: Annotated[str, "Finded content"]
+    search_results: Annotated[List[Dict[str, str]], "Search result link, title, snippet list"]
+    documents: Annotated[List[Document], "Relevant passages of fetched result pages"]
 
 
 class RelevantCheck(BaseModel):
@@ -23,8 +28,9 @@ class RelevantCheck(BaseModel):
     binary_score: str = Field(description="Search content result are relevant to the question, 'yes' or 'no'")
 
 
-model = load_chat_model(temperature=0)
-structed_output_model_relevant = model.with_structured_output(RelevantCheck)
+model = load_chat_model(temperature=0, stream=False, chain_name="web_search.transform_query_chain", lane="grading")
+relevant_model = load_chat_model(temperature=0, stream=False, chain_name="web_search.is_relevant_chain", lane="grading")
+structed_output_model_relevant = relevant_model.with_structured_output(RelevantCheck)
 
 transform_query_prompt = """
     You are a query re-writer that converts an input question into a better version optimized for the search engine (DuckDuckGo). 
@@ -72,6 +78,15 @@ is_relevant_prompt_template = ChatPromptTemplate.from_messages(
 is_relevant_chain = is_relevant_prompt_template | structed_output_model_relevant
 
 
+def llm_relevant_check(question: str, contents: List[str]) -> List[bool]:
+    scores = is_relevant_chain.batch([{"question": question, "content": content} for content in contents])
+    return [score.binary_score == "yes" for score in scores]
+
+
+relevant_cascade = load_grading_cascade("web_search.is_relevant_chain", llm_relevant_check)
+page_fetcher = load_page_fetcher()
+
+
 def transform_query(state: WebSearchState):
     messages = state["messages"]
     search_query = state.get("search_query", [])
@@ -87,20 +102,43 @@ def transform_query(state: WebSearchState):
     return {"search_query": search_query}
 
 
+def search(query: str) -> Dict[str, Any]:
+    """
+    검색 결과 content 를 반환합니다. 페이지 본문 수집이 켜져 있으면 fetch_pages 가 사용할 search_results 도 반환합니다.
+    speculative routing 의 미리 검색도 이 함수를 사용하므로 같은 단계(fetch_pages) 를 거칩니다.
+    """
+    if page_fetcher is None:
+        return {"content": ddg_search.invoke(query)}
+    # 페이지 본문을 가져오기 위해 snippet 과 함께 link 도 받습니다.
+    search_results = search_wrapper.results(query, max_results=page_fetcher.max_pages)
+    return {"content": " ".join(result["snippet"] for result in search_results), "search_results": search_results}
+
+
 def web_search(state: WebSearchState):
     last_search_query = state["search_query"][-1]
-    search_result = ddg_search.invoke(last_search_query)
-    return {"search_query": state["search_query"], "content": search_result}
+    return {"search_query": state["search_query"], **search(last_search_query)}
+
+
+def fetch_pages(state: WebSearchState):
+    last_search_query = state["search_query"][-1]
+    documents = page_fetcher.fetch_documents(last_search_query, state.get("search_results", []))
+    if not documents:
+        # 페이지를 가져오지 못하면 검색 결과 snippet 을 그대로 사용합니다.
+        return {"documents": []}
+    content = "\n\n".join(f"{d.metadata['title']} ({d.metadata['source']})\n{d.page_content}" for d in documents)
+    return {"content": content, "documents": documents}
 
 
 def relevant_check(state: WebSearchState):
     print("==== [RELEVANT CHECK SEARCH RESULT WITH QUESTION] ====")
     last_search_query = state["search_query"][-1]
     content = state["content"]
-    score = is_relevant_chain.invoke({"question": last_search_query, "content": content})
-    grade = score.binary_score
+    if relevant_cascade is not None:
+        is_relevant = relevant_cascade.grade(last_search_query, [content])[0]
+    else:
+        is_relevant = llm_relevant_check(last_search_query, [content])[0]
 
-    if grade == "yes":
+    if is_relevant:
         print("---RELEVANT_CHECK: OK!")
         return "end"
     else:
@@ -108,13 +146,31 @@ def relevant_check(state: WebSearchState):
         return "transform_query"
 
 
+def check_prefetched_content(state: WebSearchState):
+    # speculative routing 으로 미리 검색한 결과가 있으면 검색 없이 페이지 수집(켜져 있으면) 또는 relevant check 부터 합니다.
+    if state.get("content"):
+        if page_fetcher is not None and state.get("search_results"):
+            return "fetch_pages"
+        return relevant_check(state)
+    return "transform_query"
+
+
 workflow = StateGraph(WebSearchState)
 workflow.add_node("transform_query", transform_query)
 workflow.add_node("web_search", web_search)
+if page_fetcher is not None:
+    workflow.add_node("fetch_pages", fetch_pages)
 
-workflow.add_edge(START, "transform_query")
+start_routes = {"end": END, "transform_query": "transform_query"}
+if page_fetcher is not None:
+    start_routes["fetch_pages"] = "fetch_pages"
+workflow.add_conditional_edges(START, check_prefetched_content, start_routes)
 workflow.add_edge("transform_query", "web_search")
-workflow.add_conditional_edges("web_search", relevant_check, {"end": END, "transform_query": "transform_query"})
+if page_fetcher is not None:
+    workflow.add_edge("web_search", "fetch_pages")
+    workflow.add_conditional_edges("fetch_pages", relevant_check, {"end": END, "transform_query": "transform_query"})
+else:
+    workflow.add_conditional_edges("web_search", relevant_check, {"end": END, "transform_query": "transform_query"})
 
 app = workflow.compile()
 
@@ -0,0 +1,318 @@
+"""
+load_chat_model 에서 사용하는 exact-match LLM 응답 캐시입니다.
+
+같은 모델, 같은 파라미터, 같은(정규화된) 메시지 목록으로 호출하면 이전 응답을 재사용합니다.
+temperature=0 이고 streaming 이 아닌 chain(routing, grading, query rewrite 등) 에서만 사용합니다.
+
+Example (secret.yaml):
+    llm_cache:
+      enabled: true
+      backend: sqlite        # memory | sqlite
+      path: ./data/llm_cache.sqlite
+      max_entries: 10000
+      ttl_seconds: 86400
+      inflight_timeout: 30
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+from langchain_openai import ChatOpenAI
+
+from settings import data_dir, load_secret
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    langchain 이 직렬화한 메시지 목록에서 message id, metadata 등 응답과 무관한 값을 제거합니다.
+
+    content 의 연속된 공백은 하나로 합칩니다. 파싱할 수 없는 prompt 는 공백만 정규화합니다.
+    """
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return " ".join(prompt.split())
+    if not isinstance(messages, list):
+        return " ".join(prompt.split())
+
+    normalized = []
+    for message in messages:
+        kwargs = message.get("kwargs", {}) if isinstance(message, dict) else {}
+        content = kwargs.get("content", "")
+        if isinstance(content, str):
+            content = " ".join(content.split())
+        normalized.append(
+            {
+                "type": kwargs.get("type") or message.get("id", [""])[-1],
+                "content": content,
+                "name": kwargs.get("name"),
+                "tool_calls": [{"name": c.get("name"), "args": c.get("args")} for c in kwargs.get("tool_calls", [])],
+                "tool_call_id": kwargs.get("tool_call_id"),
+            }
+        )
+    return json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+
+
+def make_cache_key(prompt: str, llm_string: str) -> str:
+    return hashlib.sha256(f"{llm_string}\n{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+
+class InMemoryBackend:
+    """프로세스 메모리에 저장하는 LRU/TTL backend."""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Sequence[Generation]]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            created_at, value = item
+            if self.ttl_seconds and time.time() - created_at > self.ttl_seconds:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Sequence[Generation]):
+        with self._lock:
+            self._data[key] = (time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteBackend:
+    """여러 프로세스가 공유할 수 있는 sqlite LRU/TTL backend."""
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed_at ON llm_cache (accessed_at)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Sequence[Generation]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return loads(value)
+
+    def set(self, key: str, value: Sequence[Generation]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, dumps(list(value)), now, now),
+            )
+            # 가장 오래 사용되지 않은 항목부터 삭제합니다.
+            self._conn.execute(
+                """
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            if self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+
+class LLMCache:
+    """
+    chain 들이 공유하는 캐시 저장소입니다.
+
+    같은 key 로 동시에 들어온 호출은 첫 번째 호출만 LLM 으로 보내고,
+    나머지는 첫 번째 호출의 결과가 저장될 때까지(최대 inflight_timeout 초) 기다렸다가 재사용합니다.
+    """
+
+    def __init__(self, backend, inflight_timeout: float = 30):
+        self.backend = backend
+        self.inflight_timeout = inflight_timeout
+        self._inflight: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "coalesced": 0, "misses": 0})
+
+    def lookup(self, chain_name: str, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        key = make_cache_key(prompt, llm_string)
+        value = self.backend.get(key)
+        if value is not None:
+            self._count(chain_name, "hits")
+            return value
+
+        with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight is None or time.time() - inflight[1] > self.inflight_timeout:
+                # 이 호출이 LLM 을 호출하고, update 에서 대기 중인 호출들을 깨웁니다.
+                self._inflight[key] = (threading.Event(), time.time())
+                self._stats[chain_name]["misses"] += 1
+                return None
+            event = inflight[0]
+
+        if event.wait(self.inflight_timeout):
+            value = self.backend.get(key)
+            if value is not None:
+                self._count(chain_name, "coalesced")
+                return value
+        self._count(chain_name, "misses")
+        return None
+
+    def _count(self, chain_name: str, key: str):
+        with self._lock:
+            self._stats[chain_name][key] += 1
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]):
+        self.backend.set(make_cache_key(prompt, llm_string), return_val)
+        self.release(prompt, llm_string)
+
+    def release(self, prompt: str, llm_string: str):
+        """in-flight 항목을 지우고 대기 중인 호출을 깨웁니다. 첫 번째 호출이 실패했을 때도 호출해야 합니다."""
+        key = make_cache_key(prompt, llm_string)
+        with self._lock:
+            inflight = self._inflight.pop(key, None)
+        if inflight is not None:
+            inflight[0].set()
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            snapshot = {chain_name: dict(stat) for chain_name, stat in self._stats.items()}
+        report = {}
+        for chain_name, stat in snapshot.items():
+            total = stat["hits"] + stat["coalesced"] + stat["misses"]
+            hit_ratio = (stat["hits"] + stat["coalesced"]) / total if total else 0.0
+            report[chain_name] = {**stat, "hit_ratio": round(hit_ratio, 4)}
+        return report
+
+
+class ChainCache(BaseCache):
+    """LLMCache 를 chain 이름 별로 감싸서 chain 단위 hit ratio 를 집계합니다."""
+
+    def __init__(self, cache: LLMCache, chain_name: str):
+        self.cache = cache
+        self.chain_name = chain_name
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        return self.cache.lookup(self.chain_name, prompt, llm_string)
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        self.cache.update(prompt, llm_string, return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        self.cache.clear()
+
+
+class InflightReleaseMixin:
+    """
+    캐시를 사용하는 chat model 에 섞어 쓰는 mixin 입니다.
+
+    langchain 은 LLM 호출이 성공했을 때만 cache.update 를 호출하므로, 첫 번째 호출이 실패하면 같은 key 로
+    기다리는 호출들이 inflight_timeout 동안 멈춥니다. 실패(취소 포함) 하면 in-flight 항목을 바로 해제합니다.
+    prompt / llm_string 은 langchain 이 cache.lookup 에 넘기는 값과 같은 방법으로 만듭니다.
+    """
+
+    def _release_inflight(self, messages, stop, kwargs):
+        if isinstance(self.cache, ChainCache):
+            self.cache.cache.release(dumps(messages), self._get_llm_string(stop=stop, **kwargs))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        try:
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        except BaseException:
+            self._release_inflight(messages, stop, kwargs)
+            raise
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        try:
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        except BaseException:
+            self._release_inflight(messages, stop, kwargs)
+            raise
+
+
+class CachedChatOpenAI(InflightReleaseMixin, ChatOpenAI):
+    """스케줄러 / 호출 정책 없이 캐시만 사용하는 ChatOpenAI."""
+
+
+_llm_cache: Optional[LLMCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_chain_cache(chain_name: str) -> Optional[ChainCache]:
+    """
+    secret.yaml 의 llm_cache 설정이 켜져 있으면 chain_name 용 캐시를 반환합니다.
+
+    Returns:
+        ChainCache | None: 캐시가 비활성화되어 있으면 None.
+    """
+    global _llm_cache
+    config = load_secret().get("llm_cache", {})
+    if not config.get("enabled", False):
+        return None
+
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            max_entries = config.get("max_entries", 10000)
+            ttl_seconds = config.get("ttl_seconds")
+            if config.get("backend", "sqlite") == "sqlite":
+                path = config.get("path", os.path.join(data_dir, "llm_cache.sqlite"))
+                backend = SQLiteBackend(path, max_entries=max_entries, ttl_seconds=ttl_seconds)
+            else:
+                backend = InMemoryBackend(max_entries=max_entries, ttl_seconds=ttl_seconds)
+            _llm_cache = LLMCache(backend, inflight_timeout=config.get("inflight_timeout", 30))
+    return ChainCache(_llm_cache, chain_name)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """chain 별 hit/coalesced/miss 횟수와 hit ratio 를 반환합니다."""
+    if _llm_cache is None:
+        return {}
+    return _llm_cache.stats()
@@ -0,0 +1,254 @@
+"""
+chain 별 LLM 호출 timeout, 재시도, hedging 정책입니다.
+
+hedging 은 routing, grading 처럼 짧고 여러 번 호출해도 결과가 같은(idempotent) 비 streaming 호출에만 사용합니다.
+첫 호출이 그 chain 의 최근 latency 의 hedge_percentile 분위수 시간 안에 끝나지 않으면 같은 요청을 한 번 더 보내고,
+먼저 끝난 응답을 사용합니다. 늦은 호출은 취소(async, 또는 아직 시작하지 않은 sync 호출) 하거나
+이미 전송된 sync 호출이면 결과를 버립니다. 통계에서는 각각 cancelled 와 discarded 로 셉니다.
+llm_scheduler 가 켜져 있으면 hedge 지연과 latency 는 스케줄러 허가를 받은 시점부터 재고,
+429 는 스케줄러가 재시도하므로 이 정책의 재시도 대상에서 뺍니다.
+
+Example (secret.yaml):
+    llm_policies:
+      default:
+        timeout: 30
+        max_retries: 2
+      routing_chain:
+        timeout: 10
+        max_retries: 1
+        hedge: true
+        hedge_percentile: 0.9
+        hedge_delay: 1.0
+"""
+
+import asyncio
+import threading
+import time
+
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, fields
+from typing import Any, Callable, Dict, Optional
+
+import openai
+
+from langchain_core.outputs import ChatResult
+
+from llm_cache import InflightReleaseMixin
+from llm_scheduler import TRANSIENT_ERRORS, ScheduledChatOpenAI, admission_listener
+from settings import load_secret
+
+RETRYABLE_ERRORS = TRANSIENT_ERRORS
+# 스케줄러가 없을 때만 429 도 재시도합니다.
+UNSCHEDULED_RETRYABLE_ERRORS = RETRYABLE_ERRORS + (openai.RateLimitError,)
+
+
+@dataclass
+class CallPolicy:
+    timeout: Optional[float] = None
+    max_retries: int = 2
+    retry_backoff: float = 0.5
+    hedge: bool = False
+    hedge_percentile: float = 0.95
+    # latency 표본이 hedge_min_samples 개보다 적을 때 사용하는 hedge 지연 시간(초)
+    hedge_delay: float = 1.0
+    hedge_min_samples: int = 20
+
+
+class LatencyTracker:
+    """chain 별 최근 성공 호출 latency 로 hedge 지연 시간을 계산합니다."""
+
+    def __init__(self, maxlen: int = 500):
+        self._samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=maxlen))
+        self._lock = threading.Lock()
+
+    def record(self, chain_name: str, latency: float):
+        with self._lock:
+            self._samples[chain_name].append(latency)
+
+    def hedge_delay(self, chain_name: str, policy: CallPolicy) -> float:
+        with self._lock:
+            samples = sorted(self._samples[chain_name])
+        if len(samples) < policy.hedge_min_samples:
+            return policy.hedge_delay
+        return samples[min(int(len(samples) * policy.hedge_percentile), len(samples) - 1)]
+
+
+latency_tracker = LatencyTracker()
+STAT_KEYS = ("calls", "attempts", "retries", "timeouts", "errors", "hedged", "hedge_wins", "cancelled", "discarded")
+_stats: Dict[str, Dict[str, int]] = defaultdict(lambda: dict.fromkeys(STAT_KEYS, 0))
+_stats_lock = threading.Lock()
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+
+
+def _count(chain_name: str, key: str, value: int = 1):
+    with _stats_lock:
+        _stats[chain_name][key] += value
+
+
+def load_call_policy(chain_name: Optional[str]) -> Optional[CallPolicy]:
+    """
+    secret.yaml 의 llm_policies 에서 default 와 chain_name 설정을 합쳐 CallPolicy 를 만듭니다.
+
+    Returns:
+        CallPolicy | None: llm_policies 설정이 없으면 None.
+    """
+    config = load_secret().get("llm_policies")
+    if not config:
+        return None
+    names = {f.name for f in fields(CallPolicy)}
+    values = {k: v for k, v in (config.get("default") or {}).items() if k in names}
+    values.update({k: v for k, v in (config.get(chain_name) or {}).items() if k in names})
+    return CallPolicy(**values)
+
+
+class Admission:
+    """
+    호출이 스케줄러 허가를 받은 시점을 기록합니다. 스케줄러가 없으면 만들 때 바로 허가된 것으로 봅니다.
+
+    event 는 sync 호출이면 threading.Event, async 호출이면 asyncio.Event 입니다.
+    """
+
+    def __init__(self, event, scheduled: bool):
+        self.event = event
+        self.at: Optional[float] = None
+        if not scheduled:
+            self.set()
+
+    def set(self):
+        self.at = time.perf_counter()
+        self.event.set()
+
+
+class PolicyChatOpenAI(InflightReleaseMixin, ScheduledChatOpenAI):
+    """
+    CallPolicy 의 timeout / 재시도 / hedging 을 적용하는 ChatOpenAI 입니다.
+
+    timeout 은 ChatOpenAI 의 request timeout 으로 전달하고, 재시도는 openai client 대신 이 클래스가 합니다.
+    각 시도는 ScheduledChatOpenAI 를 거치므로 스케줄러가 켜져 있으면 시도마다 허가를 받습니다.
+    """
+
+    chain_name: str = "default"
+    policy: Any = None
+
+    def _attempt(self, messages, stop, run_manager, admission: Optional[Admission] = None, **kwargs) -> ChatResult:
+        _count(self.chain_name, "attempts")
+        admission = admission or Admission(threading.Event(), self.scheduler is not None)
+        token = admission_listener.set(admission)
+        try:
+            result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        finally:
+            admission_listener.reset(token)
+        latency_tracker.record(self.chain_name, time.perf_counter() - admission.at)
+        return result
+
+    async def _aattempt(self, messages, stop, run_manager, admission: Optional[Admission] = None, **kwargs):
+        _count(self.chain_name, "attempts")
+        admission = admission or Admission(asyncio.Event(), self.scheduler is not None)
+        token = admission_listener.set(admission)
+        try:
+            result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        finally:
+            admission_listener.reset(token)
+        latency_tracker.record(self.chain_name, time.perf_counter() - admission.at)
+        return result
+
+    def _hedged(self, call: Callable[[Admission], ChatResult]) -> ChatResult:
+        admission = Admission(threading.Event(), self.scheduler is not None)
+        primary = _hedge_executor.submit(call, admission)
+        # 스케줄러 대기열에서 기다린 시간은 hedge 지연에 넣지 않습니다.
+        primary.add_done_callback(lambda _: admission.event.set())
+        admission.event.wait()
+        done, _ = wait([primary], timeout=latency_tracker.hedge_delay(self.chain_name, self.policy))
+        if done:
+            return primary.result()
+
+        _count(self.chain_name, "hedged")
+        backup = _hedge_executor.submit(call, Admission(threading.Event(), self.scheduler is not None))
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                if future is backup:
+                    _count(self.chain_name, "hedge_wins")
+                for loser in pending:
+                    # 이미 시작된 sync 호출은 멈출 수 없으므로 결과만 버립니다.
+                    _count(self.chain_name, "cancelled" if loser.cancel() else "discarded")
+                return future.result()
+        raise error
+
+    async def _ahedged(self, call: Callable) -> ChatResult:
+        admission = Admission(asyncio.Event(), self.scheduler is not None)
+        primary = asyncio.ensure_future(call(admission))
+        primary.add_done_callback(lambda _: admission.event.set())
+        await admission.event.wait()
+        done, _ = await asyncio.wait({primary}, timeout=latency_tracker.hedge_delay(self.chain_name, self.policy))
+        if done:
+            return primary.result()
+
+        _count(self.chain_name, "hedged")
+        backup = asyncio.ensure_future(call(Admission(asyncio.Event(), self.scheduler is not None)))
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                if task is backup:
+                    _count(self.chain_name, "hedge_wins")
+                for loser in pending:
+                    loser.cancel()
+                    _count(self.chain_name, "cancelled")
+                return task.result()
+        raise error
+
+    def _retryable_errors(self):
+        return RETRYABLE_ERRORS if self.scheduler is not None else UNSCHEDULED_RETRYABLE_ERRORS
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.policy is None or self.streaming:
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        _count(self.chain_name, "calls")
+        for attempt in range(self.policy.max_retries + 1):
+            try:
+                if self.policy.hedge:
+                    return self._hedged(
+                        lambda admission: self._attempt(messages, stop, run_manager, admission, **kwargs)
+                    )
+                return self._attempt(messages, stop, run_manager, **kwargs)
+            except self._retryable_errors() as e:
+                _count(self.chain_name, "timeouts" if isinstance(e, openai.APITimeoutError) else "errors")
+                if attempt >= self.policy.max_retries:
+                    raise
+                _count(self.chain_name, "retries")
+                time.sleep(self.policy.retry_backoff * 2**attempt)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.policy is None or self.streaming:
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        _count(self.chain_name, "calls")
+        for attempt in range(self.policy.max_retries + 1):
+            try:
+                if self.policy.hedge:
+                    return await self._ahedged(
+                        lambda admission: self._aattempt(messages, stop, run_manager, admission, **kwargs)
+                    )
+                return await self._aattempt(messages, stop, run_manager, **kwargs)
+            except self._retryable_errors() as e:
+                _count(self.chain_name, "timeouts" if isinstance(e, openai.APITimeoutError) else "errors")
+                if attempt >= self.policy.max_retries:
+                    raise
+                _count(self.chain_name, "retries")
+                await asyncio.sleep(self.policy.retry_backoff * 2**attempt)
+
+
+def policy_stats() -> Dict[str, Dict[str, int]]:
+    """chain 별 호출, 재시도, timeout, hedge 횟수를 반환합니다."""
+    with _stats_lock:
+        return {chain_name: dict(stat) for chain_name, stat in _stats.items()}
@@ -0,0 +1,434 @@
+"""
+모든 ChatOpenAI 호출이 공유하는 rate-limit 스케줄러입니다.
+
+요청 수(RPM) 와 토큰 수(TPM) 를 token bucket 으로 제한하고, 대기 중인 호출은 우선순위 lane 순서로 보냅니다.
+    interactive(사용자 응답) > routing > grading(grading, query rewrite) > background(요약)
+429 응답을 받으면 모든 lane 을 잠시 멈추고 허용 rate 를 줄였다가, 성공할 때마다 조금씩 회복합니다.
+
+Example (secret.yaml):
+    llm_scheduler:
+      enabled: true
+      requests_per_minute: 500
+      tokens_per_minute: 200000
+      max_rate_limit_retries: 5
+      max_backoff_seconds: 60
+      starvation_seconds: 30
+"""
+
+import asyncio
+import threading
+import time
+
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import openai
+
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+
+from settings import load_secret
+
+# 다시 보내면 성공할 수 있는 오류입니다. 429 는 스케줄러가 따로 처리합니다.
+TRANSIENT_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+LANES = ("interactive", "routing", "grading", "background")
+
+# 호출이 스케줄러 허가를 받을 때 set() 을 호출할 객체. llm_policy 의 hedging 이 대기 시간을 빼고 지연을 재는 데 사용합니다.
+admission_listener: ContextVar[Optional[Any]] = ContextVar("admission_listener", default=None)
+
+
+def notify_admitted():
+    listener = admission_listener.get()
+    if listener is not None:
+        listener.set()
+
+
+class TokenBucket:
+    """분당 rate 만큼 채워지는 token bucket. capacity 는 1분 분량입니다."""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.updated_at = time.monotonic()
+        self.multiplier = 1.0
+
+    def refill(self, now: float):
+        rate = self.rate_per_minute * self.multiplier / 60
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """amount 만큼 사용할 수 있을 때까지 남은 시간(초)."""
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / (self.rate_per_minute * self.multiplier / 60)
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class Ticket:
+    def __init__(self, lane: str, estimated_tokens: int):
+        self.lane = lane
+        self.estimated_tokens = estimated_tokens
+        self.enqueued_at = time.monotonic()
+        self.queue_time = 0.0
+
+
+class LLMScheduler:
+    """
+    token bucket 과 우선순위 lane 으로 LLM 호출을 조율합니다.
+
+    각 lane 은 FIFO 이고, 가장 높은 우선순위 lane 의 맨 앞 호출부터 보냅니다.
+    starvation_seconds 이상 기다린 호출은 lane 과 상관없이 먼저 보냅니다.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 200000,
+        max_backoff_seconds: float = 60,
+        starvation_seconds: float = 30,
+    ):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_backoff_seconds = max_backoff_seconds
+        self.starvation_seconds = starvation_seconds
+        self._lanes: Dict[str, deque] = {lane: deque() for lane in LANES}
+        self._cond = threading.Condition()
+        # aacquire 로 기다리는 task 의 (event loop, event). notify 할 때 함께 깨웁니다.
+        self._async_waiters = set()
+        self._paused_until = 0.0
+        self._backoff = 1.0
+        self._stats = {
+            lane: {"requests": 0, "queue_time_total": 0.0, "queue_time_max": 0.0, "queue_times": deque(maxlen=1000)}
+            for lane in LANES
+        }
+        self._rate_limited = 0
+
+    def _next_ticket(self, now: float) -> Optional[Ticket]:
+        heads = [lane[0] for lane in self._lanes.values() if lane]
+        if not heads:
+            return None
+        oldest = min(heads, key=lambda ticket: ticket.enqueued_at)
+        if now - oldest.enqueued_at >= self.starvation_seconds:
+            return oldest
+        return heads[0]
+
+    def _notify(self):
+        self._cond.notify_all()
+        for loop, wakeup in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # event loop 가 이미 닫혔습니다.
+                pass
+
+    def _try_acquire(self, ticket: Ticket) -> Tuple[bool, Optional[float]]:
+        """
+        _cond 를 잡은 상태에서 호출합니다. ticket 의 차례이고 RPM / TPM 여유가 있으면 token 을 소비하고 (True, None) 을,
+        아니면 (False, 다시 확인할 때까지 기다릴 시간) 을 반환합니다. 다음 차례가 아니면 시간은 None 입니다.
+        """
+        now = time.monotonic()
+        if self._next_ticket(now) is not ticket:
+            return False, None
+        wait = max(
+            self._paused_until - now,
+            self.request_bucket.wait_time(1, now),
+            self.token_bucket.wait_time(ticket.estimated_tokens, now),
+        )
+        if wait > 0:
+            return False, wait
+        self.request_bucket.consume(1)
+        self.token_bucket.consume(ticket.estimated_tokens)
+        self._lanes[ticket.lane].popleft()
+        self._record_queue_time(ticket, now)
+        self._notify()
+        return True, None
+
+    def acquire(self, lane: str, estimated_tokens: int) -> Ticket:
+        """lane 의 차례가 되고 RPM / TPM 여유가 생길 때까지 기다립니다."""
+        ticket = Ticket(lane if lane in self._lanes else "interactive", estimated_tokens)
+        with self._cond:
+            self._lanes[ticket.lane].append(ticket)
+            try:
+                while True:
+                    granted, wait = self._try_acquire(ticket)
+                    if granted:
+                        return ticket
+                    # 다음 차례가 아니면 앞선 호출이 나갈 때 notify 로 깨어납니다.
+                    self._cond.wait(timeout=wait if wait else self.starvation_seconds)
+            except BaseException:
+                # 기다리다 KeyboardInterrupt 등으로 중단되면 ticket 이 대기열에 남아 뒤의 호출을 막지 않도록 뺍니다.
+                if ticket in self._lanes[ticket.lane]:
+                    self._lanes[ticket.lane].remove(ticket)
+                    self._notify()
+                raise
+
+    async def aacquire(self, lane: str, estimated_tokens: int) -> Ticket:
+        """
+        acquire 의 async 버전입니다. 스레드를 점유하지 않고 event loop 에서 기다립니다.
+
+        기다리는 동안 task 가 취소되면 ticket 을 대기열에서 빼므로, token 을 소비하지 않고 뒤의 호출도 막지 않습니다.
+        """
+        ticket = Ticket(lane if lane in self._lanes else "interactive", estimated_tokens)
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            self._lanes[ticket.lane].append(ticket)
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._cond:
+                    waiter[1].clear()
+                    granted, wait = self._try_acquire(ticket)
+                if granted:
+                    return ticket
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout=wait if wait else self.starvation_seconds)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._cond:
+                if ticket in self._lanes[ticket.lane]:
+                    self._lanes[ticket.lane].remove(ticket)
+                    self._notify()
+            raise
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+
+    def settle(self, ticket: Ticket, actual_tokens: Optional[int]):
+        """응답의 실제 토큰 사용량으로 추정치를 보정합니다."""
+        if actual_tokens is None:
+            return
+        with self._cond:
+            self.token_bucket.consume(actual_tokens - ticket.estimated_tokens)
+
+    def report_rate_limit(self, retry_after: Optional[float] = None):
+        """429 를 받으면 모든 호출을 잠시 멈추고 허용 rate 를 절반으로 줄입니다."""
+        with self._cond:
+            self._rate_limited += 1
+            pause = max(retry_after or 0.0, self._backoff)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self._backoff = min(self._backoff * 2, self.max_backoff_seconds)
+            for bucket in (self.request_bucket, self.token_bucket):
+                bucket.refill(time.monotonic())
+                bucket.multiplier = max(bucket.multiplier * 0.5, 0.1)
+            self._notify()
+
+    def report_success(self):
+        with self._cond:
+            self._backoff = max(self._backoff / 2, 1.0)
+            for bucket in (self.request_bucket, self.token_bucket):
+                bucket.refill(time.monotonic())
+                bucket.multiplier = min(bucket.multiplier + 0.05, 1.0)
+
+    def _record_queue_time(self, ticket: Ticket, now: float):
+        ticket.queue_time = now - ticket.enqueued_at
+        stat = self._stats[ticket.lane]
+        stat["requests"] += 1
+        stat["queue_time_total"] += ticket.queue_time
+        stat["queue_time_max"] = max(stat["queue_time_max"], ticket.queue_time)
+        stat["queue_times"].append(ticket.queue_time)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            lanes = {}
+            for lane, stat in self._stats.items():
+                queue_times = sorted(stat["queue_times"])
+                lanes[lane] = {
+                    "requests": stat["requests"],
+                    "waiting": len(self._lanes[lane]),
+                    "queue_time_avg": (
+                        round(stat["queue_time_total"] / stat["requests"], 4) if stat["requests"] else 0.0
+                    ),
+                    "queue_time_p95": round(queue_times[int(len(queue_times) * 0.95)], 4) if queue_times else 0.0,
+                    "queue_time_max": round(stat["queue_time_max"], 4),
+                }
+            return {
+                "lanes": lanes,
+                "rate_limited": self._rate_limited,
+                "rate_multiplier": round(self.request_bucket.multiplier, 3),
+                "paused_for": round(max(self._paused_until - time.monotonic(), 0.0), 3),
+            }
+
+
+def estimate_tokens(messages: List[BaseMessage], max_tokens: Optional[int] = None) -> int:
+    # tokenizer 없이 대략적으로 추정합니다. 한국어는 1토큰이 2~3글자 정도입니다.
+    prompt_chars = sum(len(str(message.content)) for message in messages)
+    return prompt_chars // 2 + (max_tokens or 256)
+
+
+def retry_after_seconds(error: openai.RateLimitError) -> Optional[float]:
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class ScheduledChatOpenAI(ChatOpenAI):
+    """
+    호출 전에 LLMScheduler 의 허가를 받는 ChatOpenAI 입니다.
+
+    429 는 openai client 가 아니라 스케줄러가 재시도하므로 max_retries=0 으로 생성해야 합니다.
+    대신 timeout, 연결 오류, 5xx 는 max_error_retries 번까지 이 클래스가 재시도합니다.
+    (비 streaming 호출의 재시도를 PolicyChatOpenAI 의 정책이 담당하면 0 으로 둡니다.)
+    streaming 호출은 첫 chunk 를 받기 전에 발생한 오류만 재시도합니다.
+    scheduler 가 None 이면 ChatOpenAI 와 같이 동작합니다.
+    """
+
+    scheduler: Any = None
+    lane: str = "interactive"
+    max_rate_limit_retries: int = 5
+    max_error_retries: int = 0
+    error_retry_backoff: float = 0.5
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.streaming or self.scheduler is None:
+            # ChatOpenAI 는 streaming 이면 _stream 을 사용하므로 거기서 스케줄링합니다.
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        rate_limits = errors = 0
+        while True:
+            ticket = self.scheduler.acquire(self.lane, estimate_tokens(messages, self.max_tokens))
+            notify_admitted()
+            try:
+                result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except openai.RateLimitError as e:
+                self.scheduler.report_rate_limit(retry_after_seconds(e))
+                if rate_limits >= self.max_rate_limit_retries:
+                    raise
+                rate_limits += 1
+                continue
+            except TRANSIENT_ERRORS:
+                if errors >= self.max_error_retries:
+                    raise
+                time.sleep(self.error_retry_backoff * 2**errors)
+                errors += 1
+                continue
+            self.scheduler.report_success()
+            self.scheduler.settle(ticket, (result.llm_output or {}).get("token_usage", {}).get("total_tokens"))
+            return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.streaming or self.scheduler is None:
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        rate_limits = errors = 0
+        while True:
+            ticket = await self.scheduler.aacquire(self.lane, estimate_tokens(messages, self.max_tokens))
+            notify_admitted()
+            try:
+                result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except openai.RateLimitError as e:
+                self.scheduler.report_rate_limit(retry_after_seconds(e))
+                if rate_limits >= self.max_rate_limit_retries:
+                    raise
+                rate_limits += 1
+                continue
+            except TRANSIENT_ERRORS:
+                if errors >= self.max_error_retries:
+                    raise
+                await asyncio.sleep(self.error_retry_backoff * 2**errors)
+                errors += 1
+                continue
+            self.scheduler.report_success()
+            self.scheduler.settle(ticket, (result.llm_output or {}).get("token_usage", {}).get("total_tokens"))
+            return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        if self.scheduler is None:
+            yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return
+        rate_limits = errors = 0
+        while True:
+            ticket = self.scheduler.acquire(self.lane, estimate_tokens(messages, self.max_tokens))
+            output_chars = 0
+            started = False
+            try:
+                for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    output_chars += len(chunk.text)
+                    yield chunk
+            except openai.RateLimitError as e:
+                self.scheduler.report_rate_limit(retry_after_seconds(e))
+                if started or rate_limits >= self.max_rate_limit_retries:
+                    raise
+                rate_limits += 1
+                continue
+            except TRANSIENT_ERRORS:
+                if started or errors >= self.max_error_retries:
+                    raise
+                time.sleep(self.error_retry_backoff * 2**errors)
+                errors += 1
+                continue
+            self.scheduler.report_success()
+            self.scheduler.settle(ticket, estimate_tokens(messages, output_chars // 2))
+            return
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        if self.scheduler is None:
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
+            return
+        rate_limits = errors = 0
+        while True:
+            ticket = await self.scheduler.aacquire(self.lane, estimate_tokens(messages, self.max_tokens))
+            output_chars = 0
+            started = False
+            try:
+                async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    started = True
+                    output_chars += len(chunk.text)
+                    yield chunk
+            except openai.RateLimitError as e:
+                self.scheduler.report_rate_limit(retry_after_seconds(e))
+                if started or rate_limits >= self.max_rate_limit_retries:
+                    raise
+                rate_limits += 1
+                continue
+            except TRANSIENT_ERRORS:
+                if started or errors >= self.max_error_retries:
+                    raise
+                await asyncio.sleep(self.error_retry_backoff * 2**errors)
+                errors += 1
+                continue
+            self.scheduler.report_success()
+            self.scheduler.settle(ticket, estimate_tokens(messages, output_chars // 2))
+            return
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Optional[LLMScheduler]:
+    """secret.yaml 의 llm_scheduler 설정이 켜져 있으면 프로세스 공용 스케줄러를 반환합니다."""
+    global _scheduler
+    config = load_secret().get("llm_scheduler", {})
+    if not config.get("enabled", False):
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                requests_per_minute=config.get("requests_per_minute", 500),
+                tokens_per_minute=config.get("tokens_per_minute", 200000),
+                max_backoff_seconds=config.get("max_backoff_seconds", 60),
+                starvation_seconds=config.get("starvation_seconds", 30),
+            )
+    return _scheduler
+
+
+def scheduler_stats() -> Dict[str, Any]:
+    """lane 별 대기 시간과 429 횟수를 반환합니다."""
+    if _scheduler is None:
+        return {}
+    return _scheduler.stats()
@@ -0,0 +1,277 @@
+"""
+대화 turn 하나를 프로파일링하는 도구입니다.
+
+두 가지를 함께 기록합니다.
+    1. sampling profiler: interval 마다 이 turn 을 실행 중인 스레드의 call stack 을 수집해서
+       flamegraph 용 folded stack 파일(.folded) 로 저장합니다. wall-clock 기준이므로 pdfplumber, prompt
+       formatting 같은 CPU 작업과 함께 네트워크 대기(socket read 등) 도 stack 으로 보입니다.
+       speedscope(https://www.speedscope.app) 에 그대로 열거나 flamegraph.pl 로 svg 를 만들 수 있습니다.
+    2. span tracer: langchain callback 으로 노드 / LLM / retriever / tool 실행 시간을 기록해서
+       노드 별 요약(.json) 을 저장합니다. turn 전체 시간에서 노드 실행 시간을 뺀 나머지는
+       graph_overhead_ms 로, reducer(add_messages) 와 checkpoint 직렬화 등 노드 밖에서 쓴 시간입니다.
+
+프로파일링을 켜지 않으면 아무것도 감싸지 않으므로 overhead 가 없습니다.
+Streamlit 처럼 여러 session 의 turn 이 한 프로세스에서 동시에 실행되어도, profile_turn 을 시작한 스레드와
+span tracer 의 callback 이 호출된 스레드(이 turn 의 노드 / LLM 호출을 실행 중인 executor 스레드) 만 sampling 합니다.
+
+Example (secret.yaml):
+    profiling:
+      enabled: false # 환경 변수 PROFILE_TURNS=true 로도 켤 수 있습니다.
+      output_dir: ./data/profiles
+      interval_ms: 5
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from settings import data_dir, load_secret
+
+profiling_config = load_secret().get("profiling", {})
+# true 이면 모든 turn 을 프로파일링합니다. Streamlit 에서는 sidebar 의 기본값으로 사용합니다.
+PROFILE_TURNS = os.getenv("PROFILE_TURNS", str(profiling_config.get("enabled", False))).lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", profiling_config.get("output_dir", os.path.join(data_dir, "profiles")))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", profiling_config.get("interval_ms", 5))) / 1000
+
+
+def frame_label(code) -> str:
+    """folded stack 의 frame 이름. site-packages 아래 파일은 package 경로만 남깁니다."""
+    filename = code.co_filename.split("site-packages" + os.sep)[-1]
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({filename})".replace(";", ":")
+
+
+class StackSampler(threading.Thread):
+    """
+    interval 마다 add_thread 로 등록된 스레드의 stack 을 수집하고, include 중 하나가 파일 경로에 들어 있는 stack 만 셉니다.
+    기본값(langgraph) 은 그래프를 실행 중인 stack 만 남기고, 등록된 스레드가 다른 일을 하는 동안의 stack 은 제외합니다.
+    """
+
+    def __init__(self, interval: float = 0.005, include: Sequence[str] = ("langgraph",)):
+        super().__init__(name="turn-profiler", daemon=True)
+        self.interval = interval
+        self.include = include
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+        # thread id 별로 실행 중인 run 의 수. executor 스레드는 다른 turn 에 재사용되므로 run 이 끝나면 뺍니다.
+        self._threads: Counter = Counter()
+        self._threads_lock = threading.Lock()
+
+    def add_thread(self, thread_id: int):
+        with self._threads_lock:
+            self._threads[thread_id] += 1
+
+    def remove_thread(self, thread_id: int):
+        with self._threads_lock:
+            self._threads[thread_id] -= 1
+            if self._threads[thread_id] <= 0:
+                del self._threads[thread_id]
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.samples += 1
+            with self._threads_lock:
+                thread_ids = set(self._threads)
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                if any(part in code.co_filename for code in codes for part in self.include):
+                    self.stacks[";".join(frame_label(code) for code in reversed(codes))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write_folded(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def node_path(metadata: Optional[Dict[str, Any]]) -> Optional[str]:
+    """langgraph 가 넣어주는 checkpoint namespace 로 subgraph 를 포함한 노드 경로를 만듭니다."""
+    namespace = (metadata or {}).get("langgraph_checkpoint_ns")
+    if not namespace:
+        return None
+    return "/".join(part.split(":")[0] for part in namespace.split("|"))
+
+
+class SpanTracer(BaseCallbackHandler):
+    """
+    노드 / LLM / retriever / tool 의 시작과 끝 시간을 기록하는 callback handler.
+
+    sampler 가 있으면 callback 이 호출된 스레드를 run 이 끝날 때까지 sampling 대상으로 등록합니다.
+    callback 은 이 turn 의 config 로 실행된 run 에서만 호출되므로 다른 turn 의 스레드는 등록되지 않습니다.
+    """
+
+    def __init__(self, sampler: Optional[StackSampler] = None):
+        self.start = time.perf_counter()
+        self.sampler = sampler
+        self.spans: List[Dict[str, Any]] = []
+        self._open: Dict[UUID, Dict[str, Any]] = {}
+        self._run_threads: Dict[UUID, int] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, kind: str, name: str, run_id: UUID, parent_run_id: Optional[UUID], metadata):
+        if self.sampler is not None:
+            thread_id = threading.get_ident()
+            with self._lock:
+                self._run_threads[run_id] = thread_id
+            self.sampler.add_thread(thread_id)
+        node = node_path(metadata)
+        # 노드 자신의 실행은 이름이 langgraph_node 와 같은 chain 입니다.
+        if kind == "chain" and not (metadata and metadata.get("langgraph_node") == name):
+            return
+        with self._lock:
+            self._open[run_id] = {
+                "kind": "node" if kind == "chain" else kind,
+                "name": name,
+                "node": node,
+                "run_id": str(run_id),
+                "parent_run_id": str(parent_run_id) if parent_run_id else None,
+                "start_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            }
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None):
+        with self._lock:
+            thread_id = self._run_threads.pop(run_id, None)
+        if thread_id is not None:
+            self.sampler.remove_thread(thread_id)
+        with self._lock:
+            span = self._open.pop(run_id, None)
+            if span is None:
+                return
+            span["duration_ms"] = round((time.perf_counter() - self.start) * 1000 - span["start_ms"], 3)
+            if error is not None:
+                span["error"] = f"{type(error).__name__}: {error}"
+            self.spans.append(span)
+
+    @staticmethod
+    def _name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any]) -> str:
+        return kwargs.get("name") or (serialized or {}).get("name") or "unknown"
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start("chain", self._name(serialized, kwargs), run_id, parent_run_id, metadata)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start("llm", self._name(serialized, kwargs), run_id, parent_run_id, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start("llm", self._name(serialized, kwargs), run_id, parent_run_id, metadata)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start("retriever", self._name(serialized, kwargs), run_id, parent_run_id, metadata)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start("tool", self._name(serialized, kwargs), run_id, parent_run_id, metadata)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def node_summary(self) -> Dict[str, Dict[str, float]]:
+        """노드 경로 별 실행 시간과, 그 중 LLM / retriever / tool 호출에 쓴 시간을 반환합니다."""
+        summary: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"calls": 0, "total_ms": 0.0, "llm_ms": 0.0, "retriever_ms": 0.0, "tool_ms": 0.0}
+        )
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            node = span["node"] or "unknown"
+            if span["kind"] == "node":
+                summary[node]["calls"] += 1
+                summary[node]["total_ms"] += span["duration_ms"]
+            else:
+                summary[node][f"{span['kind']}_ms"] += span["duration_ms"]
+        return {node: {key: round(value, 3) for key, value in values.items()} for node, values in summary.items()}
+
+
+class TurnProfile:
+    """turn 하나의 sampling profiler 와 span tracer. tracer 를 그래프 callbacks 에 추가해서 사용합니다."""
+
+    def __init__(self, name: str, output_dir: str = PROFILE_DIR, interval: float = PROFILE_INTERVAL):
+        self.name = re.sub(r"[^\w-]", "_", name)
+        self.output_dir = output_dir
+        self.sampler = StackSampler(interval)
+        self.tracer = SpanTracer(self.sampler)
+        self.total_ms = 0.0
+        self.paths: Dict[str, str] = {}
+
+    def summary(self) -> Dict[str, Any]:
+        nodes = self.tracer.node_summary()
+        node_ms = sum(values["total_ms"] for node, values in nodes.items() if "/" not in node)
+        return {
+            "name": self.name,
+            "total_ms": round(self.total_ms, 3),
+            # 노드 밖에서 쓴 시간: reducer, checkpoint 직렬화, 스케줄링 등. routing 은 __start__ 노드에 포함됩니다.
+            "graph_overhead_ms": round(max(self.total_ms - node_ms, 0.0), 3),
+            "samples": self.sampler.samples,
+            "nodes": dict(sorted(nodes.items(), key=lambda item: item[1]["total_ms"], reverse=True)),
+            "files": self.paths,
+        }
+
+    def write(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{self.name}")
+        self.paths = {"folded": prefix + ".folded", "summary": prefix + ".json"}
+        self.sampler.write_folded(self.paths["folded"])
+        with open(self.paths["summary"], "w", encoding="utf-8") as f:
+            json.dump({**self.summary(), "spans": self.tracer.spans}, f, ensure_ascii=False, indent=2)
+
+
+@contextmanager
+def profile_turn(name: str, output_dir: str = PROFILE_DIR, interval: float = PROFILE_INTERVAL) -> Iterator[TurnProfile]:
+    """
+    with 블록 안의 turn 을 프로파일링하고, 끝나면 .folded 와 .json 파일을 저장합니다.
+
+    Example:
+        with profile_turn(thread_id) as profile:
+            main_graph.invoke(inputs, config={"callbacks": [profile.tracer], ...})
+        print(profile.summary())
+    """
+    profile = TurnProfile(name, output_dir, interval)
+    # with 블록을 실행하는 스레드는 항상 sampling 하고, executor 스레드는 tracer 가 run 단위로 등록합니다.
+    profile.sampler.add_thread(threading.get_ident())
+    start = time.perf_counter()
+    profile.sampler.start()
+    try:
+        yield profile
+    finally:
+        profile.sampler.stop()
+        profile.total_ms = (time.perf_counter() - start) * 1000
+        profile.write()
@@ -0,0 +1,160 @@
+import threading
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+def maximal_marginal_relevance(
+    query_embedding: np.ndarray, embeddings: np.ndarray, k: int, lambda_mult: float = 0.5
+) -> List[int]:
+    """
+    MMR 로 query 와 관련성이 높으면서 서로 중복되지 않는 embedding 의 index 를 k 개 선택합니다.
+
+    유사도 행렬을 한 번에 계산하고, 선택된 문서와의 최대 유사도를 누적해서 갱신합니다.
+    """
+    if len(embeddings) == 0 or k <= 0:
+        return []
+    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    query_embedding = query_embedding / np.linalg.norm(query_embedding)
+    query_similarity = embeddings @ query_embedding
+    pairwise_similarity = embeddings @ embeddings.T
+
+    selected = [int(np.argmax(query_similarity))]
+    max_similarity = pairwise_similarity[selected[0]].copy()
+    while len(selected) < min(k, len(embeddings)):
+        scores = lambda_mult * query_similarity - (1 - lambda_mult) * max_similarity
+        scores[selected] = -np.inf
+        idx = int(np.argmax(scores))
+        selected.append(idx)
+        max_similarity = np.maximum(max_similarity, pairwise_similarity[idx])
+    return selected
+
+
+def cutoff_by_score(scores: np.ndarray, score_threshold: float, score_gap: float, min_k: int = 1) -> int:
+    """
+    내림차순으로 정렬된 유사도 점수에서 몇 개를 남길지 계산합니다.
+
+    score_threshold 미만인 결과를 버리고, 인접한 두 결과의 점수 차이가 score_gap 보다 크게 벌어지는 지점에서 자릅니다.
+    """
+    if len(scores) == 0:
+        return 0
+    n = int(np.count_nonzero(scores >= score_threshold))
+    gaps = scores[:-1] - scores[1:]
+    large_gaps = np.flatnonzero(gaps[: max(n - 1, 0)] > score_gap)
+    if len(large_gaps):
+        n = int(large_gaps[0]) + 1
+    return min(max(n, min_k), len(scores))
+
+
+class RecentEmbeddings:
+    """
+    최근 검색에서 계산하거나 vectorstore 가 돌려준 embedding 을 텍스트 별로 보관하는 LRU 입니다.
+
+    grading cascade 가 방금 검색한 질문과 chunk 를 다시 embedding 하지 않고 이 값을 재사용합니다.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, text: str, embedding: np.ndarray):
+        with self._lock:
+            self._entries[text] = np.asarray(embedding, dtype=np.float32)
+            self._entries.move_to_end(text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        with self._lock:
+            embedding = self._entries.get(text)
+            if embedding is not None:
+                self._entries.move_to_end(text)
+            return embedding
+
+
+recent_embeddings = RecentEmbeddings()
+
+
+class RetrievalMetrics:
+    """adaptive retrieval 이 돌려준 chunk 수와, 고정 k 대비 절약한 grading 호출 수를 집계합니다."""
+
+    def __init__(self, baseline_k: int):
+        self.baseline_k = baseline_k
+        self.queries = 0
+        self.chunks_returned = 0
+        self.k_grown = 0
+        self._lock = threading.Lock()
+
+    def record(self, returned: int, grown: bool):
+        with self._lock:
+            self.queries += 1
+            self.chunks_returned += returned
+            self.k_grown += int(grown)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queries": self.queries,
+                "avg_chunks_per_query": round(self.chunks_returned / self.queries, 2) if self.queries else 0.0,
+                "k_grown": self.k_grown,
+                # grade_documents 는 chunk 마다 한 번씩 grading 을 호출합니다.
+                "grading_calls_saved": self.queries * self.baseline_k - self.chunks_returned,
+            }
+
+
+class AdaptiveRetriever(BaseRetriever):
+    """
+    유사도 점수로 결과 수를 조절하는 retriever 입니다.
+
+    1. k_initial 개를 검색하고, 최상위 점수가 weak_score 보다 낮을 때만 k_max 개로 늘려 다시 검색합니다.
+    2. score_threshold 와 score_gap 으로 결과를 자릅니다.
+    3. use_mmr 이면 검색 결과의 embedding 으로 MMR 을 계산해 중복된 chunk 를 걸러냅니다.
+    """
+
+    vectorstore: Any
+    k_initial: int = 5
+    k_max: int = 20
+    score_threshold: float = 0.3
+    score_gap: float = 0.08
+    weak_score: float = 0.45
+    min_k: int = 1
+    use_mmr: bool = False
+    mmr_lambda: float = 0.5
+    metrics: Any = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        query_embedding = np.asarray(self.vectorstore.embeddings.embed_query(query), dtype=np.float32)
+
+        results = self.vectorstore.similarity_search_with_embeddings(query_embedding, self.k_initial, query=query)
+        grown = False
+        if results and results[0][1] < self.weak_score and self.k_max > self.k_initial:
+            results = self.vectorstore.similarity_search_with_embeddings(query_embedding, self.k_max, query=query)
+            grown = True
+
+        scores = np.array([score for _, score, _ in results], dtype=np.float32)
+        n = cutoff_by_score(scores, self.score_threshold, self.score_gap, self.min_k)
+        if self.use_mmr and n > 1:
+            candidates = max(n, int(np.count_nonzero(scores >= self.score_threshold)))
+            embeddings = np.stack([embedding for _, _, embedding in results[:candidates]])
+            selected = maximal_marginal_relevance(query_embedding, embeddings, n, self.mmr_lambda)
+        else:
+            selected = range(n)
+
+        recent_embeddings.put(query, query_embedding)
+        docs = []
+        for i in selected:
+            doc, score, embedding = results[i]
+            doc.metadata["score"] = float(score)
+            recent_embeddings.put(doc.page_content, embedding)
+            docs.append(doc)
+
+        if self.metrics is not None:
+            self.metrics.record(len(docs), grown)
+        return docs
@@ -3,13 +3,14 @@ import yaml
 from langchain_core.prompts import load_prompt
 from langchain_core.output_parsers import StrOutputParser
 from langchain_community.vectorstores import FAISS, PGVector
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain_openai import OpenAIEmbeddings
 
 from abc import ABC, abstractmethod
 from operator import itemgetter
 from langchain import hub
 
-from settings import secret_path
+from settings import secret_path, load_secret
+from utils import load_chat_model
 
 
 class RetrievalChain(ABC):
@@ -38,7 +39,21 @@ class RetrievalChain(ABC):
         return OpenAIEmbeddings(api_key=self.api_key, model="text-embedding-3-small")
 
     def create_vectorstore(self, split_docs):
-        return FAISS.from_documents(documents=split_docs, embedding=self.create_embedding())
+        vectorstore_config = load_secret().get("vectorstore", {})
+        quantization = vectorstore_config.get("faiss_quantization", "none")
+        if quantization == "none":
+            return FAISS.from_documents(documents=split_docs, embedding=self.create_embedding())
+
+        # 축소된 벡터로 후보를 고르고 refine index 로 다시 정렬합니다.
+        from rag.faiss_quantized import build_quantized_faiss
+
+        return build_quantized_faiss(
+            split_docs,
+            self.create_embedding(),
+            quantization=quantization,
+            refine=vectorstore_config.get("faiss_refine", "flat"),
+            rescore_factor=vectorstore_config.get("rescore_factor", 4),
+        )
 
     def create_retriever(self, vectorstore):
         # MMR을 사용하여 검색을 수행하는 retriever를 생성합니다.
@@ -46,7 +61,7 @@ class RetrievalChain(ABC):
         return dense_retriever
 
     def create_model(self):
-        return ChatOpenAI(api_key=self.api_key, model_name="gpt-4o-mini", temperature=0)
+        return load_chat_model(model="gpt-4o-mini", temperature=0, stream=False)
 
     def create_prompt(self):
         return hub.pull("teddynote/rag-prompt-chat-history")
@@ -0,0 +1,117 @@
+"""
+RetrievalChain 의 로컬 FAISS vectorstore 를 quantized index 로 만드는 함수입니다.
+
+coarse index(scalar quantizer / PQ) 로 k * rescore_factor 개의 후보를 고르고,
+refine index(float32 또는 fp16) 의 거리로 다시 정렬해서 k 개를 반환합니다 (faiss.IndexRefine).
+
+    quantization   coarse 벡터 크기 (1536 차원 기준)
+    sq8            1536 bytes
+    sq4            768 bytes
+    fp16           3072 bytes
+    pq             96 bytes (1536 / 16 개 sub-quantizer)
+
+refine 이 flat 이면 float32 벡터(6144 bytes) 도 함께 저장하므로 메모리는 줄지 않고 검색만 빨라집니다.
+메모리를 줄이려면 refine 을 fp16 으로 설정합니다.
+
+Example (secret.yaml):
+    vectorstore:
+      faiss_quantization: sq8 # none | sq8 | sq4 | fp16 | pq
+      faiss_refine: fp16 # flat | fp16
+      rescore_factor: 4
+"""
+
+from typing import List
+
+import faiss
+import numpy as np
+
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+SCALAR_QUANTIZERS = {
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+    "sq4": faiss.ScalarQuantizer.QT_4bit,
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+}
+# PQ 의 codebook(2^8 개 centroid) 학습에 faiss 가 권장하는 최소 벡터 수
+PQ_MIN_TRAINING_VECTORS = 39 * 256
+
+
+def create_quantized_index(
+    dimensions: int, n_vectors: int, quantization: str = "sq8", refine: str = "flat", rescore_factor: int = 4
+) -> faiss.Index:
+    """
+    inner product(정규화된 OpenAI embedding 에서는 cosine similarity) 로 검색하는 quantized index 를 만듭니다.
+
+    Returns:
+        faiss.IndexRefine: 학습(train) 전의 index.
+    """
+    metric = faiss.METRIC_INNER_PRODUCT
+    if quantization == "pq" and n_vectors < PQ_MIN_TRAINING_VECTORS:
+        # 문서가 적으면 PQ codebook 을 학습할 수 없으므로 scalar quantizer 를 사용합니다.
+        quantization = "sq8"
+    if quantization == "pq":
+        coarse = faiss.IndexPQ(dimensions, dimensions // 16, 8, metric)
+    elif quantization in SCALAR_QUANTIZERS:
+        coarse = faiss.IndexScalarQuantizer(dimensions, SCALAR_QUANTIZERS[quantization], metric)
+    else:
+        raise ValueError(f"Unsupported faiss quantization: {quantization}")
+
+    if refine == "flat":
+        refine_index = faiss.IndexFlatIP(dimensions)
+    elif refine == "fp16":
+        refine_index = faiss.IndexScalarQuantizer(dimensions, faiss.ScalarQuantizer.QT_fp16, metric)
+    else:
+        raise ValueError(f"Unsupported faiss refine index: {refine}")
+
+    index = faiss.IndexRefine(coarse, refine_index)
+    index.k_factor = rescore_factor
+    # IndexRefine 은 coarse / refine index 를 소유하지 않으므로 python 객체가 먼저 해제되지 않도록 참조를 남깁니다.
+    index.referenced_objects = [coarse, refine_index]
+    return index
+
+
+def index_quantization(index: faiss.Index) -> str:
+    """
+    create_quantized_index 로 만든 index 의 coarse index 가 실제로 사용하는 quantization 을 반환합니다.
+    문서가 적어서 pq 대신 sq8 로 만든 경우에도 sq8 을 반환합니다.
+    """
+    coarse = faiss.downcast_index(faiss.downcast_index(index).base_index)
+    if isinstance(coarse, faiss.IndexPQ):
+        return "pq"
+    if isinstance(coarse, faiss.IndexScalarQuantizer):
+        qtypes = {qtype: name for name, qtype in SCALAR_QUANTIZERS.items()}
+        return qtypes.get(coarse.sq.qtype, "sq")
+    return type(coarse).__name__
+
+
+def build_quantized_faiss(
+    documents: List[Document],
+    embedding: Embeddings,
+    quantization: str = "sq8",
+    refine: str = "flat",
+    rescore_factor: int = 4,
+) -> FAISS:
+    """documents 를 embedding 한 뒤 quantized index 에 담은 FAISS vectorstore 를 반환합니다."""
+    texts = [document.page_content for document in documents]
+    vectors = np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    index = create_quantized_index(vectors.shape[1], len(vectors), quantization, refine, rescore_factor)
+    index.train(vectors)
+
+    vectorstore = FAISS(
+        embedding_function=embedding,
+        index=index,
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
+        normalize_L2=True,
+        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+    )
+    vectorstore.add_embeddings(
+        text_embeddings=list(zip(texts, vectors.tolist())),
+        metadatas=[document.metadata for document in documents],
+    )
+    return vectorstore
@@ -1,6 +1,6 @@
 from rag.base import RetrievalChain
 from langchain_community.document_loaders import PDFPlumberLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from rag.statute import load_text_splitter
 from typing import List, Annotated
 
 
@@ -19,4 +19,4 @@ class PDFRetrievalChain(RetrievalChain):
         return docs
 
     def create_text_splitter(self):
-        return RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=50)
+        return load_text_splitter(chunk_size=300, chunk_overlap=50)
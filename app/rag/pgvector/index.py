@@ -0,0 +1,264 @@
+"""
+pgvector ANN index 관리 명령입니다.
+
+langchain_pg_embedding 테이블에 collection 별 partial index(HNSW / IVFFlat) 를 생성, 재생성, 삭제하고
+index 크기와 생성 시간을 보여줍니다.
+
+quantization 을 지정하면 float32 embedding 대신 축소된 형태에 index 를 만듭니다.
+    halfvec     half precision (index 크기 1/2)
+    binary      binary_quantize 한 bit 벡터, hamming distance (index 크기 1/32)
+    subvector   앞쪽 coarse_dimensions 차원만 사용 (text-embedding-3 는 앞쪽 차원만으로도 검색 품질이 유지됩니다)
+테이블에는 float32 embedding 이 그대로 남아 있으므로, 검색은 축소된 index 로 후보를 고른 뒤 원래 embedding 으로 다시 정렬합니다.
+
+Usage:
+    python -m rag.pgvector.index create --method hnsw --m 16 --ef-construction 64
+    python -m rag.pgvector.index create --method hnsw --quantization binary
+    python -m rag.pgvector.index create --method ivfflat --lists 100
+    python -m rag.pgvector.index rebuild --method hnsw
+    python -m rag.pgvector.index create --method hnsw --collection income_tax
+    python -m rag.pgvector.index drop --method hnsw
+    python -m rag.pgvector.index info
+"""
+
+import argparse
+import json
+import time
+
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+
+OPS_CLASSES = {"cosine": "vector_cosine_ops", "l2": "vector_l2_ops", "ip": "vector_ip_ops"}
+HALFVEC_OPS_CLASSES = {"cosine": "halfvec_cosine_ops", "l2": "halfvec_l2_ops", "ip": "halfvec_ip_ops"}
+DISTANCE_OPERATORS = {"cosine": "<=>", "l2": "<->", "ip": "<#>"}
+QUANTIZATIONS = ("none", "halfvec", "binary", "subvector")
+INDEX_METHODS = ("hnsw", "ivfflat")
+# PostgreSQL 은 63 byte 보다 긴 identifier 를 잘라내므로, 긴 collection 이름의 index 끼리 이름이 겹칠 수 있습니다.
+MAX_IDENTIFIER_BYTES = 63
+
+
+def quantize_expr(expr: str, quantization: str, dimensions: int, coarse_dimensions: int) -> str:
+    """vector 식을 quantization 에 맞는 축소된 식으로 바꿉니다. index 와 검색 쿼리에 같은 식을 사용해야 합니다."""
+    if quantization == "none":
+        return expr
+    if quantization == "halfvec":
+        return f"({expr})::halfvec({dimensions})"
+    if quantization == "binary":
+        return f"binary_quantize({expr})::bit({dimensions})"
+    if quantization == "subvector":
+        return f"subvector({expr}, 1, {int(coarse_dimensions)})::vector({int(coarse_dimensions)})"
+    raise ValueError(f"Unsupported quantization: {quantization}")
+
+
+def index_ddl(
+    index_name: str,
+    table: str,
+    column_expr: str,
+    method: str = "hnsw",
+    distance: str = "cosine",
+    m: int = 16,
+    ef_construction: int = 64,
+    lists: int = 100,
+    where: Optional[str] = None,
+    ops_class: Optional[str] = None,
+) -> str:
+    """HNSW / IVFFlat index 생성 DDL 을 만듭니다. index_name 과 table 은 quote 된 identifier 여야 합니다."""
+    ops_class = ops_class or OPS_CLASSES[distance]
+    if method == "hnsw":
+        options = f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)})"
+    elif method == "ivfflat":
+        options = f"WITH (lists = {int(lists)})"
+    else:
+        raise ValueError(f"Unsupported index method: {method}")
+    ddl = f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} USING {method} (({column_expr}) {ops_class}) {options}"
+    if where:
+        ddl += f" WHERE {where}"
+    return ddl
+
+
+def query_tuning_sql(ef_search: Optional[int] = None, probes: Optional[int] = None) -> List[str]:
+    """transaction 안에서만 적용되는 검색 파라미터(SET LOCAL) 를 만듭니다."""
+    statements = []
+    if ef_search:
+        statements.append(f"SET LOCAL hnsw.ef_search = {int(ef_search)}")
+    if probes:
+        statements.append(f"SET LOCAL ivfflat.probes = {int(probes)}")
+    return statements
+
+
+class PgVectorIndexManager:
+    """
+    collection 하나의 ANN index 를 관리합니다.
+
+    embedding 컬럼은 차원이 지정되지 않은 vector 타입이므로 embedding::vector(dimensions) 식에 index 를 만들고,
+    다른 collection 의 row 가 섞이지 않도록 collection_id 로 partial index 를 만듭니다.
+    검색 쿼리도 같은 식(column_expr) 과 조건(where_clause) 을 사용해야 index 를 탑니다.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        collection_name: str,
+        dimensions: int = 1536,
+        distance: str = "cosine",
+        quantization: str = "none",
+        coarse_dimensions: int = 512,
+    ):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        self.engine = engine
+        self.collection_name = collection_name
+        self.dimensions = dimensions
+        self.distance = distance
+        self.quantization = quantization
+        self.coarse_dimensions = coarse_dimensions
+        self._collection_id = None
+
+    @property
+    def column_expr(self) -> str:
+        return f"embedding::vector({self.dimensions})"
+
+    @property
+    def coarse_expr(self) -> str:
+        """index 를 만들고 후보를 고를 때 사용하는 (quantization 이 적용된) 식."""
+        return quantize_expr(self.column_expr, self.quantization, self.dimensions, self.coarse_dimensions)
+
+    def coarse_distance(self, query_param: str = ":query") -> str:
+        """coarse_expr 과 query 사이의 거리 식. ORDER BY 에 그대로 사용하면 index 를 탑니다."""
+        query_expr = quantize_expr(
+            f"CAST({query_param} AS vector({self.dimensions}))",
+            self.quantization,
+            self.dimensions,
+            self.coarse_dimensions,
+        )
+        operator = "<~>" if self.quantization == "binary" else DISTANCE_OPERATORS[self.distance]
+        return f"{self.coarse_expr} {operator} {query_expr}"
+
+    @property
+    def ops_class(self) -> str:
+        if self.quantization == "binary":
+            return "bit_hamming_ops"
+        if self.quantization == "halfvec":
+            return HALFVEC_OPS_CLASSES[self.distance]
+        return OPS_CLASSES[self.distance]
+
+    @property
+    def collection_id(self) -> str:
+        if self._collection_id is None:
+            with self.engine.connect() as conn:
+                row = conn.execute(
+                    text("SELECT uuid FROM langchain_pg_collection WHERE name = :name"),
+                    {"name": self.collection_name},
+                ).fetchone()
+            if row is None:
+                raise ValueError(f"Collection not found: {self.collection_name}")
+            self._collection_id = str(row.uuid)
+        return self._collection_id
+
+    @property
+    def where_clause(self) -> str:
+        # partial index 조건과 검색 쿼리 조건이 같아야 하므로 uuid 를 literal 로 사용합니다.
+        return f"collection_id = '{self.collection_id}'::uuid"
+
+    def index_name(self, method: str, quantization: Optional[str] = None) -> str:
+        quantization = quantization or self.quantization
+        if quantization == "none":
+            return f"{self.collection_name}_{method}_idx"
+        return f"{self.collection_name}_{method}_{quantization}_idx"
+
+    def quoted_index_name(self, method: str) -> str:
+        """DDL 에 넣을 index 이름. collection 이름은 사용자 입력이므로 identifier 로 quote 합니다."""
+        name = self.index_name(method)
+        if len(name.encode("utf-8")) > MAX_IDENTIFIER_BYTES:
+            raise ValueError(f"Index name is longer than {MAX_IDENTIFIER_BYTES} bytes: {name}")
+        return self.engine.dialect.identifier_preparer.quote(name)
+
+    def create_index(
+        self, method: str = "hnsw", m: int = 16, ef_construction: int = 64, lists: int = 100
+    ) -> Dict:
+        ddl = index_ddl(
+            self.quoted_index_name(method),
+            "langchain_pg_embedding",
+            self.coarse_expr,
+            method=method,
+            distance=self.distance,
+            m=m,
+            ef_construction=ef_construction,
+            lists=lists,
+            where=self.where_clause,
+            ops_class=self.ops_class,
+        )
+        start = time.perf_counter()
+        with self.engine.begin() as conn:
+            conn.execute(text(ddl))
+        build_seconds = time.perf_counter() - start
+        return {**self.index_info(method), "build_seconds": round(build_seconds, 3)}
+
+    def rebuild_index(self, method: str = "hnsw") -> Dict:
+        start = time.perf_counter()
+        with self.engine.begin() as conn:
+            conn.execute(text(f"REINDEX INDEX {self.quoted_index_name(method)}"))
+        build_seconds = time.perf_counter() - start
+        return {**self.index_info(method), "build_seconds": round(build_seconds, 3)}
+
+    def drop_index(self, method: str = "hnsw"):
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DROP INDEX IF EXISTS {self.quoted_index_name(method)}"))
+
+    def index_info(self, method: Optional[str] = None) -> Dict:
+        """collection 의 index 이름, 정의, 크기를 반환합니다."""
+        # LIKE 로 찾으면 _ 가 wildcard 이고 다른 collection 의 index 도 prefix 로 걸리므로, 만들 수 있는 이름과 정확히 비교합니다.
+        if method:
+            names = [self.index_name(method)]
+        else:
+            names = [self.index_name(m, q) for m in INDEX_METHODS for q in QUANTIZATIONS]
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    """
+                    SELECT indexname, indexdef,
+                           pg_relation_size(quote_ident(indexname)::regclass) AS size_bytes,
+                           pg_size_pretty(pg_relation_size(quote_ident(indexname)::regclass)) AS size
+                    FROM pg_indexes
+                    WHERE tablename = 'langchain_pg_embedding' AND indexname IN :names
+                    ORDER BY indexname
+                    """
+                ).bindparams(bindparam("names", expanding=True)),
+                {"names": names},
+            ).fetchall()
+        indexes = [dict(row._mapping) for row in rows]
+        if method:
+            return indexes[0] if indexes else {}
+        return {"collection": self.collection_name, "indexes": indexes}
+
+
+if __name__ == "__main__":
+    from rag.pgvector.vectorstore import PostgresVectorstore
+
+    parser = argparse.ArgumentParser(description="Manage pgvector ANN indexes.")
+    parser.add_argument("command", choices=["create", "rebuild", "drop", "info"])
+    parser.add_argument("--method", choices=INDEX_METHODS, default="hnsw")
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--lists", type=int, default=100)
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default=None, help="default: vectorstore.quantization")
+    parser.add_argument("--coarse-dimensions", type=int, default=None)
+    parser.add_argument("--collection", default=None, help="default: vectorstore.collection_name")
+    args = parser.parse_args()
+
+    manager = PostgresVectorstore(collection_name=args.collection).index_manager
+    if args.quantization:
+        manager.quantization = args.quantization
+    if args.coarse_dimensions:
+        manager.coarse_dimensions = args.coarse_dimensions
+    if args.command == "create":
+        result = manager.create_index(args.method, m=args.m, ef_construction=args.ef_construction, lists=args.lists)
+    elif args.command == "rebuild":
+        result = manager.rebuild_index(args.method)
+    elif args.command == "drop":
+        manager.drop_index(args.method)
+        result = manager.index_info()
+    else:
+        result = manager.index_info()
+    print(json.dumps(result, indent=2, default=str))
@@ -0,0 +1,308 @@
+"""
+법령 / 연도 / 분야 별 collection(샤드) 중 질문과 관련된 collection 만 골라서 검색하는 shard router 입니다.
+
+collection 마다 metadata(법령 이름, 연도 등) 와 keyword, 그리고 embedding 의 평균(centroid) 을 가지고 있습니다.
+    1. 질문에 keyword 나 metadata 값이 들어 있는 collection 을 고릅니다.
+    2. 없으면 질문 embedding 과 centroid 의 cosine similarity 가 가장 높은 collection 과,
+       그보다 centroid_margin 이내로 낮은 collection 을 max_fan_out 개까지 고릅니다.
+고른 collection 들을 동시에 검색하고 점수 순으로 합쳐서 k 개를 반환합니다.
+centroid 는 시작할 때 계산하고, 실행 중에는 centroid_refresh_seconds 마다 검색 요청이 들어올 때
+백그라운드에서 다시 계산합니다. 따라서 ingest 로 문서를 추가하면 실행 중인 서버에는 그 시간 안에 반영됩니다.
+(0 이면 다시 계산하지 않으므로 ingest 후 서버를 재시작해야 합니다.)
+ShardRouter 는 PostgresVectorstore 와 같은 검색 interface(embeddings, similarity_search_with_embeddings) 를
+제공하므로 AdaptiveRetriever 에 그대로 사용할 수 있습니다.
+
+Example (secret.yaml):
+    shards:
+      enabled: true
+      max_fan_out: 2
+      centroid_margin: 0.05
+      centroid_refresh_seconds: 300
+      collections:
+        - name: income_tax
+          keywords: [소득세, 종합소득, 근로소득, 연말정산]
+          metadata: {law: 소득세법}
+        - name: corporate_tax
+          keywords: [법인세]
+          metadata: {law: 법인세법}
+
+Usage:
+    python -m rag.pgvector.shard ingest --collection income_tax ../data/소득세법.pdf
+    python -m rag.pgvector.shard list
+    python -m rag.pgvector.shard route "근로소득 비과세 한도는?"
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from langchain_core.documents import Document
+from sqlalchemy import text
+
+from settings import load_secret
+
+
+@dataclass
+class Shard:
+    name: str
+    vectorstore: Any
+    keywords: List[str] = field(default_factory=list)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    centroid: Optional[np.ndarray] = None
+
+    def matches(self, query: str) -> bool:
+        terms = self.keywords + [str(value) for value in self.metadata.values()]
+        return any(term and term in query for term in terms)
+
+
+def collection_centroid(vectorstore) -> Optional[np.ndarray]:
+    """collection 에 저장된 embedding 의 평균을 정규화해서 반환합니다. 비어 있으면 None 을 반환합니다."""
+    index_manager = vectorstore.index_manager
+    try:
+        where_clause = index_manager.where_clause
+    except ValueError:
+        return None
+    with vectorstore.engine.connect() as conn:
+        row = conn.execute(
+            text(
+                f"SELECT AVG({index_manager.column_expr})::text AS centroid "
+                f"FROM langchain_pg_embedding WHERE {where_clause}"
+            )
+        ).fetchone()
+    if row is None or row.centroid is None:
+        return None
+    centroid = np.fromstring(row.centroid.strip("[]"), sep=",", dtype=np.float32)
+    return centroid / (np.linalg.norm(centroid) + 1e-8)
+
+
+class ShardRouter:
+    """질문 별로 검색할 collection 을 고르고, 고른 collection 을 동시에 검색해서 결과를 합칩니다."""
+
+    def __init__(
+        self,
+        shards: List[Shard],
+        embeddings,
+        max_fan_out: int = 2,
+        centroid_margin: float = 0.05,
+        centroid_refresh_seconds: float = 300,
+    ):
+        self.shards = shards
+        self.embeddings = embeddings
+        self.max_fan_out = max_fan_out
+        self.centroid_margin = centroid_margin
+        self.centroid_refresh_seconds = centroid_refresh_seconds
+        self._refreshed_at = time.monotonic()
+        self._refreshing = False
+        self._executor = ThreadPoolExecutor(max_workers=max(len(shards) * 2, 4), thread_name_prefix="shard-search")
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=1000))
+        self._fan_out = Counter()
+        self._routed_by = Counter()
+
+    def refresh_centroids(self):
+        """collection 별 centroid 를 다시 계산합니다. 문서를 추가한 뒤에 호출합니다."""
+        centroids = self._executor.map(lambda shard: collection_centroid(shard.vectorstore), self.shards)
+        for shard, centroid in zip(self.shards, centroids):
+            shard.centroid = centroid
+        with self._lock:
+            self._refreshed_at = time.monotonic()
+
+    def _maybe_refresh_centroids(self):
+        """centroid_refresh_seconds 가 지났으면 검색을 막지 않도록 별도 스레드에서 centroid 를 다시 계산합니다."""
+        if not self.centroid_refresh_seconds:
+            return
+        with self._lock:
+            if self._refreshing or time.monotonic() - self._refreshed_at < self.centroid_refresh_seconds:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh_centroids()
+            except Exception as e:
+                print(f"[shard] centroid refresh failed: {type(e).__name__}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+                    self._refreshed_at = time.monotonic()
+
+        threading.Thread(target=run, name="shard-centroids", daemon=True).start()
+
+    def route(self, query: str, query_embedding: np.ndarray) -> List[Shard]:
+        matched = [shard for shard in self.shards if shard.matches(query)]
+        if matched:
+            self._count_route("metadata")
+            return matched[: self.max_fan_out]
+
+        scored = [
+            (float(shard.centroid @ query_embedding), shard) for shard in self.shards if shard.centroid is not None
+        ]
+        if not scored:
+            # centroid 가 아직 없으면(빈 collection 등) 모든 collection 을 검색합니다.
+            self._count_route("all")
+            return self.shards
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        best = scored[0][0]
+        self._count_route("centroid")
+        return [shard for score, shard in scored if score >= best - self.centroid_margin][: self.max_fan_out]
+
+    def _count_route(self, reason: str):
+        with self._lock:
+            self._routed_by[reason] += 1
+
+    def _search_shard(self, shard: Shard, query_embedding: np.ndarray, k: int, **kwargs):
+        start = time.perf_counter()
+        results = shard.vectorstore.similarity_search_with_embeddings(query_embedding, k, **kwargs)
+        with self._lock:
+            self._latencies[shard.name].append(time.perf_counter() - start)
+        for doc, _, _ in results:
+            doc.metadata["collection"] = shard.name
+        return results
+
+    def similarity_search_with_embeddings(
+        self, query_embedding: np.ndarray, k: int, query: str = "", **kwargs
+    ) -> List[Tuple[Document, float, np.ndarray]]:
+        """고른 collection 에서 각각 k 개를 검색하고, 점수 순으로 합친 상위 k 개를 반환합니다."""
+        self._maybe_refresh_centroids()
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        normalized = query_embedding / (np.linalg.norm(query_embedding) + 1e-8)
+        shards = self.route(query, normalized)
+        with self._lock:
+            self._fan_out[len(shards)] += 1
+        futures = [self._executor.submit(self._search_shard, shard, query_embedding, k, **kwargs) for shard in shards]
+        results = [result for future in futures for result in future.result()]
+        results.sort(key=lambda result: result[1], reverse=True)
+        return results[:k]
+
+    def stats(self) -> Dict[str, Any]:
+        """collection 별 검색 횟수와 latency, 질문 당 검색한 collection 수(fan-out) 분포를 반환합니다."""
+        with self._lock:
+            latencies = {name: list(values) for name, values in self._latencies.items()}
+            fan_out = dict(self._fan_out)
+            routed_by = dict(self._routed_by)
+        queries = sum(fan_out.values())
+        return {
+            "queries": queries,
+            "avg_fan_out": round(sum(n * count for n, count in fan_out.items()) / queries, 3) if queries else 0.0,
+            "fan_out": fan_out,
+            "routed_by": routed_by,
+            "shards": {
+                name: {
+                    "searches": len(values),
+                    "latency_ms_p50": round(float(np.percentile(values, 50)) * 1000, 2),
+                    "latency_ms_p95": round(float(np.percentile(values, 95)) * 1000, 2),
+                }
+                for name, values in latencies.items()
+                if values
+            },
+        }
+
+
+_router: Optional[ShardRouter] = None
+
+
+def load_shard_router(vectorstore) -> Optional[ShardRouter]:
+    """
+    secret.yaml 의 shards 설정이 켜져 있으면 collection 별 vectorstore 를 만들고 ShardRouter 를 생성합니다.
+
+    Args:
+        vectorstore: engine, embedding 을 공유할 PostgresVectorstore.
+    """
+    global _router
+    config = load_secret().get("shards", {})
+    if not config.get("enabled", False):
+        return None
+    shards = [
+        Shard(
+            name=collection["name"],
+            vectorstore=vectorstore.with_collection(collection["name"]),
+            keywords=collection.get("keywords", []),
+            metadata=collection.get("metadata", {}),
+        )
+        for collection in config.get("collections", [])
+    ]
+    _router = ShardRouter(
+        shards,
+        vectorstore.embeddings,
+        max_fan_out=config.get("max_fan_out", 2),
+        centroid_margin=config.get("centroid_margin", 0.05),
+        centroid_refresh_seconds=config.get("centroid_refresh_seconds", 300),
+    )
+    _router.refresh_centroids()
+    return _router
+
+
+def shard_stats() -> Dict[str, Any]:
+    return _router.stats() if _router is not None else {}
+
+
+if __name__ == "__main__":
+    from rag.pgvector.vectorstore import PostgresVectorstore
+
+    parser = argparse.ArgumentParser(description="Manage sharded pgvector collections.")
+    parser.add_argument("command", choices=["ingest", "list", "route"])
+    parser.add_argument("inputs", nargs="*", help="PDF paths for ingest, question for route")
+    parser.add_argument("--collection", help="collection name for ingest")
+    args = parser.parse_args()
+
+    base = PostgresVectorstore()
+    if args.command == "ingest":
+        target = base.with_collection(args.collection)
+        target.create_tables()
+        target.insert_pdf(args.inputs)
+        centroid = collection_centroid(target)
+        refresh_seconds = load_secret().get("shards", {}).get("centroid_refresh_seconds", 300)
+        print(
+            json.dumps(
+                {
+                    "collection": args.collection,
+                    "centroid_ready": centroid is not None,
+                    # 실행 중인 서버의 ShardRouter 는 이 시간 안에 centroid 를 다시 계산합니다. 0 이면 재시작해야 합니다.
+                    "running_routers_refresh_within_seconds": refresh_seconds or None,
+                },
+                ensure_ascii=False,
+            )
+        )
+    else:
+        router = load_shard_router(base)
+        if router is None:
+            raise SystemExit("shards.enabled is false in secret.yaml")
+        if args.command == "list":
+            with base.engine.connect() as conn:
+                rows = conn.execute(
+                    text(
+                        """
+                        SELECT c.name, COUNT(e.id) AS chunks
+                        FROM langchain_pg_collection c LEFT JOIN langchain_pg_embedding e ON e.collection_id = c.uuid
+                        GROUP BY c.name ORDER BY c.name
+                        """
+                    )
+                ).fetchall()
+            configured = {shard.name: shard for shard in router.shards}
+            for row in rows:
+                shard = configured.get(row.name)
+                print(
+                    json.dumps(
+                        {
+                            "collection": row.name,
+                            "chunks": row.chunks,
+                            "routed": shard is not None,
+                            "keywords": shard.keywords if shard else [],
+                            "centroid_ready": shard is not None and shard.centroid is not None,
+                        },
+                        ensure_ascii=False,
+                    )
+                )
+        else:
+            question = " ".join(args.inputs)
+            embedding = np.asarray(base.embeddings.embed_query(question), dtype=np.float32)
+            shards = router.route(question, embedding / np.linalg.norm(embedding))
+            print(json.dumps([shard.name for shard in shards], ensure_ascii=False))
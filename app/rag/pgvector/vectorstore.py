@@ -1,20 +1,29 @@
 import os
+import copy
 import yaml
 
+import numpy as np
+
+from sqlalchemy import create_engine, text
+from langchain_core.documents import Document
 from langchain_postgres import PGVector
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain_openai import OpenAIEmbeddings
 from langchain_core.output_parsers import StrOutputParser
 from langchain import hub
 from langchain_community.document_loaders import PDFPlumberLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List, Union
+from typing import Iterator, List, Tuple, Union
 from operator import itemgetter
 
-from settings import secret_path
+from settings import secret_path, load_secret
+from utils import load_chat_model
+from rag.adaptive import AdaptiveRetriever, RetrievalMetrics
+from rag.pgvector.index import PgVectorIndexManager, query_tuning_sql
+from rag.pgvector.shard import load_shard_router
+from rag.statute import StatuteTextSplitter, load_text_splitter
 
 
 class PostgresVectorstore:
-    def __init__(self):
+    def __init__(self, collection_name: str = None):
         with open(secret_path, "r", encoding="utf-8") as f:
             __secret = yaml.safe_load(f)
         __host = __secret["postgresql"]["host"]
@@ -26,23 +35,54 @@ class PostgresVectorstore:
 
         connection_string = f"postgresql+psycopg://{__username}:{__password}@{__host}:{__port}/{__database}"
 
-        self.model = ChatOpenAI(api_key=__open_ai_api_key, model_name="gpt-4o-mini", temperature=0)
+        self.model = load_chat_model(model="gpt-4o-mini", temperature=0, stream=False)
         self.embeddings = OpenAIEmbeddings(api_key=__open_ai_api_key, model="text-embedding-3-small")
-        collection_name = "langgraph_examples"
-
+        self.dimensions = 1536
+        self.engine = create_engine(connection_string)
+        vectorstore_config = load_secret().get("vectorstore", {})
+        self.quantization = vectorstore_config.get("quantization", "none")
+        self.coarse_dimensions = vectorstore_config.get("coarse_dimensions", 512)
+        # HNSW ef_search / IVFFlat probes 기본값. 검색 호출마다 덮어쓸 수 있습니다.
+        self.ef_search = vectorstore_config.get("ef_search")
+        self.probes = vectorstore_config.get("probes")
+        # quantization 을 사용할 때 축소된 index 로 고를 후보 수 = k * rescore_factor
+        self.rescore_factor = vectorstore_config.get("rescore_factor", 4)
+        # 샤드 라우팅이 켜져 있으면 retriever 가 이 vectorstore 대신 ShardRouter 로 검색합니다.
+        self.shard_router = None
+        self._bind_collection(collection_name or vectorstore_config.get("collection_name", "langgraph_examples"))
+
+    def _bind_collection(self, collection_name: str):
+        self.collection_name = collection_name
+        self.index_manager = PgVectorIndexManager(
+            self.engine,
+            self.collection_name,
+            self.dimensions,
+            quantization=self.quantization,
+            coarse_dimensions=self.coarse_dimensions,
+        )
         self.vectorstore = PGVector(
             embeddings=self.embeddings,
-            collection_name=collection_name,
-            connection=connection_string,
+            collection_name=self.collection_name,
+            connection=self.engine,
             use_jsonb=True,
         )
 
+    def with_collection(self, collection_name: str) -> "PostgresVectorstore":
+        """engine, embedding, model 을 공유하고 다른 collection 을 사용하는 vectorstore 를 반환합니다."""
+        other = copy.copy(self)
+        other.shard_router = None
+        other._bind_collection(collection_name)
+        return other
+
     def create_tables(self):
         self.vectorstore.create_tables_if_not_exists()
 
     def drop_tables(self):
         self.vectorstore.drop_tables()
 
+    def delete_collection(self):
+        self.vectorstore.delete_collection()
+
     def load_documents(self, source_uris: Union[List[str], str]):
         if isinstance(source_uris, list):
             docs = []
@@ -55,20 +95,119 @@ class PostgresVectorstore:
             doc.metadata["source"] = self._change_source_path(doc.metadata["source"])
         return docs
 
+    def lazy_load_documents(self, source_uris: Union[List[str], str]) -> Iterator[Document]:
+        # PDF 를 페이지 단위로 읽습니다. 큰 PDF 도 전체 페이지를 한 번에 메모리에 올리지 않습니다.
+        for source_uri in [source_uris] if isinstance(source_uris, str) else source_uris:
+            for doc in PDFPlumberLoader(source_uri).lazy_load():
+                doc.metadata["source"] = self._change_source_path(doc.metadata["source"])
+                yield doc
+
     def create_text_splitter(self, chunk_size=300, chunk_overlap=50):
-        return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        # secret.yaml 의 text_splitter.type 이 statute 이면 조 / 항 / 호 단위로 자르는 StatuteTextSplitter 를 사용합니다.
+        return load_text_splitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
 
     def create_retriever(self, k=10):
-        # MMR을 사용하여 검색을 수행하는 retriever를 생성합니다.
-        dense_retriever = self.vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": k})
+        # 항상 k 개를 돌려주는 retriever 를 생성합니다. 점수로 자르지 않도록 threshold / gap 을 비활성화합니다.
+        # PGVector.as_retriever 와 달리 PgVectorIndexManager 가 만든 ANN index 를 사용합니다.
+        dense_retriever = AdaptiveRetriever(
+            vectorstore=self.shard_router or self, k_initial=k, k_max=k, score_threshold=-1.0, score_gap=2.0
+        )
         return dense_retriever
 
+    def create_adaptive_retriever(
+        self,
+        k_initial=5,
+        k_max=20,
+        score_threshold=0.3,
+        score_gap=0.08,
+        weak_score=0.45,
+        use_mmr=False,
+        mmr_lambda=0.5,
+        baseline_k=10,
+    ):
+        # 유사도 점수에 따라 결과 수를 조절하는 retriever 를 생성합니다.
+        return AdaptiveRetriever(
+            vectorstore=self.shard_router or self,
+            k_initial=k_initial,
+            k_max=k_max,
+            score_threshold=score_threshold,
+            score_gap=score_gap,
+            weak_score=weak_score,
+            use_mmr=use_mmr,
+            mmr_lambda=mmr_lambda,
+            metrics=RetrievalMetrics(baseline_k=baseline_k),
+        )
+
+    def similarity_search_with_embeddings(
+        self, query_embedding: np.ndarray, k: int, ef_search: int = None, probes: int = None, query: str = None
+    ) -> List[Tuple[Document, float, np.ndarray]]:
+        """
+        query embedding 과 가까운 chunk 를 (문서, cosine similarity, embedding) 형태로 k 개 반환합니다.
+        query(질문 원문) 는 ShardRouter 가 collection 을 고를 때만 사용하고, 여기서는 사용하지 않습니다.
+
+        MMR 을 로컬에서 계산할 수 있도록 저장된 embedding 도 함께 가져옵니다.
+        ORDER BY 식과 WHERE 조건은 PgVectorIndexManager 가 만든 partial index 와 같아야 index 를 사용합니다.
+        quantization 을 사용하면 축소된 index 로 k * rescore_factor 개의 후보를 고르고,
+        float32 embedding 과의 정확한 거리로 다시 정렬해서 k 개를 반환합니다.
+        """
+        column_expr = self.index_manager.column_expr
+        exact_distance = f"{column_expr} <=> CAST(:query AS vector({self.dimensions}))"
+        ef_search = ef_search or self.ef_search
+        params = {"query": self._to_vector_literal(query_embedding), "k": k}
+        if self.index_manager.quantization == "none":
+            statement = text(
+                f"""
+                SELECT document, cmetadata, embedding::text AS embedding, {exact_distance} AS distance
+                FROM langchain_pg_embedding
+                WHERE {self.index_manager.where_clause}
+                ORDER BY {exact_distance}
+                LIMIT :k
+                """
+            )
+        else:
+            params["candidates"] = k * self.rescore_factor
+            # HNSW 는 ef_search 개까지만 후보를 돌려주므로 후보 수보다 작으면 늘립니다.
+            ef_search = max(ef_search or 40, params["candidates"])
+            statement = text(
+                f"""
+                SELECT document, cmetadata, embedding::text AS embedding, {exact_distance} AS distance
+                FROM (
+                    SELECT document, cmetadata, embedding
+                    FROM langchain_pg_embedding
+                    WHERE {self.index_manager.where_clause}
+                    ORDER BY {self.index_manager.coarse_distance()}
+                    LIMIT :candidates
+                ) AS coarse
+                ORDER BY distance
+                LIMIT :k
+                """
+            )
+        with self.engine.begin() as conn:
+            for tuning in query_tuning_sql(ef_search, probes or self.probes):
+                conn.execute(text(tuning))
+            rows = conn.execute(statement, params).fetchall()
+        return [
+            (
+                Document(page_content=row.document, metadata=row.cmetadata or {}),
+                1.0 - float(row.distance),
+                np.fromstring(row.embedding.strip("[]"), sep=",", dtype=np.float32),
+            )
+            for row in rows
+        ]
+
     def create_prompt(self):
         return hub.pull("teddynote/rag-prompt-chat-history")
 
     def create_chain(self):
         prompt = self.create_prompt()
-        self.retriever = self.create_retriever()
+        self.shard_router = load_shard_router(self)
+        retrieval_config = load_secret().get("retrieval", {})
+        if retrieval_config.get("mode", "similarity") == "adaptive":
+            self.retriever = self.create_adaptive_retriever(
+                **{k: v for k, v in retrieval_config.items() if k != "mode"}
+            )
+        else:
+            self.retriever = self.create_retriever()
         self.chain = (
             {
                 "question": itemgetter("question"),
@@ -81,11 +220,24 @@ class PostgresVectorstore:
         )
         return self
 
-    def insert_pdf(self, source_uris: Union[List[str], str]):
+    def insert_pdf(self, source_uris: Union[List[str], str], batch_size: int = 256):
         text_splitter = self.create_text_splitter()
-        docs = self.load_documents(source_uris)
-        split_docs = text_splitter.split_documents(docs)
-        self.vectorstore.add_documents(split_docs)
+        if isinstance(text_splitter, StatuteTextSplitter):
+            split_docs = text_splitter.iter_split_documents(self.lazy_load_documents(source_uris))
+        else:
+            split_docs = text_splitter.split_documents(self.load_documents(source_uris))
+        batch = []
+        for doc in split_docs:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                self.vectorstore.add_documents(batch)
+                batch = []
+        if batch:
+            self.vectorstore.add_documents(batch)
 
     def _change_source_path(self, path: str) -> str:
         return os.path.split(path)[1]
+
+    @staticmethod
+    def _to_vector_literal(embedding) -> str:
+        return "[" + ",".join(f"{float(x):.8f}" for x in embedding) + "]"
@@ -0,0 +1,256 @@
+"""
+세법 PDF 처럼 조(條) / 항(項) / 호(號) 구조를 가진 법령 문서용 text splitter 입니다.
+
+RecursiveCharacterTextSplitter 는 글자 수로만 자르기 때문에 조문 중간이 잘리고 조각난 chunk 가 많이 생깁니다.
+StatuteTextSplitter 는 조 단위로 chunk 를 만들고, chunk_size 를 넘는 조는 항 → 호 → 목 순서로 나눈 뒤 다시 채워 담습니다.
+chunk 마다 조 번호, 조 제목, 편/장/절 을 metadata 로 남기고, 나뉜 chunk 에는 조 제목을 앞에 붙입니다.
+min_chunk_size 보다 작은 조나 나뉜 조의 작은 조각은 같은 장의 이웃 chunk 와 합칩니다.
+본문 없이 "삭제 <날짜>" 만 남은 조는 검색에 쓸모가 없으므로 chunk 로 만들지 않습니다.
+
+iter_split_documents 는 페이지 Document 를 하나씩 받아 처리하므로, 큰 PDF 도 lazy_load 와 함께 쓰면
+한 번에 하나의 조만 메모리에 올립니다.
+
+Example (secret.yaml):
+    text_splitter:
+      type: statute # recursive | statute
+      chunk_size: 1000
+      chunk_overlap: 100
+      min_chunk_size: 200
+"""
+
+import re
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter, TextSplitter
+
+from settings import load_secret
+
+# 제12조(비과세소득), 제12조의2(...), 제3조 삭제 <2010.12.27>
+ARTICLE_PATTERN = re.compile(r"^\s*(제\s?\d+\s?조(?:\s?의\s?\d+)?)\s*(?:\(([^()]{1,60})\)|(?=삭제))")
+SECTION_PATTERN = re.compile(r"^\s*(?:제\s?\d+\s?(?:편|장|절|관)\s+\S.*|부\s*칙(?:\s*<[^>]*>)?)\s*$")
+# 제3조 삭제 <2010.12.27>, 제3조 (삭제)
+DELETED_PATTERN = re.compile(
+    r"\s*제\s?\d+\s?조(?:\s?의\s?\d+)?\s*(?:\([^()]{1,60}\))?\s*(?:\(\s*삭제\s*\)|삭제)\s*(?:[<\[][^>\]]*[>\]]\s*)*"
+)
+PARAGRAPH_PATTERN = re.compile(r"^\s*[①-⑳]")  # ① ~ ⑳
+ITEM_PATTERN = re.compile(r"^\s*\d+(?:의\d+)?\.\s")
+SUB_ITEM_PATTERN = re.compile(r"^\s*[가-하]\.\s")
+UNIT_PATTERNS = (PARAGRAPH_PATTERN, ITEM_PATTERN, SUB_ITEM_PATTERN)
+# 국가법령정보센터 PDF 의 페이지 머리말 / 꼬리말
+NOISE_PATTERNS = (re.compile(r"^\s*법제처\s+\d+\s+국가법령정보센터\s*$"),)
+
+
+@dataclass
+class _Article:
+    article_no: str
+    title: str
+    section: str
+    metadata: Dict[str, Any]
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def header(self) -> str:
+        return f"{self.article_no}({self.title})" if self.title else self.article_no
+
+
+def _split_lines(text: str, pattern: re.Pattern) -> List[str]:
+    """pattern 에 맞는 줄에서 새 단위를 시작하도록 text 를 나눕니다."""
+    units: List[str] = []
+    current: List[str] = []
+    for line in text.splitlines():
+        if pattern.match(line) and current:
+            units.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        units.append("\n".join(current))
+    return units
+
+
+class StatuteTextSplitter(TextSplitter):
+    """
+    조 / 항 / 호 경계를 따라 법령 텍스트를 나눕니다.
+
+    Args:
+        chunk_size: chunk 의 최대 길이. 이보다 긴 조는 항 / 호 / 목 단위로 나눠 다시 채워 담습니다.
+        chunk_overlap: 항 / 호 / 목으로도 나눌 수 없는 긴 문단을 RecursiveCharacterTextSplitter 로 자를 때의 overlap.
+        min_chunk_size: 이보다 짧은 chunk 는 같은 장의 이웃 chunk 와 합칩니다.
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 100, min_chunk_size: int = 200, **kwargs):
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap, **kwargs)
+        self.min_chunk_size = min_chunk_size
+        # 조 제목을 붙일 자리를 뺀 budget 별로 만든 fallback splitter
+        self._fallbacks: Dict[int, RecursiveCharacterTextSplitter] = {}
+
+    def split_text(self, text: str) -> List[str]:
+        return [document.page_content for document in self.iter_split_documents([Document(page_content=text)])]
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        return list(self.iter_split_documents(documents))
+
+    def iter_split_documents(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """페이지 Document 를 순서대로 받아 조 단위 chunk Document 를 생성합니다."""
+        return self._merge_small(self._iter_chunks(documents))
+
+    def _iter_chunks(self, documents: Iterable[Document]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        previous: Optional[Tuple[str, Dict[str, Any]]] = None
+        for article in self._iter_articles(documents):
+            lead = 0
+            if (
+                previous is not None
+                and "part" not in previous[1]
+                and previous[1].get("source") == article.metadata.get("source")
+                and previous[1]["section"] == article.section
+                and self._length_function(previous[0]) < self.min_chunk_size
+            ):
+                # 앞의 작은 조가 이 조의 첫 조각과 합쳐질 수 있도록 자리를 남깁니다.
+                lead = self._length_function(previous[0]) + 1
+            for chunk in self._split_article(article, lead):
+                previous = chunk
+                yield chunk
+
+    def _iter_articles(self, documents: Iterable[Document]) -> Iterator[_Article]:
+        article: Optional[_Article] = None
+        source = None
+        section = ""
+        for document in documents:
+            if article is None or document.metadata.get("source") != source:
+                # 새 파일이 시작되면 이전 파일의 마지막 조를 내보내고 장 정보를 초기화합니다.
+                if article is not None:
+                    yield article
+                source, section = document.metadata.get("source"), ""
+                article = _Article("", "", section, dict(document.metadata))
+            for line in document.page_content.splitlines():
+                if not line.strip() or any(pattern.match(line) for pattern in NOISE_PATTERNS):
+                    continue
+                if SECTION_PATTERN.match(line):
+                    yield article
+                    section = " ".join(line.split())
+                    article = _Article("", "", section, dict(document.metadata))
+                    continue
+                match = ARTICLE_PATTERN.match(line)
+                if match:
+                    yield article
+                    article_no = re.sub(r"\s", "", match.group(1))
+                    article = _Article(article_no, (match.group(2) or "").strip(), section, dict(document.metadata))
+                article.lines.append(line)
+        if article is not None:
+            yield article
+
+    def _split_article(self, article: _Article, lead: int = 0) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        text = "\n".join(article.lines).strip()
+        if not text:
+            return
+        if DELETED_PATTERN.fullmatch(text):
+            return
+        metadata = {
+            **article.metadata,
+            "article_no": article.article_no,
+            "article_title": article.title,
+            "section": article.section,
+        }
+        if self._length_function(text) <= self._chunk_size:
+            yield text, metadata
+            return
+
+        # 나뉜 chunk 에도 어느 조의 내용인지 알 수 있도록 조 제목을 붙입니다.
+        header = article.header
+        budget = self._chunk_size - self._length_function(header) - 1 if header else self._chunk_size
+        budget -= lead
+        for i, piece in enumerate(self._split_block(text, 0, budget)):
+            content = piece if i == 0 or not header else f"{header}\n{piece}"
+            yield content, {**metadata, "part": i}
+
+    def _split_block(self, text: str, level: int, budget: int) -> List[str]:
+        if self._length_function(text) <= budget:
+            return [text]
+        for next_level in range(level, len(UNIT_PATTERNS)):
+            units = _split_lines(text, UNIT_PATTERNS[next_level])
+            if len(units) > 1:
+                pieces = [piece for unit in units for piece in self._split_block(unit, next_level + 1, budget)]
+                return self._pack(pieces, budget)
+        return self._fallback(budget).split_text(text)
+
+    def _fallback(self, budget: int) -> RecursiveCharacterTextSplitter:
+        """항 / 호 로도 나눌 수 없는 긴 문단을 budget 크기로 자르는 splitter 를 반환합니다."""
+        if budget not in self._fallbacks:
+            self._fallbacks[budget] = RecursiveCharacterTextSplitter(
+                chunk_size=budget,
+                chunk_overlap=min(self._chunk_overlap, budget // 2),
+                length_function=self._length_function,
+            )
+        return self._fallbacks[budget]
+
+    def _pack(self, pieces: List[str], budget: int) -> List[str]:
+        """작은 항 / 호 를 budget 안에서 이어 붙입니다."""
+        chunks: List[str] = []
+        for piece in pieces:
+            if chunks and self._length_function(chunks[-1]) + self._length_function(piece) + 1 <= budget:
+                chunks[-1] = f"{chunks[-1]}\n{piece}"
+            elif chunks and self._length_function(chunks[-1]) < self.min_chunk_size:
+                # 작은 조각 뒤에 큰 조각이 오면 둘을 이어서 budget 크기로 다시 자릅니다.
+                # 줄바꿈으로 이으면 fallback splitter 가 그 자리에서 다시 자르므로 공백으로 잇습니다.
+                chunks[-1:] = self._fallback(budget).split_text(f"{chunks[-1]} {piece}")
+            else:
+                chunks.append(piece)
+        return chunks
+
+    def _merge_small(self, chunks: Iterator[Tuple[str, Dict[str, Any]]]) -> Iterator[Document]:
+        """
+        min_chunk_size 보다 짧은 chunk 를 같은 파일, 같은 장의 이웃 chunk 와 합칩니다.
+
+        나뉜 조의 조각(part) 과도 합치며, 같은 조의 다음 조각을 이어 붙일 때는 반복되는 조 제목을 뺍니다.
+        """
+        buffer: Optional[Tuple[str, Dict[str, Any]]] = None
+        for text, metadata in chunks:
+            if buffer is not None:
+                buffer_text, buffer_metadata = buffer
+                buffer_articles = buffer_metadata["article_no"].split(", ")
+                addition = text
+                if metadata.get("part", 0) > 0 and buffer_articles[-1] == metadata["article_no"]:
+                    header = _Article(metadata["article_no"], metadata["article_title"], "", {}).header
+                    if header and text.startswith(f"{header}\n"):
+                        addition = text[len(header) + 1 :]
+                mergeable = (
+                    buffer_metadata.get("source") == metadata.get("source")
+                    and buffer_metadata["section"] == metadata["section"]
+                    and min(self._length_function(buffer_text), self._length_function(addition)) < self.min_chunk_size
+                    and self._length_function(buffer_text) + self._length_function(addition) + 1 <= self._chunk_size
+                )
+                if mergeable:
+                    article_no = ", ".join(dict.fromkeys(no for no in buffer_articles + [metadata["article_no"]] if no))
+                    titles = buffer_metadata["article_title"].split(", ") + [metadata["article_title"]]
+                    merged_metadata = {
+                        **buffer_metadata,
+                        "article_no": article_no,
+                        "article_title": ", ".join(dict.fromkeys(title for title in titles if title)),
+                    }
+                    if "part" not in buffer_metadata and "part" in metadata:
+                        merged_metadata["part"] = metadata["part"]
+                    buffer = (f"{buffer_text}\n{addition}", merged_metadata)
+                    continue
+                yield Document(page_content=buffer_text, metadata=buffer_metadata)
+            buffer = (text, metadata)
+        if buffer is not None:
+            yield Document(page_content=buffer[0], metadata=buffer[1])
+
+
+def load_text_splitter(chunk_size: int = 300, chunk_overlap: int = 50) -> TextSplitter:
+    """
+    secret.yaml 의 text_splitter 설정으로 text splitter 를 생성합니다.
+
+    Returns:
+        TextSplitter: type 이 statute 이면 StatuteTextSplitter, 아니면 RecursiveCharacterTextSplitter.
+    """
+    config = load_secret().get("text_splitter", {})
+    chunk_size = config.get("chunk_size", chunk_size)
+    chunk_overlap = config.get("chunk_overlap", chunk_overlap)
+    if config.get("type", "recursive") == "statute":
+        return StatuteTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, min_chunk_size=config.get("min_chunk_size", 200)
+        )
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
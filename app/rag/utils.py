@@ -88,6 +88,6 @@ def question_rewrite(query: str) -> str:
         input_variables=["generation", "question"],
     )
 
-    model = load_chat_model(model="gpt-4o-mini", temperature=0)
+    model = load_chat_model(model="gpt-4o-mini", temperature=0, lane="grading")
     question_rewriter = re_write_prompt | model | StrOutputParser()
     return question_rewriter.invoke({"question": query})
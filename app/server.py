@@ -0,0 +1,277 @@
+"""
+graph/main.py 의 app 을 HTTP/SSE 로 제공하는 ASGI 서버입니다.
+
+대화는 thread_id 로 구분되고 상태는 checkpointer 에 저장되므로, 여러 worker 프로세스로 실행하려면
+secret.yaml 의 checkpointer 를 sqlite 또는 postgres 로 설정해야 합니다.
+admission(동시 실행 수, 대기열, thread 당 하나의 turn) 은 worker 프로세스 안에서만 적용됩니다.
+--workers N 이면 같은 thread_id 의 요청이 서로 다른 worker 에서 동시에 실행될 수 있으므로,
+thread 당 하나의 turn 이 필요하면 load balancer 에서 thread_id 로 sticky routing 을 설정해야 합니다.
+
+Usage:
+    pip install fastapi uvicorn  # streamlit 페이지와 batch CLI 에는 필요하지 않은 서버 전용 의존성입니다.
+    cd app
+    python server.py --host 0.0.0.0 --port 8000 --workers 4
+
+Endpoints:
+    POST /threads/{thread_id}/stream   {"message": "..."} 를 받아 SSE 로 응답을 스트리밍합니다.
+    GET  /threads/{thread_id}/messages 저장된 대화 내역을 반환합니다. ?limit=N 이면 마지막 N 개만 반환합니다.
+    GET  /healthz                      admission 상태를 반환합니다.
+    GET  /metrics                      admission, LLM 캐시/스케줄러/호출 정책, retrieval, speculative routing,
+                                       cascade, 페이지 수집, shard 라우팅, 대화 기억 지표를 반환합니다.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+import uvicorn
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.types import Receive, Scope, Send
+
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
+
+from llm_cache import cache_stats
+from llm_policy import policy_stats
+from llm_scheduler import scheduler_stats
+from settings import load_secret
+
+serving_config = load_secret().get("serving", {})
+
+# 동시에 실행할 수 있는 turn 수와 대기열 길이(worker 프로세스 당)
+MAX_CONCURRENT = int(os.getenv("SERVING_MAX_CONCURRENT", serving_config.get("max_concurrent", 8)))
+MAX_QUEUE = int(os.getenv("SERVING_MAX_QUEUE", serving_config.get("max_queue", 32)))
+QUEUE_TIMEOUT = float(os.getenv("SERVING_QUEUE_TIMEOUT", serving_config.get("queue_timeout", 10)))
+# 클라이언트가 느리게 읽을 때 쌓아둘 수 있는 스트림 청크 수. 가득 차면 그래프 실행이 대기합니다.
+STREAM_BUFFER = int(os.getenv("SERVING_STREAM_BUFFER", serving_config.get("stream_buffer", 64)))
+
+
+class ChatRequest(BaseModel):
+    message: str
+
+
+class AdmissionRejected(Exception):
+    pass
+
+
+class AdmissionController:
+    """
+    worker 프로세스 당 동시 실행 수와 대기열 길이를 제한합니다.
+
+    실행 중인 turn 이 max_concurrent 개를 넘으면 대기열에서 기다리고,
+    대기열도 가득 차거나 queue_timeout 안에 자리가 나지 않으면 AdmissionRejected 를 발생시킵니다.
+    같은 thread_id 에 대해서는 한 번에 하나의 turn 만 실행합니다. 이 상태는 프로세스 메모리에 있으므로
+    worker 사이에서는 공유되지 않습니다. (모듈 docstring 참고)
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.active_threads = set()
+        self.waiting = 0
+        self.running = 0
+        self.rejected = 0
+
+    async def acquire(self, thread_id: str):
+        if thread_id in self.active_threads:
+            self.rejected += 1
+            raise HTTPException(status_code=409, detail=f"thread {thread_id} already has a running turn")
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected("queue is full")
+
+        self.active_threads.add(thread_id)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.active_threads.discard(thread_id)
+            self.rejected += 1
+            raise AdmissionRejected("queue timeout")
+        except BaseException:
+            # 대기 중에 연결이 끊겨 취소되어도 thread 가 계속 409 를 받지 않도록 정리합니다.
+            self.active_threads.discard(thread_id)
+            raise
+        finally:
+            self.waiting -= 1
+        self.running += 1
+
+    def release(self, thread_id: str):
+        self.running -= 1
+        self.active_threads.discard(thread_id)
+        self.semaphore.release()
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+        }
+
+
+def sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@asynccontextmanager
+async def lifespan(api: FastAPI):
+    # 그래프(모델, checkpointer) 는 worker 프로세스 마다 한 번만 로드합니다.
+    from graph.main import app as main_graph
+
+    api.state.graph = main_graph
+    api.state.admission = AdmissionController(MAX_CONCURRENT, MAX_QUEUE, QUEUE_TIMEOUT)
+    yield
+
+
+api = FastAPI(lifespan=lifespan)
+
+
+async def stream_turn(request: Request, thread_id: str, message: str) -> AsyncIterator[str]:
+    """
+    그래프를 별도 스레드에서 실행하고, 메시지 청크를 bounded queue 로 받아 SSE 이벤트로 내보냅니다.
+
+    queue 가 가득 차면 그래프 실행 스레드가 대기하므로 느린 클라이언트가 메모리를 무한히 점유하지 않습니다.
+    클라이언트 연결이 끊기면 그래프 실행을 중단합니다.
+    """
+    graph = request.app.state.graph
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_BUFFER)
+    cancelled = threading.Event()
+    done = object()
+
+    def put(item):
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce():
+        config = RunnableConfig({"configurable": {"thread_id": thread_id}})
+        try:
+            for chunk_msg, metadata in graph.stream(
+                {"messages": [HumanMessage(message)]}, config, stream_mode="messages"
+            ):
+                if cancelled.is_set():
+                    break
+                if chunk_msg.content and metadata.get("langgraph_node") == "chat":
+                    put(("token", {"node": metadata["langgraph_node"], "content": chunk_msg.content}))
+            if not cancelled.is_set():
+                state = graph.get_state(config)
+                put(("end", {"content": state.values["messages"][-1].content}))
+        except Exception as e:
+            put(("error", {"detail": str(e)}))
+        finally:
+            put(done)
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if await request.is_disconnected():
+                cancelled.set()
+                break
+            event, data = item
+            yield sse_event(event, data)
+    finally:
+        cancelled.set()
+        # producer 가 put 에서 대기 중이면 빠져나올 수 있도록 queue 를 비웁니다.
+        while not producer.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.sleep(0.01)
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    admission 을 받은 turn 의 응답입니다.
+
+    본문을 보내기 전에 연결이 끊기면 starlette 는 body iterator 를 시작하지도, background task 를 실행하지도 않으므로
+    응답 전송이 어떻게 끝나든 body iterator 를 닫아 그래프 실행을 멈춘 뒤 admission 을 반환합니다.
+    """
+
+    def __init__(self, content, admission: AdmissionController, thread_id: str, **kwargs):
+        super().__init__(content, **kwargs)
+        self.admission = admission
+        self.thread_id = thread_id
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                await self.body_iterator.aclose()
+            finally:
+                self.admission.release(self.thread_id)
+
+
+@api.post("/threads/{thread_id}/stream")
+async def chat_stream(thread_id: str, body: ChatRequest, request: Request):
+    admission: AdmissionController = request.app.state.admission
+    try:
+        await admission.acquire(thread_id)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+    try:
+        return AdmittedStreamingResponse(
+            stream_turn(request, thread_id, body.message), admission, thread_id, media_type="text/event-stream"
+        )
+    except BaseException:
+        admission.release(thread_id)
+        raise
+
+
+@api.get("/threads/{thread_id}/messages")
+async def thread_messages(thread_id: str, request: Request, limit: Optional[int] = None):
+    from graph.memory import load_thread_history
+
+    return await asyncio.to_thread(load_thread_history, request.app.state.graph, thread_id, limit)
+
+
+@api.get("/healthz")
+async def healthz(request: Request):
+    return request.app.state.admission.stats()
+
+
+@api.get("/metrics")
+async def metrics(request: Request):
+    from graph.cascade import cascade_stats
+    from graph.memory import memory_stats
+    from graph.page_fetch import page_fetch_stats
+    from rag.pgvector.shard import shard_stats
+    from graph.retrieval import retrieval
+    from graph.speculative import speculative_router
+
+    retrieval_metrics = getattr(retrieval, "metrics", None)
+    return {
+        "admission": request.app.state.admission.stats(),
+        "llm_cache": cache_stats(),
+        "llm_scheduler": scheduler_stats(),
+        "llm_policies": policy_stats(),
+        "retrieval": retrieval_metrics.report() if retrieval_metrics else {},
+        "speculative_routing": speculative_router.metrics(),
+        "grading_cascade": cascade_stats(),
+        "web_page_fetch": page_fetch_stats(),
+        "shards": shard_stats(),
+        "conversation_memory": memory_stats(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the chat graph over HTTP/SSE.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    uvicorn.run("server:api", host=args.host, port=args.port, workers=args.workers)
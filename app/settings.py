@@ -3,9 +3,21 @@ This file is used to store the settings for the app.
 """
 
 import os
+import yaml
 
 root_dir = os.path.dirname(os.path.abspath(__file__))
 data_dir = os.path.join(os.path.abspath(os.path.join(root_dir, os.pardir)), "data")
 
 secret_path = os.path.join(os.path.abspath(os.path.join(root_dir, os.pardir)), "secret.yaml")
 env_path = os.path.join(os.path.abspath(os.path.join(root_dir, os.pardir)), ".env")
+
+# true 이면 OpenAI / pgvector 대신 stub 모델을 사용합니다. (오프라인 부하 테스트용)
+use_stub_models = os.getenv("USE_STUB_MODELS", "false").lower() == "true"
+
+
+def load_secret() -> dict:
+    """secret.yaml 을 읽어 dict 로 반환합니다. 파일이 없으면 빈 dict 를 반환합니다."""
+    if not os.path.exists(secret_path):
+        return {}
+    with open(secret_path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
@@ -0,0 +1,89 @@
+"""
+OpenAI / pgvector 없이 그래프를 실행하기 위한 stub 모델입니다.
+
+USE_STUB_MODELS=true 로 실행하면 load_chat_model 과 retrieval 그래프가 이 모듈의 객체를 사용합니다.
+응답 지연은 STUB_MODEL_LATENCY(초) 환경 변수로 조절합니다.
+"""
+
+import os
+import random
+import time
+
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableLambda
+
+
+class StubChatModel(BaseChatModel):
+    """고정된 응답을 토큰 단위로 돌려주는 chat model."""
+
+    response: str = "안녕하세요. 테스트용 stub 응답입니다."
+    latency: float = float(os.getenv("STUB_MODEL_LATENCY", "0.05"))
+    # with_structured_output 으로 생성되는 스키마의 필드 값. list 이면 임의로 하나를 선택합니다.
+    structured_outputs: Dict[str, Any] = {"datasource": "", "binary_score": "yes"}
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat-model"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        tokens = self.response.split(" ")
+        for i, token in enumerate(tokens):
+            time.sleep(self.latency / len(tokens))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token if i == 0 else f" {token}"))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def with_structured_output(self, schema, **kwargs):
+        def _structured(_):
+            time.sleep(self.latency)
+            values = {}
+            for name in schema.model_fields:
+                value = self.structured_outputs.get(name, "")
+                values[name] = random.choice(value) if isinstance(value, list) else value
+            return schema(**values)
+
+        return RunnableLambda(_structured)
+
+
+class StubRetriever(BaseRetriever):
+    """질문과 상관없이 고정된 문서를 돌려주는 retriever."""
+
+    k: int = 10
+    latency: float = float(os.getenv("STUB_MODEL_LATENCY", "0.05"))
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        time.sleep(self.latency)
+        return [
+            Document(
+                page_content=f"stub document {i} for {query}",
+                metadata={"source": "stub.pdf", "page": i},
+            )
+            for i in range(self.k)
+        ]
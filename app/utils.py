@@ -6,10 +6,10 @@ from typing import Union, Callable, List
 from langchain_core.runnables import RunnableConfig
 from langchain_core.runnables.graph import MermaidDrawMethod, NodeStyles
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_openai import ChatOpenAI
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langgraph.graph.state import CompiledStateGraph
 
-from settings import secret_path
+from settings import secret_path, use_stub_models
 
 
 def graph_to_png(graph: CompiledStateGraph, output_file_path: str = "graph.png", xray: Union[int, bool] = False):
@@ -96,8 +96,87 @@ def stream_graph(
             prev_node = curr_node
 
 
-def load_chat_model(model="gpt-4o-mini", temperature=None, stream=True):
+def load_chat_model(
+    model="gpt-4o-mini", temperature=None, stream=True, chain_name: str = None, lane: str = "interactive"
+):
+    """
+    ChatOpenAI 모델을 생성합니다.
+
+    Args:
+        model: 사용할 OpenAI 모델 이름.
+        temperature: 샘플링 temperature.
+        stream: streaming 응답 사용 여부.
+        chain_name: 모델을 사용하는 chain 이름. exact-match 응답 캐시(secret.yaml 의 llm_cache, streaming 이 아닌
+            모델만) 와 timeout / 재시도 / hedging 정책(secret.yaml 의 llm_policies) 을 찾는 데 사용합니다.
+        lane: LLM 스케줄러의 우선순위 lane. interactive, routing, grading, background 중 하나입니다.
+            secret.yaml 의 llm_scheduler 가 켜져 있을 때만 사용됩니다.
+    """
+    if use_stub_models:
+        from stub_models import StubChatModel
+
+        return StubChatModel()
+    with open(secret_path) as f:
+        secret = yaml.safe_load(f)
+
+    cache = None
+    if chain_name and not stream:
+        from llm_cache import get_chain_cache
+
+        cache = get_chain_cache(chain_name)
+
+    params = dict(
+        api_key=secret["openai"]["api_key"],
+        base_url=secret["openai"].get("base_url"),
+        model=model,
+        temperature=temperature,
+        streaming=stream,
+        cache=cache,
+    )
+    if not stream:
+        # langgraph 의 messages stream 모드에서도 _generate 경로(캐시, hedging) 를 사용하도록 합니다.
+        params["disable_streaming"] = True
+
+    from llm_policy import PolicyChatOpenAI, load_call_policy
+    from llm_scheduler import get_scheduler
+
+    scheduler = get_scheduler()
+    policy = load_call_policy(chain_name)
+    if scheduler is None and policy is None:
+        if cache is not None:
+            from llm_cache import CachedChatOpenAI
+
+            return CachedChatOpenAI(**params)
+        model = ChatOpenAI(**params)
+        return model
+
+    # 비 streaming 호출에 정책이 있으면 PolicyChatOpenAI 가 timeout, 연결 오류, 5xx 를 재시도합니다.
+    # 그 밖의 경우 스케줄러가 없으면 openai client 가, 있으면 429 를 함께 처리하는 스케줄러가 재시도합니다.
+    retries = policy.max_retries if policy is not None else 2
+    if policy is not None and not stream:
+        max_retries, max_error_retries = 0, 0
+    elif scheduler is None:
+        max_retries, max_error_retries = retries, 0
+    else:
+        max_retries, max_error_retries = 0, retries
+    return PolicyChatOpenAI(
+        **params,
+        timeout=policy.timeout if policy is not None else None,
+        max_retries=max_retries,
+        max_error_retries=max_error_retries,
+        error_retry_backoff=policy.retry_backoff if policy is not None else 0.5,
+        scheduler=scheduler,
+        lane=lane,
+        max_rate_limit_retries=secret.get("llm_scheduler", {}).get("max_rate_limit_retries", 5),
+        chain_name=chain_name or "default",
+        policy=policy,
+    )
+
+
+def load_embedding_model(model="text-embedding-3-small"):
+    if use_stub_models:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+
+        return DeterministicFakeEmbedding(size=1536)
     with open(secret_path) as f:
         secret = yaml.safe_load(f)
-    model = ChatOpenAI(api_key=secret["openai"]["api_key"], model=model, temperature=temperature, streaming=stream)
-    return model
+    return OpenAIEmbeddings(api_key=secret["openai"]["api_key"], model=model)
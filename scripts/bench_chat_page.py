@@ -0,0 +1,105 @@
+"""
+Streamlit 대화 페이지(app_pages/simple_chat.py) 의 rerun latency 를 대화 길이 별로 측정합니다.
+
+streamlit.testing.v1.AppTest 로 페이지를 실행하고 stub 모델을 사용하므로 OpenAI / pgvector 없이 실행됩니다.
+    checkpointer  checkpointer 에 N turn 을 넣고 페이지를 rerun 합니다. (현재 페이지: 최근 메시지만 그림)
+    session       session_state 에 N turn 을 넣고 모든 메시지를 다시 그리는 이전 방식의 페이지입니다.
+session_bytes 는 session_state 를 pickle 한 크기로, session 하나가 들고 있는 대화 상태의 크기입니다.
+
+Usage:
+    PYTHONPATH=./app python scripts/bench_chat_page.py --turns 10 100 1000 --reruns 20
+"""
+
+import argparse
+import json
+import os
+import pickle
+import statistics
+import time
+import uuid
+
+os.environ["USE_STUB_MODELS"] = "true"
+os.environ.pop("CHAT_API_URL", None)
+
+from langchain_core.messages import AIMessage, HumanMessage
+from streamlit.testing.v1 import AppTest
+
+app_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+page_path = os.path.join(app_dir, "app_pages", "simple_chat.py")
+
+# 이전 방식: session_state.messages 전체를 rerun 마다 다시 그립니다.
+SESSION_PAGE = """
+import streamlit as st
+
+for msg in st.session_state.messages:
+    st.chat_message(msg["role"]).write(msg["content"])
+"""
+
+
+def make_turn(i: int):
+    question = f"질문 {i}: 근로소득 비과세 한도와 연말정산 공제 항목을 알려주세요."
+    answer = f"답변 {i}:\n\n" + "\n".join(f"- 항목 {j}: **제{j}조** 에 따라 공제됩니다." for j in range(5))
+    return question, answer
+
+
+def measure(app: AppTest, reruns: int):
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    latencies = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "rerun_ms_p50": round(statistics.median(latencies), 2),
+        "rerun_ms_max": round(max(latencies), 2),
+        "elements": len(app.chat_message),
+    }
+
+
+def session_bytes(app: AppTest, keys) -> int:
+    return len(pickle.dumps({key: app.session_state[key] for key in keys if key in app.session_state}))
+
+
+def bench_checkpointer(turns: int, reruns: int):
+    from graph.main import app as main_graph
+
+    thread_id = str(uuid.uuid4())
+    messages = []
+    for i in range(turns):
+        question, answer = make_turn(i)
+        messages += [HumanMessage(question), AIMessage(answer)]
+    main_graph.update_state(
+        {"configurable": {"thread_id": thread_id}}, {"messages": messages}, as_node="summarize_history"
+    )
+
+    app = AppTest.from_file(page_path, default_timeout=120)
+    app.session_state["session_id"] = thread_id
+    result = measure(app, reruns)
+    keys = ["session_id", "config", "history_pages", "history_checkpoint_id"]
+    return {"page": "checkpointer", "turns": turns, **result, "session_bytes": session_bytes(app, keys)}
+
+
+def bench_session(turns: int, reruns: int):
+    app = AppTest.from_string(SESSION_PAGE, default_timeout=120)
+    messages = []
+    for i in range(turns):
+        question, answer = make_turn(i)
+        messages += [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+    app.session_state["messages"] = messages
+    result = measure(app, reruns)
+    return {"page": "session", "turns": turns, **result, "session_bytes": session_bytes(app, ["messages"])}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Streamlit chat page rerun latency by conversation length.")
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+
+    results = []
+    for turns in args.turns:
+        results.append(bench_session(turns, args.reruns))
+        results.append(bench_checkpointer(turns, args.reruns))
+    print(json.dumps(results, indent=2))
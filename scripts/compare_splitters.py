@@ -0,0 +1,109 @@
+"""
+RecursiveCharacterTextSplitter 와 StatuteTextSplitter 의 chunk 수, 예상 index 크기, 검색 적중률을 비교합니다.
+
+질문 파일은 한 줄에 하나씩 {"question": "...", "expected": "정답 조문에 들어 있는 문구"} 형식의 jsonl 입니다.
+top-k 검색 결과 중 하나라도 expected 문구를 포함하면 적중으로 셉니다. 질문 파일이 없으면 chunk 통계만 출력합니다.
+
+Usage:
+    PYTHONPATH=./app python scripts/compare_splitters.py --pdf data/소득세법.pdf --questions data/tax_questions.jsonl
+    USE_STUB_MODELS=true PYTHONPATH=./app python scripts/compare_splitters.py --pdf data/소득세법.pdf --retriever bm25
+"""
+
+import argparse
+import json
+import re
+import time
+
+import numpy as np
+
+from langchain_community.document_loaders import PDFPlumberLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from graph.page_fetch import bm25_scores
+from rag.statute import StatuteTextSplitter
+from utils import load_embedding_model
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", "", text)
+
+
+def chunk_stats(chunks, dimensions: int):
+    lengths = np.array([len(chunk.page_content) for chunk in chunks])
+    text_bytes = sum(len(chunk.page_content.encode()) for chunk in chunks)
+    metadata_bytes = sum(len(json.dumps(chunk.metadata, ensure_ascii=False).encode()) for chunk in chunks)
+    return {
+        "chunks": len(chunks),
+        "chars_p50": int(np.percentile(lengths, 50)),
+        "chars_p95": int(np.percentile(lengths, 95)),
+        "tiny_chunks": int((lengths < 100).sum()),
+        # float32 embedding + 본문 + metadata(jsonb) 크기의 근사치
+        "index_size_bytes": len(chunks) * dimensions * 4 + text_bytes + metadata_bytes,
+    }
+
+
+def hit_rate(chunks, questions, retriever: str, k: int, embeddings=None):
+    texts = [chunk.page_content for chunk in chunks]
+    if retriever == "embedding":
+        matrix = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-8
+
+    hits, ranks = 0, []
+    for item in questions:
+        if retriever == "embedding":
+            query = np.asarray(embeddings.embed_query(item["question"]), dtype=np.float32)
+            scores = matrix @ (query / (np.linalg.norm(query) + 1e-8))
+        else:
+            scores = np.array(bm25_scores(item["question"], texts))
+        top = np.argsort(-scores)[:k]
+        expected = normalize(item["expected"])
+        rank = next((i for i, index in enumerate(top) if expected in normalize(texts[index])), None)
+        if rank is not None:
+            hits += 1
+            ranks.append(rank + 1)
+    return {
+        f"hit_rate@{k}": round(hits / len(questions), 4),
+        "mean_rank_of_hit": round(float(np.mean(ranks)), 2) if ranks else None,
+    }
+
+
+def main(args):
+    splitters = {
+        "recursive": RecursiveCharacterTextSplitter(chunk_size=args.recursive_chunk_size, chunk_overlap=50),
+        "statute": StatuteTextSplitter(
+            chunk_size=args.statute_chunk_size, chunk_overlap=100, min_chunk_size=args.min_chunk_size
+        ),
+    }
+    questions = []
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [json.loads(line) for line in f if line.strip()]
+    embeddings = load_embedding_model() if args.retriever == "embedding" else None
+
+    report = {}
+    for name, splitter in splitters.items():
+        start = time.perf_counter()
+        pages = (page for pdf in args.pdf for page in PDFPlumberLoader(pdf).lazy_load())
+        if isinstance(splitter, StatuteTextSplitter):
+            chunks = list(splitter.iter_split_documents(pages))
+        else:
+            chunks = splitter.split_documents(list(pages))
+        result = {"load_and_split_seconds": round(time.perf_counter() - start, 2), **chunk_stats(chunks, args.dim)}
+        if questions:
+            result.update(hit_rate(chunks, questions, args.retriever, args.k, embeddings))
+        report[name] = result
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare recursive and statute-aware splitters on tax-law PDFs.")
+    parser.add_argument("--pdf", nargs="+", required=True)
+    parser.add_argument("--questions", default=None)
+    parser.add_argument("--retriever", choices=["embedding", "bm25"], default="embedding")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--recursive-chunk-size", type=int, default=300)
+    parser.add_argument("--statute-chunk-size", type=int, default=1000)
+    parser.add_argument("--min-chunk-size", type=int, default=200)
+    main(parser.parse_args())
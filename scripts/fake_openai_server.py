@@ -0,0 +1,175 @@
+"""
+OpenAI chat completions API 를 흉내 내는 로컬 서버입니다.
+
+secret.yaml 의 openai.base_url 을 http://127.0.0.1:<port>/v1 로 설정하면 load_chat_model 이 이 서버를 호출합니다.
+분당 요청 수 제한(429 + Retry-After), 임의 429, 응답 지연 분포를 주입할 수 있습니다.
+
+Latency 분포:
+    fixed:0.2               항상 0.2초
+    uniform:0.1,0.5         0.1 ~ 0.5초 균등 분포
+    lognormal:0.3,0.8       median 0.3초, sigma 0.8 인 log-normal 분포
+    bimodal:0.2,3.0,0.05    5% 확률로 3초, 나머지는 0.2초
+
+Usage:
+    python scripts/fake_openai_server.py --port 8089 --rpm 60 --latency lognormal:0.3,0.8
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_STRUCTURED_RESPONSE = {"binary_score": "yes", "datasource": ""}
+
+
+def parse_latency(spec: str):
+    """latency 분포 문자열을 샘플링 함수로 변환합니다."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    if kind == "bimodal":
+        return lambda: values[1] if random.random() < values[2] else values[0]
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class FakeOpenAIState:
+    def __init__(self, rpm: int = 0, rate_limit_prob: float = 0.0, latency: str = "fixed:0.05", response="ok"):
+        self.rpm = rpm
+        self.rate_limit_prob = rate_limit_prob
+        self.sample_latency = parse_latency(latency)
+        self.response = response
+        self.requests = deque()
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "rate_limited": 0, "completed": 0}
+
+    def admit(self) -> float:
+        """허용되면 0, 거부되면 Retry-After 초를 반환합니다."""
+        now = time.time()
+        with self.lock:
+            self.stats["requests"] += 1
+            while self.requests and now - self.requests[0] > 60:
+                self.requests.popleft()
+            if self.rpm and len(self.requests) >= self.rpm:
+                self.stats["rate_limited"] += 1
+                return max(60 - (now - self.requests[0]), 0.1)
+            if random.random() < self.rate_limit_prob:
+                self.stats["rate_limited"] += 1
+                return 1.0
+            self.requests.append(now)
+            return 0.0
+
+
+def structured_arguments(schema: dict) -> str:
+    properties = schema.get("properties", {})
+    return json.dumps({name: DEFAULT_STRUCTURED_RESPONSE.get(name, "") for name in properties}, ensure_ascii=False)
+
+
+def make_handler(state: FakeOpenAIState):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            retry_after = state.admit()
+            if retry_after:
+                payload = json.dumps({"error": {"message": "Rate limit reached", "type": "requests"}}).encode()
+                self.send_response(429)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Retry-After", f"{retry_after:.2f}")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+
+            time.sleep(state.sample_latency())
+            message = {"role": "assistant", "content": state.response}
+            if body.get("tools"):
+                function = body["tools"][0]["function"]
+                message = {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [
+                        {
+                            "id": f"call_{uuid.uuid4().hex[:8]}",
+                            "type": "function",
+                            "function": {
+                                "name": function["name"],
+                                "arguments": structured_arguments(function.get("parameters", {})),
+                            },
+                        }
+                    ],
+                }
+            elif (body.get("response_format") or {}).get("type") == "json_schema":
+                message["content"] = structured_arguments(body["response_format"]["json_schema"].get("schema", {}))
+
+            prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 2
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": 8, "total_tokens": prompt_tokens + 8}
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            with state.lock:
+                state.stats["completed"] += 1
+
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                base = {"id": completion_id, "object": "chat.completion.chunk", "model": body.get("model", "fake")}
+                for token in (message.get("content") or "").split(" "):
+                    choice = {"index": 0, "delta": {"content": token + " "}, "finish_reason": None}
+                    chunk = {**base, "choices": [choice]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                final = {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+                return
+
+            payload = json.dumps(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+                    "usage": usage,
+                }
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
+
+
+def start_server(port: int = 0, **kwargs):
+    """백그라운드 스레드에서 서버를 시작하고 (server, state) 를 반환합니다. base_url 은 server.server_port 로 만듭니다."""
+    state = FakeOpenAIState(**kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions endpoint.")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute before returning 429 (0: no limit)")
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0, help="probability of a random 429")
+    parser.add_argument("--latency", default="fixed:0.05")
+    args = parser.parse_args()
+    server, _ = start_server(args.port, rpm=args.rpm, rate_limit_prob=args.rate_limit_prob, latency=args.latency)
+    print(f"listening on http://127.0.0.1:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,125 @@
+"""
+grading cascade 의 오프라인 일치율 리포트와 classifier 학습 스크립트입니다.
+
+GradingCascade 가 기록한 LLM 판정 로그(grader_decisions.jsonl) 를 label 로 사용해서
+    1. cosine similarity 만 사용할 때, low / high threshold 별 LLM 없이 판정하는 비율(coverage) 과 LLM 과의 일치율
+    2. logistic regression classifier 를 학습했을 때의 같은 지표
+    3. shadow 호출로 기록된 실제 cascade 판정과 LLM 판정의 일치율
+을 grader 별로 출력합니다. --output 을 주면 목표 일치율을 만족하면서 coverage 가 가장 큰 threshold 와 함께
+threshold 를 고를 때 사용한 classifier(학습 split 으로 학습한 weights) 를 저장합니다.
+GradingCascade 는 classifier_dir/{grader}.json 을 불러오므로 grader 마다 따로 학습해서 저장합니다.
+
+Usage:
+    PYTHONPATH=./app python scripts/grader_cascade_report.py --log data/grader_decisions.jsonl \
+        --grader retrieval.grade_chain --target-agreement 0.97 --output data/grader_cascade/retrieval.grade_chain.json
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from graph.cascade import LogisticScorer, cascade_features
+
+
+def load_records(path: str, grader: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return [record for record in map(json.loads, filter(str.strip, f)) if record["grader"] == grader]
+
+
+def train_logistic(features: np.ndarray, labels: np.ndarray, epochs: int = 2000, lr: float = 0.5, l2: float = 1e-3):
+    weights = np.zeros(features.shape[1] + 1, dtype=np.float64)
+    x = np.hstack([features, np.ones((len(features), 1))])
+    for _ in range(epochs):
+        p = 1 / (1 + np.exp(-(x @ weights)))
+        gradient = x.T @ (p - labels) / len(labels) + l2 * np.r_[weights[:-1], 0]
+        weights -= lr * gradient
+    return weights
+
+
+def threshold_table(scores: np.ndarray, labels: np.ndarray, candidates):
+    """(low, high) 후보 별 coverage 와 confident 판정의 LLM 일치율을 계산합니다."""
+    rows = []
+    for low, high in candidates:
+        yes, no = scores >= high, scores <= low
+        decided = yes | no
+        coverage = decided.mean()
+        agreement = ((yes & labels) | (no & ~labels))[decided].mean() if decided.any() else 1.0
+        rows.append({"low": round(low, 3), "high": round(high, 3), "coverage": coverage, "agreement": agreement})
+    return rows
+
+
+def best_thresholds(rows, target_agreement: float):
+    eligible = [row for row in rows if row["agreement"] >= target_agreement]
+    return max(eligible, key=lambda row: row["coverage"]) if eligible else None
+
+
+def print_table(title: str, rows):
+    print(f"\n## {title}")
+    print(f"{'low':>6} {'high':>6} {'coverage':>9} {'agreement':>10}")
+    for row in rows:
+        print(f"{row['low']:>6} {row['high']:>6} {row['coverage']:>9.3f} {row['agreement']:>10.3f}")
+
+
+def main(args):
+    records = load_records(args.log, args.grader)
+    if len(records) < 10:
+        raise SystemExit(f"not enough logged decisions for {args.grader}: {len(records)}")
+    features = np.stack([cascade_features(r["similarity"], r["overlap"], r["document_length"]) for r in records])
+    labels = np.array([r["label"] for r in records], dtype=bool)
+    print(f"grader: {args.grader}, records: {len(records)}, positive ratio: {labels.mean():.3f}")
+
+    similarity = features[:, 0]
+    grid = np.quantile(similarity, np.linspace(0.05, 0.95, 10))
+    candidates = [(low, high) for low in grid for high in grid if high > low]
+    similarity_rows = threshold_table(similarity, labels, candidates)
+    print_table("cosine similarity", sorted(similarity_rows, key=lambda r: -r["coverage"])[: args.top])
+
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(records))
+    split = int(len(order) * 0.8)
+    train, test = order[:split], order[split:]
+    weights = train_logistic(features[train], labels[train].astype(np.float64))
+    probabilities = LogisticScorer(weights.tolist())(features[test].astype(np.float32))
+    probability_candidates = [(low, high) for low in np.linspace(0.05, 0.5, 10) for high in np.linspace(0.5, 0.95, 10)]
+    classifier_rows = threshold_table(probabilities, labels[test], probability_candidates)
+    print_table("logistic classifier (held-out)", sorted(classifier_rows, key=lambda r: -r["coverage"])[: args.top])
+
+    shadow = [r for r in records if r.get("cascade_decision") is not None]
+    if shadow:
+        agreement = np.mean([r["cascade_decision"] == r["label"] for r in shadow])
+        print(f"\n## online shadow agreement: {agreement:.3f} over {len(shadow)} confident decisions")
+
+    best = best_thresholds(classifier_rows, args.target_agreement)
+    print(f"\nbest classifier thresholds for agreement >= {args.target_agreement}: {best}")
+    if args.output and best:
+        # threshold 는 이 weights 의 held-out 확률로 고른 값이므로, 전체 데이터로 다시 학습하지 않고 그대로 저장합니다.
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "grader": args.grader,
+                    "weights": weights.tolist(),
+                    "low": best["low"],
+                    "high": best["high"],
+                    "held_out_agreement": best["agreement"],
+                    "held_out_coverage": best["coverage"],
+                    "trained_on": len(train),
+                    "held_out": len(test),
+                },
+                f,
+                indent=2,
+            )
+        print(f"saved {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline agreement report and classifier training for the cascade.")
+    parser.add_argument("--log", default="data/grader_decisions.jsonl")
+    parser.add_argument("--grader", required=True, help="retrieval.grade_chain or web_search.is_relevant_chain")
+    parser.add_argument("--target-agreement", type=float, default=0.97)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
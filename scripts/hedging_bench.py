@@ -0,0 +1,100 @@
+"""
+긴 꼬리 latency 를 주입한 fake_openai_server 로 timeout / 재시도 / hedging 정책의 효과를 비교합니다.
+
+Usage:
+    PYTHONPATH=./app python scripts/hedging_bench.py --latency bimodal:0.2,3.0,0.05 --calls 200
+    PYTHONPATH=./app python scripts/hedging_bench.py --latency lognormal:0.3,0.8 --async
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from langchain_core.messages import HumanMessage
+
+from fake_openai_server import start_server
+from llm_policy import CallPolicy, PolicyChatOpenAI, policy_stats
+
+
+def build_model(base_url: str, chain_name: str, policy: CallPolicy) -> PolicyChatOpenAI:
+    return PolicyChatOpenAI(
+        api_key="fake",
+        base_url=base_url,
+        model="gpt-4o-mini",
+        temperature=0,
+        timeout=policy.timeout,
+        max_retries=0,
+        chain_name=chain_name,
+        policy=policy,
+    )
+
+
+def run_sync(model: PolicyChatOpenAI, calls: int, concurrency: int):
+    def call(i):
+        start = time.perf_counter()
+        model.invoke([HumanMessage(f"질문 {i}")])
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(call, range(calls)))
+
+
+async def run_async(model: PolicyChatOpenAI, calls: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await model.ainvoke([HumanMessage(f"질문 {i}")])
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*[call(i) for i in range(calls)])
+
+
+def summarize(latencies):
+    values = np.array(latencies)
+    return {f"p{q}": round(float(np.percentile(values, q)), 3) for q in (50, 90, 99)}
+
+
+def main(args):
+    server, server_state = start_server(latency=args.latency)
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    policies = {
+        "baseline": CallPolicy(timeout=args.timeout, max_retries=0),
+        "timeout_retry": CallPolicy(timeout=args.timeout, max_retries=2, retry_backoff=0.1),
+        "hedged": CallPolicy(
+            timeout=args.timeout, max_retries=2, retry_backoff=0.1, hedge=True, hedge_percentile=args.percentile
+        ),
+    }
+
+    report = {}
+    for name, policy in policies.items():
+        model = build_model(base_url, name, policy)
+        # hedge 지연 시간을 계산할 latency 표본을 먼저 모읍니다.
+        run_sync(model, policy.hedge_min_samples, args.concurrency)
+        if args.use_async:
+            latencies = asyncio.run(run_async(model, args.calls, args.concurrency))
+        else:
+            latencies = run_sync(model, args.calls, args.concurrency)
+        report[name] = summarize(latencies)
+
+    report["policy_stats"] = policy_stats()
+    report["server"] = server_state.stats
+    print(json.dumps(report, indent=2))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare timeout/retry/hedging policies against injected latency.")
+    parser.add_argument("--latency", default="bimodal:0.2,3.0,0.05")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--percentile", type=float, default=0.9)
+    parser.add_argument("--async", dest="use_async", action="store_true")
+    main(parser.parse_args())
@@ -0,0 +1,125 @@
+"""
+server.py 를 stub 모델로 띄우고 동시 사용자 부하를 주는 로컬 부하 테스트입니다.
+
+OpenAI / pgvector 없이 실행되며, 여러 worker 가 같은 sqlite checkpointer 를 공유합니다.
+
+Usage:
+    python scripts/load_test.py --workers 4 --users 64 --turns 5 --stub-latency 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+app_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def wait_until_ready(base_url: str, timeout: float = 60):
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.time() < deadline:
+            try:
+                if (await client.get(f"{base_url}/healthz")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.5)
+    raise TimeoutError("server did not start")
+
+
+async def run_user(client: httpx.AsyncClient, base_url: str, turns: int, results: dict):
+    thread_id = str(uuid.uuid4())
+    for turn in range(turns):
+        start = time.perf_counter()
+        first_token = None
+        async with client.stream(
+            "POST", f"{base_url}/threads/{thread_id}/stream", json={"message": f"질문 {turn}"}
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                results["rejected"].append(response.status_code)
+                await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+                continue
+            async for line in response.aiter_lines():
+                if first_token is None and line.startswith("event: token"):
+                    first_token = time.perf_counter() - start
+        results["latency"].append(time.perf_counter() - start)
+        if first_token is not None:
+            results["ttft"].append(first_token)
+
+    response = await client.get(f"{base_url}/threads/{thread_id}/messages")
+    # 다른 worker 에서 실행된 turn 도 checkpointer 를 통해 모두 보여야 합니다.
+    results["history_ok"].append(len(response.json()["messages"]) > 0)
+
+
+async def main(args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    tmp_dir = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        PYTHONPATH=app_dir,
+        USE_STUB_MODELS="true",
+        STUB_MODEL_LATENCY=str(args.stub_latency),
+        CHECKPOINTER_TYPE="sqlite",
+        CHECKPOINTER_PATH=os.path.join(tmp_dir, "checkpoints.sqlite"),
+        SERVING_MAX_CONCURRENT=str(args.max_concurrent),
+        SERVING_MAX_QUEUE=str(args.max_queue),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "server.py", "--port", str(args.port), "--workers", str(args.workers)],
+        cwd=app_dir,
+        env=env,
+    )
+    try:
+        await wait_until_ready(base_url)
+        results = {"latency": [], "ttft": [], "rejected": [], "history_ok": []}
+        limits = httpx.Limits(max_connections=args.users)
+        async with httpx.AsyncClient(timeout=httpx.Timeout(60), limits=limits) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*[run_user(client, base_url, args.turns, results) for _ in range(args.users)])
+            elapsed = time.perf_counter() - start
+
+        report = {
+            "workers": args.workers,
+            "users": args.users,
+            "completed_turns": len(results["latency"]),
+            "rejected_turns": len(results["rejected"]),
+            "throughput_turns_per_sec": round(len(results["latency"]) / elapsed, 2),
+            "latency_p50": round(statistics.median(results["latency"]), 3) if results["latency"] else None,
+            "latency_p99": round(percentile(results["latency"], 0.99), 3),
+            "ttft_p50": round(statistics.median(results["ttft"]), 3) if results["ttft"] else None,
+            "ttft_p99": round(percentile(results["ttft"], 0.99), 3),
+            "history_consistent": all(results["history_ok"]),
+        }
+        print(json.dumps(report, indent=2))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test server.py with stub models.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--stub-latency", type=float, default=0.1)
+    parser.add_argument("--max-concurrent", type=int, default=8)
+    parser.add_argument("--max-queue", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
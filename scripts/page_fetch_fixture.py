@@ -0,0 +1,147 @@
+"""
+graph/page_fetch.py 의 PageFetcher 를 로컬 HTTP fixture 서버로 검증하고 수집 시간을 측정합니다.
+
+fixture 서버는 본문 + 메뉴/스크립트가 섞인 기사 페이지, 응답이 느린 페이지, 크기 제한을 넘는 페이지,
+HTML 이 아닌 페이지, euc-kr 인코딩 페이지, 404 페이지, redirect 를 제공합니다.
+fixture 서버는 loopback 주소이므로 allow_private_hosts=True 로 수집하고, 기본 설정에서는 차단되는지도 확인합니다.
+
+Usage:
+    PYTHONPATH=./app python scripts/page_fetch_fixture.py
+    PYTHONPATH=./app python scripts/page_fetch_fixture.py --serve --port 8090
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from graph.page_fetch import PageFetcher, extract_main_text
+
+ARTICLE = """
+<html><head><title>{title}</title><script>var tracking = "종합소득세 광고";</script></head>
+<body>
+<nav><a href="/">홈</a> <a href="/news">뉴스</a> <a href="/tax">세금</a></nav>
+<article>
+<h1>{title}</h1>
+<p>{body}</p>
+<p>이 문단은 질문과 관련이 없는 날씨 이야기입니다. 오늘은 맑고 바람이 약하게 불며 오후에는 기온이 오릅니다.</p>
+</article>
+<footer><a href="/privacy">개인정보처리방침</a> Copyright</footer>
+</body></html>
+"""
+
+PAGES = {
+    "/article/1": (
+        "종합소득세 신고 안내",
+        "종합소득세 신고 기간은 매년 5월 1일부터 5월 31일까지이며, 성실신고확인 대상자는 6월 30일까지 신고합니다.",
+    ),
+    "/article/2": ("연말정산과 종합소득세", "연말정산을 한 근로소득자라도 다른 소득이 있으면 5월에 종합소득세를 다시 신고합니다."),
+    "/article/3": ("주말 날씨", "주말에는 전국이 맑겠고 낮 기온은 평년보다 조금 높겠습니다."),
+}
+
+
+def make_handler(slow_seconds: float, huge_bytes: int):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def send_body(self, body: bytes, content_type: str = "text/html; charset=utf-8", status: int = 200):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path in PAGES:
+                title, body = PAGES[self.path]
+                self.send_body(ARTICLE.format(title=title, body=body).encode())
+            elif self.path == "/redirect":
+                self.send_response(302)
+                self.send_header("Location", "/article/2")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            elif self.path == "/slow":
+                time.sleep(slow_seconds)
+                self.send_body(ARTICLE.format(title="느린 페이지", body="늦게 도착한 종합소득세 문단").encode())
+            elif self.path == "/huge":
+                paragraph = "<p>" + "종합소득세 " * 50 + "</p>\n"
+                self.send_body((paragraph * (huge_bytes // len(paragraph.encode()) + 1)).encode())
+            elif self.path == "/pdf":
+                self.send_body(b"%PDF-1.4 fake", content_type="application/pdf")
+            elif self.path == "/euckr":
+                html = '<html><head><meta charset="euc-kr"><title>국세청 안내</title></head>'
+                html += "<body><p>종합소득세는 개인이 한 해 동안 얻은 소득을 합산해서 계산하는 세금입니다.</p></body></html>"
+                self.send_body(html.encode("euc-kr"), content_type="text/html")
+            else:
+                self.send_body(b"not found", status=404)
+
+    return Handler
+
+
+def start_fixture_server(port: int = 0, slow_seconds: float = 10.0, huge_bytes: int = 3_000_000):
+    """백그라운드 스레드에서 fixture 서버를 시작하고 server 를 반환합니다."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(slow_seconds, huge_bytes))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check(args):
+    server = start_fixture_server(slow_seconds=args.timeout * 3)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    fetcher = PageFetcher(
+        max_pages=10,
+        timeout=args.timeout,
+        total_timeout=args.timeout * 2,
+        max_bytes=1_000_000,
+        chunk_size=200,
+        allow_private_hosts=True,
+    )
+    paths = ["/article/1", "/redirect", "/article/3", "/slow", "/huge", "/pdf", "/euckr", "/missing"]
+    search_results = [{"link": base_url + path, "title": path, "snippet": ""} for path in paths]
+
+    start = time.perf_counter()
+    documents = fetcher.fetch_documents("종합소득세 신고 기간", search_results)
+    elapsed = time.perf_counter() - start
+
+    extracted = extract_main_text(ARTICLE.format(title="제목", body="본문 문단입니다. 충분히 긴 문장이 되도록 씁니다."))
+    assert "tracking" not in extracted["text"] and "개인정보처리방침" not in extracted["text"], extracted
+    assert extracted["title"] == "제목"
+    stats = fetcher.stats()
+    assert stats["pages_fetched"] == 5, stats  # article 3개(redirect 포함), huge(잘림), euckr
+    assert stats["timeouts"] == 1 and stats["errors"] == 1 and stats["skipped_non_html"] == 1, stats
+    assert stats["truncated"] == 1, stats
+    assert elapsed < args.timeout * 2, elapsed
+    assert documents and all(d.metadata["source"].startswith(base_url) for d in documents)
+    assert not any("/article/3" in d.metadata["source"] for d in documents), "irrelevant page should not be selected"
+
+    # 기본 설정에서는 loopback 주소와 http/https 가 아닌 URL 을 요청하지 않습니다.
+    guarded = PageFetcher(timeout=args.timeout)
+    links = [base_url + "/article/1", "http://169.254.169.254/latest/meta-data/", "file:///etc/passwd"]
+    assert guarded.fetch_documents("종합소득세", [{"link": link} for link in links]) == []
+    assert guarded.stats()["blocked"] == 3, guarded.stats()
+    assert guarded.fetch_documents("종합소득세", []) == []
+
+    print(json.dumps({"elapsed_seconds": round(elapsed, 3), "stats": stats}, ensure_ascii=False, indent=2))
+    for document in documents:
+        print(f"- {document.metadata['source']} ({document.metadata['score']}): {document.page_content[:80]}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local HTTP fixture server for the web page fetch stage.")
+    parser.add_argument("--serve", action="store_true", help="only run the fixture server")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    args = parser.parse_args()
+    if args.serve:
+        fixture = start_fixture_server(args.port)
+        print(f"listening on http://127.0.0.1:{fixture.server_port}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            fixture.shutdown()
+    else:
+        check(args)
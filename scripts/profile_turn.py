@@ -0,0 +1,60 @@
+"""
+stub 모델로 main 그래프의 turn 을 실행하면서 프로파일링하는 오프라인 예제입니다.
+
+OpenAI / pgvector 없이 실행됩니다. turn 마다 PROFILE_DIR(기본값 ./data/profiles) 에 두 파일이 생깁니다.
+    *.folded  flamegraph 용 folded stack. https://www.speedscope.app 에 열거나
+              flamegraph.pl profile.folded > profile.svg 로 svg 를 만듭니다.
+    *.json    노드 별 실행 시간(LLM / retriever / tool 시간 포함), graph_overhead_ms, span 목록.
+
+--turns 를 7 이상으로 주면 summarize_history 노드까지 실행됩니다.
+
+Usage:
+    PYTHONPATH=./app python scripts/profile_turn.py --turns 8 --stub-latency 0.05
+    PYTHONPATH=./app python scripts/profile_turn.py --no-profile   # 프로파일링을 끈 turn 과 시간 비교
+"""
+
+import argparse
+import json
+import os
+import time
+import uuid
+
+os.environ["USE_STUB_MODELS"] = "true"
+
+
+def main(args):
+    from langchain_core.messages import HumanMessage
+    from langchain_core.runnables import RunnableConfig
+
+    from graph.main import app as main_graph
+    from profiling import profile_turn
+
+    thread_id = str(uuid.uuid4())
+    for turn in range(args.turns):
+        inputs = {"messages": [HumanMessage(f"질문 {turn}: 근로소득 비과세 한도는?")]}
+        if args.no_profile:
+            start = time.perf_counter()
+            main_graph.invoke(inputs, config=RunnableConfig({"configurable": {"thread_id": thread_id}}))
+            print(json.dumps({"turn": turn, "total_ms": round((time.perf_counter() - start) * 1000, 3)}))
+            continue
+        with profile_turn(f"{thread_id}-{turn}", output_dir=args.output_dir) as profile:
+            main_graph.invoke(
+                inputs,
+                config=RunnableConfig({"callbacks": [profile.tracer], "configurable": {"thread_id": thread_id}}),
+            )
+        print(json.dumps({"turn": turn, **profile.summary()}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile main graph turns offline with stub models.")
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--stub-latency", type=float, default=0.05)
+    parser.add_argument("--output-dir", default=None, help="defaults to PROFILE_DIR")
+    parser.add_argument("--no-profile", action="store_true")
+    args = parser.parse_args()
+    os.environ["STUB_MODEL_LATENCY"] = str(args.stub_latency)
+    if args.output_dir is None:
+        from profiling import PROFILE_DIR
+
+        args.output_dir = PROFILE_DIR
+    main(args)
@@ -0,0 +1,80 @@
+"""
+fake_openai_server 를 상대로 LLMScheduler 의 우선순위 lane 과 429 backoff 를 확인하는 부하 스크립트입니다.
+
+서버는 분당 --server-rpm 개까지만 허용하고, 스케줄러에는 그보다 큰 --scheduler-rpm 을 설정해서
+429 를 받은 뒤 rate 를 줄여가는 동작과 lane 별 대기 시간을 확인합니다.
+
+Usage:
+    PYTHONPATH=./app python scripts/scheduler_load.py --server-rpm 120 --scheduler-rpm 240 --calls 200
+"""
+
+import argparse
+import json
+import random
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage
+
+from fake_openai_server import start_server
+from llm_scheduler import LANES, LLMScheduler, ScheduledChatOpenAI
+
+
+def main(args):
+    server, server_state = start_server(rpm=args.server_rpm, latency=args.latency)
+    scheduler = LLMScheduler(requests_per_minute=args.scheduler_rpm, tokens_per_minute=args.scheduler_tpm)
+    models = {
+        lane: ScheduledChatOpenAI(
+            api_key="fake",
+            base_url=f"http://127.0.0.1:{server.server_port}/v1",
+            model="gpt-4o-mini",
+            temperature=0,
+            max_retries=0,
+            scheduler=scheduler,
+            lane=lane,
+            max_rate_limit_retries=args.max_retries,
+        )
+        for lane in LANES
+    }
+
+    latencies = {lane: [] for lane in LANES}
+    failures = {lane: 0 for lane in LANES}
+
+    def call(lane: str):
+        start = time.perf_counter()
+        try:
+            models[lane].invoke([HumanMessage(f"{lane} 질문입니다. " * 20)])
+            latencies[lane].append(time.perf_counter() - start)
+        except Exception:
+            failures[lane] += 1
+
+    lanes = [random.choice(LANES) for _ in range(args.calls)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(call, lanes))
+    elapsed = time.perf_counter() - start
+
+    report = {
+        "elapsed_seconds": round(elapsed, 2),
+        "server": server_state.stats,
+        "scheduler": scheduler.stats(),
+        "latency_avg": {
+            lane: round(sum(values) / len(values), 3) if values else None for lane, values in latencies.items()
+        },
+        "failures": failures,
+    }
+    print(json.dumps(report, indent=2))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exercise LLMScheduler against a fake endpoint returning 429s.")
+    parser.add_argument("--server-rpm", type=int, default=120)
+    parser.add_argument("--scheduler-rpm", type=int, default=240)
+    parser.add_argument("--scheduler-tpm", type=int, default=200000)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--latency", default="fixed:0.05")
+    main(parser.parse_args())